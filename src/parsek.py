@@ -6,6 +6,11 @@
 # pylint: disable=missing-function-docstring,missing-class-docstring
 # pylint: disable=line-too-long,too-many-lines,multiple-statements
 """Pure Python, no-dependency, single source file parser combinator library"""
+import re
+import sys
+import time
+import weakref
+from bisect import bisect_right
 from enum import Enum
 from typing import Any, Callable, Mapping
 
@@ -88,6 +93,38 @@ def parser_subroutine_new_stack(f):
     setattr(f, '__parsek_new_stack', True)
     return f
 
+def parser_subroutine_memo(f):
+    """Decorator to mark a function as a memoized (packrat) parser subroutine.
+    Its result at a position is computed once per parse: `(subroutine, pos, state, kwargs)` maps to the success,
+    the end position and state, and the values emitted. On a hit, the values are replayed into the accumulators.
+    Positional args are accumulation targets: the subroutine may emit into them in any form `Parser.accumulate()` takes,
+    e.g. `out`, `(out, key [, fn])` or `out[key] = v`, and read them, e.g. `len(out)`, which sees what was emitted so far
+    (not while a left recursive seed is grown). Keyword args are inputs and part of the key, they must be hashable."""
+    setattr(f, '__parsek_sub', True)
+    setattr(f, '__parsek_memo', True)
+    return f
+
+def parser_subroutine_left_rec(f):
+    """Decorator to mark a function as a left recursive parser subroutine, e.g., `expr = expr '+' term | term`.
+    It is memoized the same way as `parser_subroutine_memo` and grows its match seed by seed: direct and indirect
+    left recursion at a position first fails, then is rerun with the previous result as long as the match gets longer.
+    The rules of a left recursive cycle can be plain, memoized or left recursive subroutines."""
+    setattr(f, '__parsek_sub', True)
+    setattr(f, '__parsek_memo', True)
+    setattr(f, '__parsek_left_rec', True)
+    return f
+
+def first_set(spec):
+    """Decorator to annotate a parser subroutine with its FIRST set: the chars its match can start with. `spec` is a
+    str of chars, a set, a `Parser.chars()` class, `In`, `Range` or a unary predicate. When `p.ch` is not in the set
+    the subroutine must fail without consuming input or side effects: quantifiers then fail without calling it, and
+    alternations (tuples of matchers) only try the alternatives that can start with `p.ch`."""
+    test = frozenset(spec).__contains__ if isinstance(spec, (str, set, frozenset)) else spec
+    def decorator(f):
+        setattr(f, '__parsek_first', lambda ch, _kwargs: test(ch))
+        return f
+    return decorator
+
 def unary(obj):
     """Decorator to disambiguate unary callables. Simply sets obj.__arity = 1 attribute."""
     setattr(obj, '__arity', 1)
@@ -124,33 +161,138 @@ def default_combiner(old, new):
         return old
     return (old or new) if isinstance(new, bool) else old + new
 
+_DICT_FN_KINDS = {} # converter/combiner of (d, key, fn) sinks -> its kind, see _is_converter()
+
+def _is_converter(fn):
+    # -> True if `fn` of a `(d, key, fn)` sink is a converter `fn(v)`, False if a combiner `fn(old, new)`, None if
+    # its signature can't be told without calling it (some builtins). Resolved once per `fn`.
+    try:
+        return _DICT_FN_KINDS[fn]
+    except KeyError:
+        pass
+    except TypeError: # unhashable
+        return _fn_kind(fn)
+    kind = _fn_kind(fn)
+    # not closures and bound methods: typically made per call, they would fill the cache and be kept alive by it
+    if (not getattr(fn, '__closure__', None) and isinstance(getattr(fn, '__self__', None), (type(None), type(re)))
+            and Parser.DISPATCH_CACHE_SIZE > 0):
+        if len(_DICT_FN_KINDS) >= Parser.DISPATCH_CACHE_SIZE:
+            del _DICT_FN_KINDS[next(iter(_DICT_FN_KINDS))] # evict the oldest
+        _DICT_FN_KINDS[fn] = kind
+    return kind
+
+def _fn_kind(fn):
+    if (arity := getattr(fn, '__arity', None)) is not None: # see unary()
+        return arity == 1
+    import inspect # pylint: disable=import-outside-toplevel
+    try: # classes by their constructor: `int` is a converter, `Pair(old, new)` a combiner
+        sig = inspect.signature(fn)
+    except (TypeError, ValueError): # builtins without a signature, types like int, float and str are converters
+        return True if isinstance(fn, type) else None
+    for kind, args in ((True, (None,)), (False, (None, None))): # a converter can be called with one arg
+        try:
+            sig.bind(*args)
+            return kind
+        except TypeError:
+            pass
+    return None
+
+def _combine(fn, old, v): # -> `v` converted or combined with `old` by `fn` of a (d, key, fn) sink, see dict_append()
+    try:
+        conv = _DICT_FN_KINDS[fn]
+    except (KeyError, TypeError):
+        conv = _is_converter(fn)
+    if conv is None:
+        try: # unknown signature: try as a converter (most likely case)
+            v = fn(v)
+        except TypeError:
+            return fn(old, v) # try as a combiner
+    elif not conv:
+        return fn(old, v)
+    else:
+        v = fn(v)
+    return default_combiner(old, v)
+
+def _dict_error(dk):
+    return ValueError(f"Dictionary update failed: expected result tuple (dict, key, [converter/combiner]), got: {dk!r}")
+
+class _MemoSink:
+    # Positional arg of a memoized subroutine in place of its sink: records what is emitted into it as
+    # `(i, value, tail)` for Parser._one_sr_memo() to replay into the sink on every hit. `tail` is () for
+    # accumulate(sink, value), the rest of a `(sink, key [, fn])` or `(Val, ...)` tuple, or None for `sink[key] = v`.
+    # A `live` sink also emits into the sink as it records (a plain first run), so reads like `len(out)` see the values;
+    # while a left recursive seed is grown the runs are only recorded, and the reads don't see what they emit.
+    __slots__ = ('log', 'i', 'sink', 'live')
+    def __init__(self, log, i, sink, live):  self.log, self.i, self.sink, self.live = log, i, sink, live
+    def __repr__(self):                return f"_MemoSink({self.sink!r})"
+    def append(self, v):
+        self.log.append((self.i, v, ()))
+        if self.live:  Parser.accumulate(self.sink, v)
+    add = append
+    def put(self, dk, v): # accumulate(dk, v) of a `(self, ...)` tuple, see dict_append()
+        self.log.append((self.i, v, tail := dk[1:]))
+        if self.live:  Parser.accumulate((self.sink, *tail), v)
+    def __setitem__(self, key, v):
+        self.log.append((self.i, (key, v), None))
+        if self.live:  self.sink[key] = v
+    def __getitem__(self, key):        return self.sink[key]
+    def get(self, key, default=None):  return self.sink.get(key, default)
+    def __len__(self):                 return len(self.sink)
+    def __bool__(self):                return bool(self.sink)
+    def __iter__(self):                return iter(self.sink)
+    def __contains__(self, x):         return x in self.sink
+
 def dict_append(dk, v):
-    """Append a value to a dictionary. dk must be a (d, key [, converter/combiner]) tuple."""
+    """Append a value to a dictionary. dk must be a (d, key [, converter/combiner]) tuple. The 3rd item is a converter
+    if it can be called with a single argument (or is marked with `unary()`), else a combiner; told once per callable."""
+    if dk.__class__ is tuple and dk and dk[0].__class__ is _MemoSink:
+        return dk[0].put(dk, v)
     try:
         key = key if isinstance(key := dk[1], str) else str(key)
         old_v = (d := dk[0]).get(key)
-        combiner = default_combiner
-        if len(dk) > 2 and (fn := dk[2]) : # has converter/combiner
-            try: # try as a converter, single argument (we could use is_unary here, but it's heavier)
-                v = fn(v) # try as converter (most likely case)
-            except TypeError:
-                combiner = fn # try as a combiner
-        d[key] = combiner(old_v, v) # combine values
-    except (IndexError, TypeError, KeyError, ValueError, ImportError) as e:
-        raise ValueError("Dictionary update failed: expected result tuple"
-                         f" (dict, key, [converter/combiner]), got: {dk!r}") from e
+        d[key] = _combine(fn, old_v, v) if len(dk) > 2 and (fn := dk[2]) else default_combiner(old_v, v)
+    except (IndexError, TypeError, KeyError, ValueError, ImportError, AttributeError) as e:
+        raise _dict_error(dk) from e
+
+def _dict_put(d, key, fn, v): # dict_append((d, key, fn), v) without making the tuple
+    try:
+        key = key if isinstance(key, str) else str(key)
+        old_v = d.get(key)
+        d[key] = _combine(fn, old_v, v) if fn else default_combiner(old_v, v)
+    except (IndexError, TypeError, KeyError, ValueError, ImportError, AttributeError) as e:
+        raise _dict_error((d, key, fn) if fn else (d, key)) from e
+
+def _dict_sink(dk):
+    # -> `fn(v)` doing `dict_append(dk, v)` with the key and the converter/combiner resolved once (see Parser._sink_plan())
+    if dk.__class__ is tuple and dk and dk[0].__class__ is _MemoSink:
+        return lambda v: dk[0].put(dk, v)
+    try:
+        d, key, fn = dk[0], dk[1], (dk[2] if len(dk) > 2 else None)
+        key = key if isinstance(key, str) else str(key)
+        get = d.get
+    except (IndexError, TypeError, KeyError, AttributeError):
+        return lambda v: dict_append(dk, v) # raises the error on use, as accumulate() does
+    if fn and (conv := _is_converter(fn)) is None:
+        return lambda v: _dict_put(d, key, fn, v)
+    combiner = fn and not conv
+    def put(v):
+        try:
+            d[key] = fn(get(key), v) if combiner else default_combiner(get(key), fn(v) if fn else v)
+        except (IndexError, TypeError, KeyError, ValueError, ImportError, AttributeError) as e:
+            raise _dict_error(dk) from e
+    return put
 
 def dict_update(d, v):
     """Updates dict `d` with the given value `v`, which must be a
     `(key, value [, converter/combiner])` tuple (or a sequence of those) or a Mapping."""
     if isinstance(v, tuple) and 2 <= len(v) <= 3:
-        dict_append((d, v[0], *v[2:]), v[1])
+        _dict_put(d, v[0], v[2] if len(v) > 2 else None, v[1])
     elif isinstance(v, Mapping):
         for key, new_v in v.items():
             d[key] = default_combiner(d.get(key), new_v)
     elif hasattr(v, '__iter__'): # iterable of (k, v [, converter/combiner]) pairs
         for vv in v:
-            dict_append((d, vv[0], *vv[2:]), vv[1])
+            _dict_put(d, vv[0], vv[2] if len(vv) > 2 else None, vv[1])
     else:
         raise ValueError("Dictionary update failed: mapping target requires (key, value)"
                          f" tuple or Mapping, got: {v!r}")
@@ -242,6 +384,45 @@ class Range:
     if __debug__:
         def trace_repr(self):    return f"in [{self.lo!r}..{self.hi!r}]"
 
+@unary
+class CharSet:
+    """Character class, usually made by `Parser.chars()`. Example: `p.one(CharSet('_', [('a', 'z')]))...`
+    Single chars and ranges under EXPAND_LIMIT chars are kept in a frozenset, wider ranges are merged
+    into a sorted list searched with bisect. `neg` negates the class, no `Not` wrapper is needed."""
+    __slots__ = ('set', 'ranges', 'los', 'neg')
+    EXPAND_LIMIT = 1024 # ranges up to this many chars go into the set
+    def __init__(self, chars='', ranges=(), neg=False):
+        s, wide = set(chars), []
+        for r in ranges:
+            lo, hi = (r.lo, r.hi) if isinstance(r, Range) else sorted(r)
+            if ord(hi) - ord(lo) < CharSet.EXPAND_LIMIT:
+                s.update(map(chr, range(ord(lo), ord(hi) + 1)))
+            else:
+                wide.append((lo, hi))
+        merged = []
+        for lo, hi in sorted(wide):
+            if merged and ord(lo) <= ord(merged[-1][1]) + 1:
+                if hi > merged[-1][1]:  merged[-1] = (merged[-1][0], hi)
+            else:
+                merged.append((lo, hi))
+        self.set = frozenset(c for c in s if not any(lo <= c <= hi for lo, hi in merged))
+        self.ranges = tuple(merged)
+        self.los = tuple(lo for lo, _ in merged)
+        self.neg = bool(neg)
+    def __call__(self, v):
+        if v in self.set:  return not self.neg
+        if self.ranges and (i := bisect_right(self.los, v)) and v <= self.ranges[i - 1][1]:
+            return not self.neg
+        return self.neg
+    def __contains__(self, v):   return self.__call__(v)
+    def __repr__(self):
+        r = f", ranges={list(self.ranges)!r}" if self.ranges else ''
+        return f"CharSet({''.join(sorted(self.set))!r}{r}{', neg=True' if self.neg else ''})"
+    if __debug__:
+        def trace_repr(self):
+            r = ''.join(f" [{lo!r}..{hi!r}]" for lo, hi in self.ranges)
+            return f"{'not ' if self.neg else ''}in {str_concise(''.join(sorted(self.set)), 16, True)!r}{r}"
+
 class Val:
     """Variant-type accumulator for basic scalar types: str, int, float, bool."""
     __slots__ = ('v', 'combiner')
@@ -278,6 +459,18 @@ class Val:
         """Returns a copy of this Val instance."""
         return Val(self.v, self.combiner)
 
+    @staticmethod
+    def builder(v=''):
+        """Returns a string builder Val: appended strings are collected and joined only when the value is read, so
+        accumulating a long match piece by piece (e.g., `p.one_or_more(m, s)`) takes linear time. Otherwise it is
+        the same as `Val(v)`.
+        ```python
+        s = Val.builder()
+        p.one_or_more(Not(In('"' + p.END_CHAR)), s) # each match is appended to s, joined once when read
+        ```
+        """
+        return _ValBuilder(v)
+
     def clear(self, *_):
         """Clears the value based on its type. Returns `self`(chainable)."""
         if (v := self.v) is not None:
@@ -335,7 +528,7 @@ class Val:
             self.v = self.combiner(self.v, v)
             return self
         if (v_ := self.v) is None:
-            self.v = v
+            self.v = v if v.__class__ is not Span else str(v) # Val holds the text of spans
         elif isinstance(v_, str):
             self.v += (v if isinstance(v, str) else str(v) if v is not None else '')
         elif isinstance(v_, bool): # check first because bool is a subclass of int
@@ -462,6 +655,88 @@ class Val:
             # pylint: disable=protected-access
             return f"𝒱 {Parser._v_to_str(self.v)}" if Parser._trace else repr(self)
 
+_VAL_V = Val.v # slot descriptor of Val.v, shadowed by _ValBuilder.v
+
+class _ValBuilder(Val):
+    # Val that collects appended strings in `_parts` and joins them when `v` is read, see Val.builder()
+    __slots__ = ('_parts',)
+    def __init__(self, v='', combiner=None):
+        self._parts = []
+        super().__init__(v, combiner)
+
+    @property
+    def v(self):
+        if (parts := self._parts):
+            _VAL_V.__set__(self, _VAL_V.__get__(self) + ''.join(parts))
+            parts.clear()
+        return _VAL_V.__get__(self)
+    @v.setter
+    def v(self, v):
+        self._parts.clear()
+        _VAL_V.__set__(self, v)
+
+    def append(self, v):
+        if self.combiner is None and isinstance(_VAL_V.__get__(self), str):
+            self._parts.append(v if isinstance(v, str) else str(v) if v is not None else '')
+            return self
+        return super().append(v)
+
+    def copy(self):
+        return _ValBuilder(self.v, self.combiner)
+
+class Span:
+    """Matched text `source[start:end]` emitted into sinks by a parser in span mode (`Parser(source, spans=True)`),
+    instead of a new string per match. The string is made only when asked for: `str(span)` or `span.text`.
+    Compares equal to the same text (a str or another Span) without making it, hashes as its text and `+` joins
+    texts, so spans can be used as dict keys and with mapping sinks. Use `Span.texts()` or `Span.join()` to
+    convert them in bulk.
+    ```python
+    p = Parser("let x = 1", spans=True)
+    p.one('let').ws.one(str.isidentifier, l := [])
+    assert l == ['x'] and (l[0].start, l[0].end) == (4, 5) and str(l[0]) == 'x'
+    ```
+    """
+    __slots__ = ('source', 'start', 'end')
+    def __init__(self, source, start: int, end: int):
+        self.source = source
+        self.start = start
+        self.end = end
+    def __str__(self):    return self.source[self.start:self.end]
+    def __repr__(self):   return f"Span({self.start}, {self.end}, {str(self)!r})"
+    def __len__(self):    return min(self.end, len(self.source)) - self.start # end is past the source if END_CHAR matched
+    def __hash__(self):   return hash(str(self))
+    def __add__(self, v): return str(self) + str(v)
+    def __radd__(self, v):return str(v) + str(self)
+    def __int__(self):    return int(str(self))
+    def __float__(self):  return float(str(self))
+    def __eq__(self, v):
+        if isinstance(v, str):
+            return len(v) == len(self) and self.source.startswith(v, self.start)
+        if isinstance(v, Span):
+            return len(v) == len(self) and self.source.startswith(str(v), self.start)
+        return NotImplemented
+
+    @property
+    def text(self) -> str:
+        """The matched text."""
+        return self.source[self.start:self.end]
+
+    @property
+    def view(self) -> memoryview:
+        """The matched bytes of a `BytesParser` source as a memoryview slice, no copy."""
+        return self.source.buf[self.start:self.end]
+
+    @staticmethod
+    def texts(spans) -> list:
+        """Returns a list of the texts of `spans`, items that are not spans are kept as they are."""
+        return [s.source[s.start:s.end] if s.__class__ is Span else s for s in spans]
+
+    @staticmethod
+    def join(spans, sep: str = '') -> str:
+        """Returns the texts of `spans` joined with `sep`."""
+        return sep.join(Span.texts(spans))
+
+
 class Acc:
     """A set of accumulators, used to collect multiple results in a single pass.
     Acc can contain items of any type accepted by Parser.accumulate().
@@ -483,6 +758,186 @@ class Acc:
     def __repr__(self):   return f"Acc({', '.join(repr(r) for r in self.results)})"
 
 
+class Rule:
+    """Compiled chain expression. Records a parser chain expression once and replays it with every matcher
+    already resolved, skipping the per-call matcher dispatch of `Parser.one()` and other quantifiers.
+
+    Write the rule the same way as a parser subroutine whose body is a *single* chain expression. On first use
+    the function is called with a recorder in place of the parser and with placeholders in place of its
+    arguments. The recorded chain is then compiled into a function that runs the same chain on any parser. A Rule
+    is a parser subroutine and can be used anywhere a subroutine can, or called directly: `rule(p, *args, **kwargs)`.
+    ```python
+    @Rule # or @Parser.rule
+    def j_kv(p, out, **_kwargs):
+        return p.one(p.string, k := Rule.var(Val), quotes={'"':'"'}).ws.one(':').ws.one(j_val, (out, k))
+
+    p.one(p.collection, j_kv, d := {}, brackets={'{': '}'})
+    ```
+    Notes:
+    - Arguments are placeholders while recording. They are substituted on each run, also inside tuples, `Acc`,
+      `Not` and keyword args. Attribute access on a placeholder (e.g. `out.append`) is deferred the same way.
+    - Values made in the body (e.g. `k := Val()`) are made once while recording and shared by all runs, use
+      `Rule.var(factory, *args)` for sinks and other values that must be made anew on every run.
+    - The body can't use Python control flow (`if`, `and`, `while`, ...) or closures over its locals or arguments
+      (e.g. `check(lambda: k.value)`), pass them as arguments instead: `check(lambda v: v.value, k)`.
+    - Matchers are resolved on the first run for each Parser class, with the tracing settings in effect then.
+    """
+    __slots__ = ('fn', 'params', 'defaults', 'compiled')
+    _quants = None
+
+    class Arg:
+        """Placeholder for a rule argument (or its attribute) while recording."""
+        __slots__ = ('key', 'attrs')
+        def __init__(self, key, attrs=()):
+            self.key = key
+            self.attrs = attrs
+        def __getattr__(self, name):
+            if name.startswith('_'):  raise AttributeError(name)
+            return Rule.Arg(self.key, self.attrs + (name,))
+        def __repr__(self):  return f"Rule.Arg({'.'.join((str(self.key), *self.attrs))})"
+        def get(self, env):
+            if (v := env.get(k := self.key, Rule.Arg)) is Rule.Arg:
+                if not isinstance(k, Rule.Var):
+                    raise TypeError(f"Rule missing argument: {k!r}")
+                v = env[k] = k.factory(*k.args)
+            for a in self.attrs:
+                v = getattr(v, a)
+            return v
+
+    class Var(Arg):
+        """Placeholder for a value created anew on every run of the rule, see `Rule.var()`."""
+        __slots__ = ('factory', 'args')
+        def __init__(self, factory, args):
+            super().__init__(self)
+            self.factory = factory
+            self.args = args
+        def __repr__(self):  return f"Rule.var({getattr(self.factory, '__name__', self.factory)})"
+
+    class _Recorder:
+        __slots__ = ('_cls', '_proto', '_steps')
+        def __init__(self, cls):
+            self._cls = cls
+            self._proto = cls.__new__(cls) # never initialized, used only to resolve matchers
+            self._steps = []
+        def __bool__(self):
+            raise TypeError("Rule body must be a single chain expression")
+        def __getattr__(self, name):
+            v = None
+            for c in self._cls.__mro__:
+                if name in (d := c.__dict__):
+                    v = d[name]
+                    break
+            if isinstance(v, property):
+                self._steps.append(f".{name}")
+                return self
+            if v is None or (callable(v) and not isinstance(v, (type, staticmethod, classmethod))):
+                return lambda *args, **kwargs: self._rec_call(name, v, args, kwargs)
+            return getattr(self._cls, name) # static members: subroutines, chars(), END_CHAR, Val, etc.
+
+        def _rec_call(self, name, fn, args, kwargs):
+            if (run := Rule._quantifiers().get(fn)) is not None:
+                pre, (f, *args) = (args[:2], args[2:]) if run is Parser._repeat_ctx else ((), args) # pylint: disable=protected-access
+                args = tuple(args)
+                acc = kwargs.pop('acc', None)
+                nomatch = kwargs.pop('nomatch', None)
+                d = None if Rule._binder((f, kwargs.get('ic'))) else self._proto._dispatch(f, kwargs) # pylint: disable=protected-access
+                binders = tuple(Rule._binder(v) for v in (args, kwargs, nomatch, acc))
+                b_pre = Rule._binder(tuple(pre)) # bounds of repeat()
+                if d is None or any(binders) or b_pre is not None:
+                    self._steps.append(((run, pre, d, Rule._binder(f), (args, kwargs, nomatch, acc), binders, b_pre),
+                                        "._rule_qd({}, env)"))
+                else:
+                    self._steps.append(((run, pre, Parser._make_ctx(d, nomatch, args, kwargs), acc), "._rule_q({})"))
+            elif (bind := Rule._binder((args, kwargs))) is not None:
+                self._steps.append(((name, bind), "._rule_call({}, env)"))
+            else:
+                self._steps.append(((args, kwargs), f".{name}(*{{0}}[0], **{{0}}[1])"))
+            return self
+
+    def __init__(self, fn):
+        if (code := fn.__code__).co_cellvars: # closures would see the placeholders, not the values of a run
+            raise TypeError(f"Rule {fn.__name__} body has closures over {', '.join(code.co_cellvars)}, "
+                            "pass them as arguments instead")
+        names = code.co_varnames[:(n_pos := code.co_argcount) + code.co_kwonlyargcount]
+        self.fn = fn
+        self.params = names[1:n_pos]
+        self.defaults = dict(zip(names[n_pos - len(fn.__defaults__ or ()):n_pos], fn.__defaults__ or ()))
+        self.defaults.update(fn.__kwdefaults__ or {})
+        self.compiled = {}
+
+    def __repr__(self):  return f"Rule({self.fn.__name__})"
+
+    def __call__(self, p, *args, **kwargs):
+        if (run := self.compiled.get(p.__class__)) is None:
+            run = self._compile(p.__class__)
+        return run(p, args, kwargs)
+
+    def _compile(self, cls):
+        code = self.fn.__code__
+        rec = Rule._Recorder(cls)
+        kw_names = code.co_varnames[code.co_argcount:code.co_argcount + code.co_kwonlyargcount]
+        if self.fn(rec, *(Rule.Arg(k) for k in self.params), **{k: Rule.Arg(k) for k in kw_names}) is not rec:
+            raise TypeError(f"{self!r} body must return the chain expression")
+        # The recorded chain is generated as the same chain expression with all the matchers pre-resolved, this
+        # way Branch and Stop objects (failed or inactive branches, breaks, etc.) keep their exact semantics.
+        ns, chain, dyn = {'defaults': self.defaults, 'params': self.params}, [], False
+        for i, step in enumerate(rec._steps): # pylint: disable=protected-access
+            if isinstance(step, str): # property
+                chain.append(step)
+            else:
+                ns[f"a{i}"], fmt = step
+                chain.append(fmt.format(f"a{i}"))
+                dyn = dyn or 'env' in fmt
+        env = "env = {**defaults, **dict(zip(params, args)), **kwargs}" if dyn else "env = None"
+        src = f"def run(p, args, kwargs):\n    {env}\n    return p{''.join(chain)}\n"
+        exec(compile(src, f"<rule {self.fn.__name__}>", 'exec'), ns) # pylint: disable=exec-used
+        self.compiled[cls] = run = ns['run']
+        return run
+
+    @staticmethod
+    def var(factory=Val, *args):
+        """Returns a placeholder for a value made with `factory(*args)` anew on each run of the rule."""
+        return Rule.Var(factory, args)
+
+    @staticmethod
+    def _quantifiers(): # quantifier -> its Parser method taking a ready context
+        if (q := Rule._quants) is None:
+            q = Rule._quants = {Parser.one: Parser._one_ctx, Parser.one_or_more: Parser._one_or_more_ctx, # pylint: disable=protected-access
+                                Parser.zero_or_more: Parser._zero_or_more_ctx, Parser.zero_or_one: Parser._zero_or_one_ctx, # pylint: disable=protected-access
+                                Parser.repeat: Parser._repeat_ctx} # pylint: disable=protected-access
+        return q
+
+    @staticmethod
+    def _binder(v): # -> None if `v` has no placeholders, else `bind(env)` that makes `v` with placeholders substituted
+        if isinstance(v, Rule.Arg):
+            return v.get
+        if isinstance(v, Not):
+            return None if (b := Rule._binder(v.f)) is None else (lambda env, cls=v.__class__: cls(b(env)))
+        if isinstance(v, dict):
+            if not (subs := [(k, b) for k, x in v.items() if (b := Rule._binder(x)) is not None]):
+                return None
+            def bind_dict(env):
+                d = v.copy()
+                for k, b in subs:  d[k] = b(env)
+                return d
+            return bind_dict
+        if isinstance(v, (tuple, Acc)):
+            if not (subs := [(i, b) for i, x in enumerate(v) if (b := Rule._binder(x)) is not None]):
+                return None
+            base, is_acc = list(v), isinstance(v, Acc)
+            def bind_seq(env):
+                l = base.copy()
+                for i, b in subs:  l[i] = b(env)
+                return Acc(*l) if is_acc else tuple(l)
+            return bind_seq
+        return None
+
+    if __debug__:
+        def trace_repr(self):  return self.fn.__name__
+
+setattr(Rule, '__parsek_sub', True)
+
+
 class Parser:
     """ String parser allows expression-based parsing and FSM-based at the same time.
     Sentinel character 'END_CHAR' is always "added" (not actually added) to the end of the input.
@@ -504,14 +959,21 @@ class Parser:
         Class Variables:
             - END_CHAR (str): Sentinel character used to mark the end of the string.
             - PARSE_LIMIT (int): Limit the number of parsing steps to prevent infinite loops.
+            - DISPATCH_CACHE_SIZE (int): Max number of resolved matchers kept in the dispatch cache (0 disables it).
+            - USE_RE (bool): Looping quantifiers match runs of literals, `In`, `Range`, `chars()` and their
+              negations with a single `re` match (see `_match_run()`). Defaults to True.
+            - POOL_SIZE (int): Max number of released parsers kept per class for `borrow()` (0 disables the pool).
     """
     In  = In
     Not = Not
     P   = Predicate
     Predicate = Predicate
     Range = Range
+    CharSet = CharSet
     Val = Val
     Acc = Acc
+    Span = Span
+    Rule = Rule
 
     END_CHAR     = '\uFFFF'
     EOF          = END_CHAR # alias
@@ -519,6 +981,9 @@ class Parser:
     NOT_END_CHAR = Not(END_CHAR)
     NOT_EOF      = NOT_END_CHAR # alias
     PARSE_LIMIT  = 100000
+    DISPATCH_CACHE_SIZE = 1024
+    USE_RE       = True
+    POOL_SIZE    = 16
 
     # First twenty cardinal number words
     NUM_WORDS = {'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
@@ -528,16 +993,29 @@ class Parser:
     sr = staticmethod(parser_subroutine)
     subroutine = staticmethod(parser_subroutine)
     subroutine_new_stack = staticmethod(parser_subroutine_new_stack)
+    subroutine_memo = staticmethod(parser_subroutine_memo)
+    subroutine_left_rec = staticmethod(parser_subroutine_left_rec)
+    rule = Rule
 
     _cache_chars = {}      # cache for the Parser.chars() factory
+    _cache_dispatch = {}   # (matcher, its class, ic, neg) or (id(tuple), ic, neg) -> (harness, m or None, has_params, tuple or None), see _dispatch_one()
+    _cache_dispatch_stats = [0, 0] # hits, misses
+    _cache_re = {}         # (harness, matcher) -> (run pattern, unit width) or None, see _match_run()
+    _cache_literals = {}   # id(matcher) -> indexes of literal alternations, see _literals()
+    _cache_first = {}      # id(tuple) -> [tuple, FIRST sets, ic FIRST sets] (None until seen twice), see _alternation()
+    _pools = {}            # parser class -> released parsers, see borrow()
 
     class Branch:
-        __slots__ = ('parent', )
-        def __init__(self, parent):    self.parent = parent
+        __slots__ = ('parent', 'child')
+        def __init__(self, parent):    self.parent = parent;  self.child = None
         def __getattr__(self, name):   return self
         def __bool__(self):            return self.is_ok
         def __call__(self, *a, **k):   return self
         def __repr__(self):            return f"{self.__class__.__name__}(parent={self.parent!r})"
+        def _nested(self): # nested inactive branch, made once and reused
+            if (c := self.child) is None:
+                c = self.child = self.__class__(self)
+            return c
 
     class Shunt(Branch): # Represents inactive branch of the expression
         is_ok     = True
@@ -546,8 +1024,8 @@ class Parser:
         endif_    = endif
         commit    = endif
         merge     = endif
-    Shunt.if_       = property(Shunt) # defining these outside the class eliminates the need for lambdas
-    Shunt.lookahead = property(Shunt)
+    Shunt.if_       = property(Branch._nested) # defining these outside the class eliminates the need for lambdas
+    Shunt.lookahead = Shunt.if_
 
     class Fail(Branch): # Represents false branch of the expression
         @property
@@ -563,9 +1041,9 @@ class Parser:
         commit    = endif
         endif_    = endif
         merge     = endif
-    Fail.if_       = property(Fail) # defining these outside the class eliminates the need for lambdas
-    Fail._bkt_else = property(Fail) # pylint: disable=protected-access
-    Fail.lookahead = property(Fail)
+    Fail.if_       = property(Branch._nested) # defining these outside the class eliminates the need for lambdas
+    Fail._bkt_else = Fail.if_ # pylint: disable=protected-access
+    Fail.lookahead = Fail.if_
 
     class Stop: # Base for all stops
         __slots__ = ()
@@ -613,47 +1091,138 @@ class Parser:
 
     class End(Stop):
         is_ok = True
+    _END = End() # stateless, shared by all parsers
 
     if __debug__:
-        __slots__ = ('source', 'state', 'pos', '_skip', 'len', '_lookahead_stack', '_pos_dict', 'tracing', '_lsd')
+        __slots__ = ('source', 'state', 'pos', '_skip', 'len', '_lookahead_stack', '_pos_dict', '_memo', '_fail', '_shunt', '_stops',
+                     'spans', 'tracing', '_lsd')
     else:
-        __slots__ = ('source', 'state', 'pos', '_skip', 'len', '_lookahead_stack', '_pos_dict')
-    def __init__(self, source, state=None, pos:int=0, skip=False):
+        __slots__ = ('source', 'state', 'pos', '_skip', 'len', '_lookahead_stack', '_pos_dict', '_memo', '_fail', '_shunt', '_stops',
+                     'spans')
+    def __init__(self, source, state=None, pos:int=0, skip=False, spans=False):
         """ Initialize the parser with the source string.
         Args:
             source: The input string to be parsed.
             state: The initial FSM state of the parser. Defaults to None.
             pos (int): The current position in the source string. Defaults to 0.
             skip (bool): Skip state, if `True` next() skips the next character. Defaults to `False`.
+            spans (bool): Span mode, if `True` sinks get the matched text as `Span` objects instead of strings.
+                Defaults to `False`.
         """
         self.source = source
+        self.spans = spans
         self.state = state
         self.pos = pos
         self._skip = skip
         self.len = len(self.source)
         self._lookahead_stack = []
         self._pos_dict = None
+        self._memo = None # packrat memo, shared with forks, see _one_sr_memo()
+        self._fail = self._shunt = self._stops = None # branch and stop objects, made on first use, see _failed()
         if __debug__:
             setattr(self, 'tracing', tracing := bool(self.__class__._trace))
             if tracing:
                 setattr(self, '_lsd', 0) # lookahead stack depth of parent parser (for tracing, set by forked parsers)
-                self.trace(2, f"+ new parser: {str_concise(source[self.pos:], 40, True)!r}")
+                self.trace(2, f"+ new parser: {str_concise(str(source[self.pos:self.pos + 41]), 40, True)!r}")
+
+    def reset(self, source, state=None, pos:int=0, skip=False, spans=False) -> 'Parser':
+        """ Starts over on a new `source`, the same as `Parser(source, state, pos, skip, spans)` but reusing this
+        instance: its lookahead stack and its branch and stop objects. For many small inputs, see `borrow()`.
+        Returns `self`. The branches and stops it returned for the previous source must not be used anymore."""
+        self.source = source
+        self.spans = spans
+        self.state = state
+        self.pos = pos
+        self._skip = skip
+        self.len = len(source)
+        self._lookahead_stack.clear()
+        self._pos_dict = self._memo = None
+        if __debug__:
+            setattr(self, 'tracing', tracing := bool(self.__class__._trace))
+            if tracing:
+                setattr(self, '_lsd', 0)
+                self.trace(2, f"+ reset parser: {str_concise(str(source[self.pos:self.pos + 41]), 40, True)!r}")
+        return self
+
+    @classmethod
+    def borrow(cls, source, *args, **kwargs) -> 'Parser':
+        """ Returns a parser of this class over `source`: one given back with `release()`, reset with
+        `reset(source, *args, **kwargs)`, or a new one if the pool is empty. Use it as a context manager to release it
+        at the end. So parsing many small inputs doesn't make a parser for each one:
+        ```
+        for s in values:
+            with Parser.borrow(s) as p:
+                p.one(p.decimal, out)
+        ```
+        """
+        try:
+            p = Parser._pools[cls].pop()
+        except (KeyError, IndexError): # no pool yet or empty
+            return cls(source, *args, **kwargs)
+        return p.reset(source, *args, **kwargs)
+
+    def release(self):
+        """ Gives the parser back to the pool of its class for `borrow()`. It (and the branches and stops it returned)
+        must not be used afterwards."""
+        try:
+            pool = Parser._pools[self.__class__]
+        except KeyError:
+            pool = Parser._pools.setdefault(self.__class__, [])
+        if len(pool) < Parser.POOL_SIZE:
+            self.source = self.state = self._memo = None # don't keep them alive
+            pool.append(self)
+
+    def __enter__(self):
+        return self
+    def __exit__(self, _exc_type, _exc, _tb):
+        self.release()
+
+    @staticmethod
+    def from_file(path, encoding='utf-8', **kwargs) -> 'Parser':
+        """Returns a parser over the file at `path` mapped into memory with `mmap`: nothing is decoded up front, the
+        OS pages the file in as the parser gets to it. UTF-8 files are scanned once to count their chars (see
+        `Utf8Parser`), a fast pass for mostly ASCII text. The parser works the same as over the decoded
+        text: positions are char offsets, `p.ch` and slices are strs, so all matchers and built-in subroutines
+        work unchanged.
+        Args:
+            path: The file path.
+            encoding (str): 'utf-8' (default), 'ascii' or 'latin-1'. ASCII and latin-1 files (and UTF-8 files
+                that turn out to be all ASCII) are parsed as bytes by a `BytesParser`. Other UTF-8 files are
+                decoded a chunk at a time (see `Utf8Parser`).
+            **kwargs: `Parser.__init__()` args: `state`, `pos`, `skip` and `spans`.
+        ```
+        p = Parser.from_file('access.log')
+        p.zero_or_more(log_line, entries)
+        ```
+        """
+        import codecs # pylint: disable=import-outside-toplevel
+        import mmap # pylint: disable=import-outside-toplevel
+        if (encoding := codecs.lookup(encoding).name) not in ('utf-8', 'ascii', 'iso8859-1'):
+            raise ValueError(f"Unsupported file encoding: {encoding}, use utf-8, ascii or latin-1")
+        with open(path, 'rb') as f: # the map keeps its own handle
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty files can't be mapped
+                buf = b''
+        if encoding != 'utf-8' or (src := Utf8Parser._Source(buf, Utf8Parser.CHUNK, Utf8Parser.OVERLAP)).ascii:
+            return BytesParser(buf, **kwargs)
+        return Utf8Parser(src, **kwargs)
 
     def _fork(self):
+        p = self.__class__(self.source, self.state, self.pos, self._skip, self.spans)
+        p._memo = self._memo
         if __debug__:
             if self.tracing:
-                p = self.__class__(self.source, self.state, self.pos, self._skip)
                 setattr(p, '_lsd', self._lsd + len(self._lookahead_stack)) # lookahead stack depth of parent parser
-                return p
-        return self.__class__(self.source, self.state, self.pos, self._skip)
+        return p
 
     def _fork_behind(self):
         if __debug__:
             if self.tracing:
-                p = Lookbehind(self)
+                p = self._lookbehind(self)
                 setattr(p, '_lsd', self._lsd + len(self._lookahead_stack)) # lookahead stack depth of parent parser
                 return p
-        return Lookbehind(self)
+        return self._lookbehind(self)
 
 
     def _join(self, other):
@@ -663,7 +1232,10 @@ class Parser:
     def __call__(self): return self
     def __repr__(self):
         return (f"{self.__class__.__name__}({f'state={self.state}, ' if self.state is not None else ''}"
-                f"pos={self.pos}:'{str_context(self.source, self.pos)}')")
+                f"pos={self.pos}:'{self._context()}')")
+
+    def _context(self): # the source around the current position, for errors and repr
+        return str_context(self.source, self.pos)
 
     @property
     def ch(self):
@@ -713,7 +1285,7 @@ class Parser:
         if callable(msg):
             msg(self)
             return self.fail
-        raise ValueError(f"{msg} at: {str_context(self.source, self.pos)}")
+        raise ValueError(f"{msg} at: {self._context()}")
     def err_if(self, predicate, msg):
         if callable(predicate):  predicate = predicate()
         return self.err(msg) if predicate else self
@@ -747,7 +1319,8 @@ class Parser:
         return self
     def copy_from(self, start: int, out):
         """ Copies the text from 'start' position to the current position (not including) into 'out' """
-        if out is not None:   Parser.accumulate(out, self.source[start:self.pos])
+        if out is not None:
+            Parser.accumulate(out, Span(self.source, start, self.pos) if self.spans else self.source[start:self.pos])
 
     @property
     def lookahead(self):
@@ -764,16 +1337,16 @@ class Parser:
         if_ / elif_ / else_ / endif form (which adds possibility of multiple elif_ branches).
 
         Returns:
-            self (Parser) for chaining, or Parser.End() if in END_STATE.
+            self (Parser) for chaining, or Parser._END if in END_STATE.
         """
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         if __debug__:
             if self.tracing: self.trace(5, f"? lookahead at {self.pos}:'{self.ch}'")
         self._lookahead_stack.append(self.pos)
         return self
     @property
     def commit(self):
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         if __debug__:
             assert self._lookahead_stack, "Lookahead stack is empty"
             if self.tracing and self._lookahead_stack[-1] >= 0: # pos <0 are fake lookaheads pushed by Fail._bkt_else
@@ -782,19 +1355,24 @@ class Parser:
         return self
     @property
     def alt(self):
-        return Parser.End() if self.commit.is_end_state else Parser.Shunt(self)
+        if self.commit.is_end_state:  return Parser._END
+        if (b := self._shunt) is None:
+            b = self._shunt = Parser.Shunt(self)
+        return b
     @property
     def is_backtrackable(self):
-        return len(self._lookahead_stack) > 0
+        return len(stack := self._lookahead_stack) > 0 and stack[-1] != Parser._CUT
     def backtrack(self):
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         assert self._lookahead_stack, "Lookahead stack is empty"
         if (p := self._lookahead_stack.pop()) >= 0:
             self.pos = p
             if __debug__:
                 if self.tracing: self.trace(5, f"↩ backtrack to {self.pos}:'{self.ch}'")
+        elif p == Parser._CUT:
+            self.err("No match after cut")
         else:
-            return Parser.Fail(self)
+            return f if (f := self._fail) is not None else self._failed()
         return self
     @property
     def _bkt_else(self):
@@ -803,26 +1381,60 @@ class Parser:
         self._lookahead_stack.append(-1) # push fake lookahead
         return rv
     @property
+    def cut(self):
+        """Commits all enclosing lookaheads irrevocably, nothing before the current position can be tried again.
+        A later failure that would backtrack one of these lookaheads raises `ValueError` instead (via `err()`).
+        Lookaheads opened after the cut backtrack as usual. Memoized results behind the cut are released.
+        ```python
+        p.if_.one('let').cut.ws.one(p.identifier, name).else_.one(expr).endif # 'let 1' is an error, not an expr
+        ```
+        """
+        if self.is_end_state:  return Parser._END
+        if __debug__: self.trace(3, "✂ cut")
+        if stack := self._lookahead_stack:
+            stack[:] = [Parser._CUT] * len(stack) # still balanced by commit/backtrack, but not backtrackable
+        if (memo := self._memo) is not None:
+            for frame in memo.active: # results of the running memoized subroutines depend on the cut
+                frame[0] = True
+            if memo.owner is self:
+                memo.prune(self.pos)
+        return self
+    _CUT = -2 # lookahead stack entry committed by cut, -1 are fake lookaheads pushed by Fail._bkt_else
+
+    def _failed(self): # -> the Fail branch of this parser, stateless so it's made once
+        if (f := self._fail) is None:
+            f = self._fail = Parser.Fail(self)
+        return f
+    def _stop(self, cls): # -> the `cls` stop of this parser, made once and reset for every use
+        if (stops := self._stops) is None:
+            stops = self._stops = {}
+        if (b := stops.get(cls)) is None:
+            b = stops[cls] = cls(self)
+        else:
+            b.depth, b.lwm = 1, 0
+        return b
+
+    @property
     def fail(self):
         """Fails the current branch."""
-        return Parser.End() if self.is_end_state else Parser.Fail(self)
+        return Parser._END if self.is_end_state else self._failed()
     def fail_if(self, predicate, *args, **kwargs):
         """Fails the current branch if `predicate` or `predicate(*args, **kwargs)` (callable) is True."""
-        if self.is_end_state:    return Parser.End()
+        if self.is_end_state:    return Parser._END
         if callable(predicate):  predicate = predicate(*args, **kwargs)
-        return Parser.Fail(self) if predicate else self
+        return self._failed() if predicate else self
     @property
     def back(self):
         """Backtracks all uncommitted lookahead branches of the expression; returns `False` for the whole expression."""
-        if self.is_end_state:   return Parser.End()
+        if self.is_end_state:   return Parser._END
         if __debug__: self.trace(3, "↰ back")
-        return Parser.Back(self)
+        return self._stop(Parser.Back)
     @property
     def back_ok(self):
         """Backtracks all uncommitted lookahead branches; returns `True` for the whole expression."""
-        if self.is_end_state:   return Parser.End()
+        if self.is_end_state:   return Parser._END
         if __debug__: self.trace(3, "↰ₒₖ back_ok")
-        return Parser.BackOk(self)
+        return self._stop(Parser.BackOk)
     @property
     def break_(self):
         """Stops the current expression by returning a `Stop` object (evaluates to `False` for the whole expression).
@@ -832,16 +1444,16 @@ class Parser:
         p.if_.one('STOP').back.else_.one('more matching').endif   # backtracks the 'STOP'.
         ```
         """
-        if self.is_end_state:   return Parser.End()
+        if self.is_end_state:   return Parser._END
         if __debug__: self.trace(3, "↴ break")
-        return Parser.Break(self)
+        return self._stop(Parser.Break)
     @property
     def continue_(self):
         """Companion to `break_`: stops the current expression, while committing all lookahead branches.
         Returns True for the whole expression."""
-        if self.is_end_state:   return Parser.End()
+        if self.is_end_state:   return Parser._END
         if __debug__: self.trace(3, "↻ continue")
-        return Parser.Continue(self)
+        return self._stop(Parser.Continue)
     @property
     def end(self):
         """Put Parser in END_STATE, clear the lookahead stack."""
@@ -902,7 +1514,7 @@ class Parser:
             if self.tracing:
                 self.trace(3, f"↑ check {Parser._f_call_to_str(f, args, kwargs)}")
         r = f.apply(*args, **kwargs) if isinstance(f, Val) else f(*args, **kwargs)
-        return self if r else Parser.Fail(self)
+        return self if r else self._failed()
 
     def slice(self, len_of_slice):
         """Returns the forward source slice (from current pos to current pos +
@@ -942,19 +1554,21 @@ class Parser:
 
         Behind is useful to find context around the current position, e.g., word boundaries, prefixes, etc.
         """
-        if self.is_end_state:  return Parser.End()
-        if self.is_past_end:   return Parser.Fail(self) # can't look behind past the end
+        if self.is_end_state:  return Parser._END
+        if self.is_past_end:   return self._failed() # can't look behind past the end
         p = self._fork_behind()
         result = kwargs.pop('acc', None)
-        f_, has_params = p._dispatch(f, kwargs) #pylint: disable=protected-access
-        if f_(args, kwargs) if has_params else f_(): #pylint: disable=no-value-for-parameter
-            if not has_params and args:
-                result = ((result, *args) if result is not None else Acc(*args))
-            p.copy_from(0, result)
+        h, m, has_params = p._dispatch(f, kwargs) #pylint: disable=protected-access
+        if h(p, m, args, kwargs) if has_params else h(p, m):
+            if result is not None or (args and not has_params):
+                v = Span(self.source, self.pos - p.pos, self.pos) if self.spans else p.source[0:p.pos]
+                if result is not None:  Parser.accumulate(result, v)
+                if not has_params:
+                    for out in args:  Parser.accumulate(out, v)
         else:
             if nomatch is not None:
                 self.err(nomatch)
-            return Parser.Fail(self)
+            return f if (f := self._fail) is not None else self._failed()
         return self
 
     def one(self, f, *args, nomatch = None, **kwargs):
@@ -1000,50 +1614,76 @@ class Parser:
             **kwargs: Additional keyword arguments passed to `f`.
 
         """
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         start = self.pos
         result = kwargs.pop('acc', None)
-        f_, has_params = self._dispatch(f, kwargs)
+        h, m, has_params = self._dispatch(f, kwargs)
         # result of matchers is converted to bool, so matcher's Break/Continue/Back/BackOk stops are not propagated out of the subroutine
-        if f_(args, kwargs) if has_params else f_(): #pylint: disable=no-value-for-parameter
-            if not has_params and args:
-                result = ((result, *args) if result is not None else Acc(*args))
-            self.copy_from(start, result)
+        if h(self, m, args, kwargs) if has_params else h(self, m):
+            if result is not None or (args and not has_params):
+                v = Span(self.source, start, self.pos) if self.spans else self.source[start:self.pos]
+                if result is not None:  Parser.accumulate(result, v)
+                if not has_params:
+                    for out in args:  Parser.accumulate(out, v)
         else:
             if nomatch is not None:
                 self.err(nomatch)
-            return Parser.Fail(self)
+            return f if (f := self._fail) is not None else self._failed()
         return self
 
     def get_one_ctx(self, f, *args, nomatch = None, **kwargs):
         # Makes a reusable context for one_with_ctx()
-        return [self._dispatch(f, kwargs), nomatch, args, kwargs]
+        return Parser._make_ctx(self._dispatch(f, kwargs), nomatch, args, kwargs)
+
+    @staticmethod
+    def _make_ctx(d, nomatch, args, kwargs):
+        # -> [(h, m, has_params), nomatch, args, kwargs, plan], `plan` are the positional sinks of the matched text
+        # resolved once (see _sink_plan()). Matchers with params take the args instead, unless _match_run() skips them.
+        return [d, nomatch, args, kwargs, Parser._sink_plan(Acc(*args)) if args else ()]
 
     def one_with_ctx(self, ctx):
         # one() that uses context returned by get_one_ctx(), to be used in loops, otherwise the same as one()
-        (f_, has_params), nomatch, args, kwargs = ctx
+        (h, m, has_params), nomatch, args, kwargs, plan = ctx
         start = self.pos
-        if f_(args, kwargs) if has_params else f_():
-            result = None
-            if not has_params and args:
-                result = Acc(*args)
-            self.copy_from(start, result)
+        if h(self, m, args, kwargs) if has_params else h(self, m):
+            if plan and not has_params:
+                v = Span(self.source, start, self.pos) if self.spans else self.source[start:self.pos]
+                for append_ in plan:  append_(v)
         else:
             if nomatch is not None:
                 self.err(nomatch)
-            return Parser.Fail(self)
+            return f if (f := self._fail) is not None else self._failed()
+        return self
+
+    def _one_ctx(self, ctx, result):
+        # one() with a context made by get_one_ctx() and `acc=` in `result` (used by Rule)
+        (h, m, has_params), nomatch, args, kwargs, plan = ctx
+        start = self.pos
+        if h(self, m, args, kwargs) if has_params else h(self, m):
+            if result is not None or (plan and not has_params):
+                v = Span(self.source, start, self.pos) if self.spans else self.source[start:self.pos]
+                if result is not None:  Parser.accumulate(result, v)
+                if not has_params:
+                    for append_ in plan:  append_(v)
+        else:
+            if nomatch is not None:
+                self.err(nomatch)
+            return f if (f := self._fail) is not None else self._failed()
         return self
 
     def one_or_more(self, f, *args, **kwargs):
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         if __debug__:
             if self.tracing: self.trace(4, f"one_or_more({self._matcher_to_str(f)})")
-        start = self.pos
         result = kwargs.pop('acc', None)
-        ctx = self.get_one_ctx(f, *args, **kwargs)
+        return self._one_or_more_ctx(self.get_one_ctx(f, *args, **kwargs), result)
+
+    def _one_or_more_ctx(self, ctx, result):
+        start = self.pos
         if not (ret := self.one_with_ctx(ctx)):
             return ret
-        ctx[1] = None # remove nomatch since we found at least one match (see get_one_ctx() for why ctx[1])
+        if ctx[1] is not None: # drop nomatch since we found at least one match (see get_one_ctx() for why ctx[1])
+            ctx = [ctx[0], None, *ctx[2:]]
         ret, _ = self._match_more(ctx)
         self.copy_from(start, result)
         return ret
@@ -1058,19 +1698,21 @@ class Parser:
         return ret
 
     def zero_or_more(self, f, *args, **kwargs):
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         if __debug__:
             if self.tracing: self.trace(4, f"zero_or_more({self._matcher_to_str(f)})")
-        start = self.pos
         result = kwargs.pop('acc', None)
-        ctx = self.get_one_ctx(f, *args, **kwargs)
+        return self._zero_or_more_ctx(self.get_one_ctx(f, *args, **kwargs), result)
+
+    def _zero_or_more_ctx(self, ctx, result):
+        start = self.pos
         ret, k = self._match_more(ctx)
         if k: # (ret and k) copy result if there's at least one match
             self.copy_from(start, result)
         return ret
 
     def zero_or_one(self, f, *args, **kwargs):
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         if __debug__:
             if self.tracing: self.trace(4, f"zero_or_one({self._matcher_to_str(f)})")
         if self.lookahead.one(f, *args, **kwargs).is_ok:
@@ -1078,15 +1720,23 @@ class Parser:
         # self.copy_from(self.pos, kwargs.get('acc', None)) # set/append '' to result if no match
         return self.backtrack()
 
+    def _zero_or_one_ctx(self, ctx, result):
+        if self.lookahead._one_ctx(ctx, result).is_ok:
+            return self.commit
+        return self.backtrack()
+
     def repeat(self, min_count: int, max_count: int, f, *args, **kwargs):
-        if self.is_end_state:  return Parser.End()
+        if self.is_end_state:  return Parser._END
         if __debug__:
             if self.tracing: self.trace(4, f"repeat({min_count}, {max_count}, {self._matcher_to_str(f)})")
-        start = self.pos
         result = kwargs.pop('acc', None)
-        ctx = self.get_one_ctx(f, *args, **kwargs)
-        i = 0
+        return self._repeat_ctx(min_count, max_count, self.get_one_ctx(f, *args, **kwargs), result)
+
+    def _repeat_ctx(self, min_count, max_count, ctx, result):
+        start = self.pos
         p = self.lookahead
+        if (i := self._match_run(ctx, min(max_count, Parser.PARSE_LIMIT + 1))) > Parser.PARSE_LIMIT:
+            raise ValueError("Infinite loop or input too long")
         while i < max_count and p.one_with_ctx(ctx).is_active:
             i += 1
             if i > Parser.PARSE_LIMIT:  raise ValueError("Infinite loop or input too long")
@@ -1096,6 +1746,28 @@ class Parser:
             return self.commit
         return self.backtrack().fail
 
+    def _rule_q(self, a): # Rule step: quantifier with a pre-resolved context
+        if self.is_end_state:  return Parser._END
+        run, pre, ctx, acc = a
+        return run(self, *pre, ctx, acc)
+
+    def _rule_qd(self, a, env): # Rule step: quantifier with placeholders
+        if self.is_end_state:  return Parser._END
+        run, pre, d, bind_f, (args, kwargs, nomatch, acc), (b_args, b_kwargs, b_nomatch, b_acc), b_pre = a
+        if b_pre:  pre = b_pre(env)
+        if b_args:  args = b_args(env)
+        if b_kwargs:  kwargs = b_kwargs(env)
+        if b_nomatch:  nomatch = b_nomatch(env)
+        if b_acc:  acc = b_acc(env)
+        if d is None:
+            d = self._dispatch(bind_f(env), kwargs)
+        return run(self, *pre, Parser._make_ctx(d, nomatch, args, kwargs), acc)
+
+    def _rule_call(self, a, env): # Rule step: any other method with placeholders
+        name, bind = a
+        args, kwargs = bind(env)
+        return getattr(self, name)(*args, **kwargs)
+
     # LOOP/MATCH ALIASES:
     def at_least(self, count: int, f, *args, **kwargs):
         """ Alias for `Parser.repeat(count, PARSE_LIMIT, f, ...)` """
@@ -1175,7 +1847,157 @@ class Parser:
             def x_(self, f, *args, **kwargs):  return self.repeat(lower, upper, f, *args, **kwargs)
         return set_meth(x_)
 
+    class _Trie: # prefix trie of an ordered alternation of literals, keeps the first-match-wins order
+        __slots__ = ('root', 'keys', 'ic')
+        def __init__(self, keys, ic):
+            self.root, self.keys, self.ic = {}, keys, ic
+            for i, k in enumerate(keys):
+                node = self.root
+                for c in (k.lower() if ic else k):
+                    node = node.setdefault(c, {})
+                node.setdefault(None, (i, k)) # terminal: (order, key)
+
+        def match(self, p): # -> first key in order that matches at p.pos (see _scan_any()) or None
+            src, i, n, end_char, ic = p.source, p.pos, p.len, p.END_CHAR, self.ic
+            node = self.root
+            best = node.get(None) if i <= n else None # past the end slice() is END_CHAR
+            while True:
+                c = src[i] if i < n else end_char
+                if ic:
+                    if c in Parser._IC_SPECIAL:
+                        return p._scan_any_ic(self.keys) # pylint: disable=protected-access
+                    c = c.lower()
+                if (node := node.get(c)) is None:
+                    break
+                if (t := node.get(None)) is not None and (best is None or t[0] < best[0]):
+                    best = t
+                if (i := i + 1) > n: # slice() adds a single END_CHAR
+                    break
+            return None if best is None else best[1]
+
+    class _Buckets: # literals bucketed by length: one slice and one dict probe per distinct length
+        __slots__ = ('buckets', 'ic')
+        def __init__(self, keys, ic):
+            by_len = {}
+            for i, k in enumerate(keys):
+                by_len.setdefault(len(k), {}).setdefault(k.lower() if ic else k, (i, k))
+            # (length, {key: (order, key)}, order of the bucket's first key) in the order of the first keys
+            self.buckets = tuple((n, b, next(iter(b.values()))[0]) for n, b in by_len.items())
+            self.ic = ic
+
+        def match(self, p): # -> first key in order that matches at p.pos (see _scan_any()) or None
+            best = None
+            for n, b, first in self.buckets:
+                if best is not None and first > best[0]: # no earlier key in this and later buckets
+                    break
+                if (t := b.get(p.slice(n).lower() if self.ic else p.slice(n))) is not None and (best is None or t[0] < best[0]):
+                    best = t
+            return None if best is None else best[1]
+
+    # str.lower() of these isn't a single char or depends on the context, so ic matching of them isn't per char
+    _IC_SPECIAL = frozenset('\u0130\u03a3')
+
+    _MIN_INDEXED = 8 # mutable literal collections with fewer keys are scanned, not indexed and kept in the cache
+
+    @staticmethod
+    def _contents(t): # -> what mutable literals matcher `t` is compared by to its snapshot: any change is seen
+        return t if t.__class__ is list or isinstance(t, set) else tuple(t) # mappings: their keys in order
+
+    @staticmethod
+    def _literals(t, ic): # -> cached index of literals matcher `t` or None if `t` has no index
+        # Tuples and lists are indexed with a prefix trie, sets and mappings (keys) are bucketed by length.
+        # Mutable matchers keep a snapshot of their contents and are re-indexed when they don't compare equal to it,
+        # a C level compare that costs less than a scan of the keys.
+        if (e := (cache := Parser._cache_literals).get(id(t))) is None or (
+                (snap := e[1]) is not None and snap != Parser._contents(t)):
+            if (cls := t.__class__) is tuple:
+                snap = None
+            elif cls is list or isinstance(t, (set, Mapping)):
+                if len(t) < Parser._MIN_INDEXED:
+                    return None
+                snap = t.copy() if cls is list else frozenset(t) if isinstance(t, set) else tuple(t)
+            else:
+                return None
+            if len(cache) >= Parser.DISPATCH_CACHE_SIZE:
+                del cache[next(iter(cache))] # evict the oldest
+            # entry: [matcher (keeps its id unique), snapshot of a mutable matcher, index, ic index]
+            e = cache[id(t)] = [t, snap, None, None]
+            if not all(k.__class__ is str for k in t): # Val items change
+                e[2] = e[3] = False
+        if (ix := e[3 if ic else 2]) is None:
+            if (cls := t.__class__) is not tuple and cls is not list:
+                ix = Parser._Buckets(tuple(t), ic)
+            elif ic and any(Parser._IC_SPECIAL.intersection(k) for k in t):
+                ix = False
+            else:
+                ix = Parser._Trie(tuple(t), ic)
+            e[3 if ic else 2] = ix
+        return ix or None
+
+    class _Alternation: # FIRST sets of an ordered alternation of matchers: which alternatives can start with a char
+        __slots__ = ('index', 'rest', 'all', 'ic')
+        def __init__(self, t, ic):
+            firsts = [Parser._first(x, ic) for x in t]
+            def cands(ch): # -> ((matcher, FIRST test or None, is the last alternative), ...) in order
+                return tuple((x, None if f.__class__ is frozenset else f, i == len(t) - 1) for i, (x, f) in enumerate(zip(t, firsts))
+                             if f is None or f.__class__ is not frozenset or ch in f)
+            self.index = {ch: cands(ch) for ch in frozenset().union(*(f for f in firsts if f.__class__ is frozenset))}
+            self.rest = cands(None) # chars that are in no FIRST set
+            self.all = tuple((x, None, i == len(t) - 1) for i, x in enumerate(t))
+            self.ic = ic
+
+        def candidates(self, ch):
+            if self.ic:
+                if ch in Parser._IC_SPECIAL:
+                    return self.all
+                ch = ch.lower()
+            return self.index.get(ch, self.rest)
+
+    @staticmethod
+    def _first(x, ic): # -> FIRST set of matcher `x`: frozenset of chars (lowered for ic), `first(ch, kwargs)` test, or None if unknown
+        if (cls := x.__class__) is str:
+            return frozenset((x.lower() if ic else x)[:1]) or None
+        if cls is tuple:
+            if all(k.__class__ is str for k in x): # literals
+                return None if '' in x else frozenset(k.lower()[0] if ic else k[0] for k in x)
+            firsts = [Parser._first(k, ic) for k in x]
+            if any(f.__class__ is not frozenset for f in firsts):
+                return None
+            return frozenset().union(*firsts)
+        if cls is In and x.s.__class__ is str:
+            return frozenset(x.s) or None # matched as f(ch.lower()) with ic
+        if cls is Range and len(x) <= 256:
+            return frozenset(map(chr, range(ord(x.lo), ord(x.hi) + 1)))
+        if cls is CharSet and not x.ranges and not x.neg:
+            return x.set or None
+        if callable(x) and hasattr(x, '__parsek_sub'):
+            return getattr(x, '__parsek_first', None)
+        return None # negations, predicates, patterns, mutable collections, etc.
+
+    _MIN_ALTERNATION = 4 # shorter tuples of matchers are tried in order, indexing them costs more than it saves
+
+    @staticmethod
+    def _alternation(t, ic): # -> cached FIRST sets of tuple of matchers `t`, or None to try all alternatives in order
+        if len(t) < Parser._MIN_ALTERNATION:
+            return None
+        if (e := (cache := Parser._cache_first).get(id(t))) is None: # first seen: tuples made per call aren't indexed
+            if len(cache) >= Parser.DISPATCH_CACHE_SIZE:
+                del cache[next(iter(cache))] # evict the oldest
+            cache[id(t)] = [t, None, None] # keeps `t` alive so its id stays unique
+            return None
+        if (alt := e[2 if ic else 1]) is None:
+            alt = e[2 if ic else 1] = Parser._Alternation(t, ic)
+        return alt
+
     def _match_any(self, t):
+        if (ix := Parser._literals(t, False)) is not None:
+            return ix.match(self)
+        return self._scan_any(t)
+    def _match_any_ic(self, t):
+        if (ix := Parser._literals(t, True)) is not None:
+            return ix.match(self)
+        return self._scan_any_ic(t)
+    def _scan_any(self, t):
         prev_len = None
         for k in t:
             if (key_len := len(k := str(k))) != prev_len: # cache the slice
@@ -1184,7 +2006,7 @@ class Parser:
                 return k
             prev_len = key_len
         return None
-    def _match_any_ic(self, t):
+    def _scan_any_ic(self, t):
         prev_len = None
         for k in t:
             if (key_len := len(k := str(k))) != prev_len: # cache the slice
@@ -1194,7 +2016,8 @@ class Parser:
             prev_len = key_len
         return None
     def _match_more(self, ctx):
-        k = 0
+        if (k := self._match_run(ctx, Parser.PARSE_LIMIT + 1)) > Parser.PARSE_LIMIT:
+            raise ValueError("Infinite loop or input too long")
         while self.lookahead.one_with_ctx(ctx).is_active:
             self.commit # pylint: disable=pointless-statement
             k += 1
@@ -1202,52 +2025,130 @@ class Parser:
         return self.backtrack(), k
 
     def _dispatch_one(self, f, kwargs):
+        # Resolves matcher `f` to its harness: `(h, m, has_params)`. `h` is an unbound Parser method called as
+        # `h(p, m)`, or `h(p, m, args, kwargs)` if `has_params`. Harnesses don't depend on the parser instance,
+        # so the same resolution can be reused with any parser (see `get_one_ctx()` and `Rule`).
+        # Subclasses that match something other than chars resolve into their own cache (see `TokenParser`).
         neg, f = Not.crack(f)
+        stats = Parser._cache_dispatch_stats
+        try:
+            if (cls := f.__class__) is tuple: # by identity: hashing a long tuple on every call costs as much as resolving it
+                h, m, has_params, t = (cache := self._cache_dispatch)[key := (id(f), kwargs.get('ic', False), neg)]
+                if t is not f:
+                    raise KeyError(key)
+            else:
+                # with its class: Val and other value-like matchers compare equal to the literal they hold
+                h, m, has_params, _ = (cache := self._cache_dispatch)[key := (f, cls, kwargs.get('ic', False), neg)]
+            stats[0] += 1
+            return h, (f if m is None else m), has_params
+        except KeyError:
+            pass
+        except TypeError: # unhashable matcher: list, set, dict, etc.
+            key = None
+        stats[1] += 1
+        h, m, has_params = r = self._resolve_one(f, neg, kwargs)
+        # Cached: literals (m is the lowered literal for ic), patterns, callables except closures and methods bound to a
+        # parser, which are typically per-parse subroutines that would keep their parser alive, and tuples without any
+        # closures or bound methods (kept alive by the entry, so their id can't be reused).
+        if key is not None and Parser.DISPATCH_CACHE_SIZE > 0 and (
+                cls is str or cls is re.Pattern or (Parser._cacheable_tuple(f) if cls is tuple else callable(f)
+                    and not getattr(f, '__closure__', None) and not isinstance(getattr(f, '__self__', None), Parser))):
+            if len(cache) >= Parser.DISPATCH_CACHE_SIZE:
+                del cache[next(iter(cache))] # evict the oldest
+            cache[key] = (h, None if m is f else m, has_params, f if cls is tuple else None)
+        return r
+
+    @staticmethod
+    def _cacheable_tuple(t): # -> False if `t` (or a nested tuple or Not) has a closure or a bound method
+        for x in t:
+            x = Not.crack(x)[1]
+            if x.__class__ is tuple:
+                if not Parser._cacheable_tuple(x):
+                    return False
+            elif callable(x) and (getattr(x, '__closure__', None) # not bound, builtins are bound to their module:
+                                  or not isinstance(getattr(x, '__self__', None), (type(None), type(re)))):
+                return False
+        return True
+
+    @staticmethod
+    def dispatch_cache_info():
+        """Returns the matcher dispatch cache statistics: `{'hits': int, 'misses': int, 'size': int, 'maxsize': int}`.
+
+        Every quantifier resolves its matcher to an optimized harness (see `get_one_ctx()`). The resolution of
+        literals, tuples and module-level callables is cached globally, keyed by `(matcher, ic, negated)`, tuples by
+        identity.
+        """
+        hits, misses = Parser._cache_dispatch_stats
+        return {'hits': hits, 'misses': misses, 'size': len(Parser._cache_dispatch) + len(BytesParser._cache_dispatch) + len(StreamParser._cache_dispatch)
+                + len(TokenParser._cache_dispatch),
+                'maxsize': Parser.DISPATCH_CACHE_SIZE}
 
+    @staticmethod
+    def dispatch_cache_clear():
+        """Clears the matcher dispatch cache and its statistics, and the indexes of literal collections and
+        alternations."""
+        Parser._cache_dispatch.clear()
+        Parser._cache_literals.clear()
+        Parser._cache_first.clear()
+        BytesParser._cache_dispatch.clear()
+        StreamParser._cache_dispatch.clear()
+        TokenParser._cache_dispatch.clear()
+        Parser._cache_dispatch_stats[:] = [0, 0]
+
+    @staticmethod
+    def _resolve_one(f, neg, kwargs):
+        if isinstance(f, re.Pattern):
+            if kwargs.get('ic', False) and not f.flags & re.I:
+                f = re.compile(f.pattern, f.flags | re.I)
+            return (Parser._one_re_neg, f, False) if neg else (Parser._one_re, f, True)
+        if f.__class__ is CharSet:
+            if kwargs.get('ic', False):
+                return (Parser._one_unary_neg_ic if neg else Parser._one_unary_ic), f, False
+            if not f.ranges: # plain set lookup, no call:
+                return (Parser._one_set if neg is f.neg else Parser._one_set_neg), f.set, False
+            return (Parser._one_unary_neg if neg else Parser._one_unary), f, False
         if callable(f):
             if hasattr(f, '__parsek_sub'): # needs args
-                if hasattr(f, '__parsek_new_stack'):
-                    f_ = self._one_sr_ns_neg if neg else self._one_sr_ns
-                else:
-                    f_ = self._one_sr_neg if neg else self._one_sr
-                return (lambda args, kwargs, f=f_, sr=f: f(sr, args, kwargs)), True
+                if hasattr(f, '__parsek_memo') and not neg:
+                    return Parser._one_sr_memo, f, True
+                h = Parser._one_sr_ns if hasattr(f, '__parsek_new_stack') else Parser._one_sr
+                if neg:
+                    return (Parser._one_sr_ns_neg if h is Parser._one_sr_ns else Parser._one_sr_neg), f, True
+                if (first := getattr(f, '__parsek_first', None)) is not None:
+                    return Parser._one_sr_first, (h, f, first), True
+                return h, f, True
             if is_unary(f):
                 if kwargs.get('ic', False):
-                    f_ = self._one_unary_neg_ic if neg else self._one_unary_ic
-                else:
-                    f_ = self._one_unary_neg if neg else self._one_unary
-                return (lambda f=f_, pred=f: f(pred)), False
+                    return (Parser._one_unary_neg_ic if neg else Parser._one_unary_ic), f, False
+                return (Parser._one_unary_neg if neg else Parser._one_unary), f, False
             # Non-unary single-char callable matcher that needs args/kwargs:
             if kwargs.get('ic', False):
-                f_ = self._one_call_neg_ic if neg else self._one_call_ic
-            else:
-                f_ = self._one_call_neg if neg else self._one_call
-            return (lambda args, kwargs, f=f_, cl=f: f(cl, args, kwargs)), True
+                return (Parser._one_call_neg_ic if neg else Parser._one_call_ic), f, True
+            return (Parser._one_call_neg if neg else Parser._one_call), f, True
 
         if isinstance(f, tuple) and not all(isinstance(x, (str, Val)) for x in f):
-            return (lambda args, kwargs, f=self._one_multi_neg if neg else self._one_multi, t=f: f(t, args, kwargs)), True
+            return (Parser._one_multi_neg if neg else Parser._one_multi), f, True
         if isinstance(f, (tuple,set,list,Mapping)):
             assert all(isinstance(x, (str, Val)) for x in f), "Match set elements must be str or Val"
-            matcher = self._match_any_ic if kwargs.get('ic', False) else self._match_any
-            f_ = self._one_map_neg if neg else self._one_map
+            ic = kwargs.get('ic', False)
             if isinstance(f, Mapping):
-                return (lambda args, _kwargs, f=f_, m=f, matcher=matcher: f(m, matcher, args)), True
-            return (lambda f=f_, t=f, matcher=matcher: f(t, matcher, None)), False
+                if ic:  return (Parser._one_map_neg_ic if neg else Parser._one_map_ic), f, True
+                return (Parser._one_map_neg if neg else Parser._one_map), f, True
+            if ic:  return (Parser._one_any_neg_ic if neg else Parser._one_any_ic), f, False
+            return (Parser._one_any_neg if neg else Parser._one_any), f, False
 
         # literal:
         if not isinstance(f, str):  f = str(f)
         if (ic := kwargs.get('ic', False)):
             f = f.lower()
         if (f_len := len(f)) == 1: # single char
-            if ic:  f_ = self._one_char_neg_ic if neg else self._one_char_ic
-            else:   f_ = self._one_char_neg    if neg else self._one_char
-            return (lambda f=f_, ch=f: f(ch)), False
+            if ic:  return (Parser._one_char_neg_ic if neg else Parser._one_char_ic), f, False
+            return (Parser._one_char_neg if neg else Parser._one_char), f, False
         if f_len == 0: # empty string one(Not('')) consumes one char, even END_CHAR unlike one(Not(p.END_CHAR))
-            return ((lambda: True) if not neg else self.next), False
+            return (Parser._one_empty_neg if neg else Parser._one_empty), f, False
         # str match n > 1
-        if ic:  f_ = self._one_str_neg_ic if neg else self._one_str_ic
-        else:   f_ = self._one_str_neg    if neg else self._one_str
-        return (lambda f=f_, s=f, l=f_len: f(s, l)), False
+        if ic:  return (Parser._one_str_neg_ic if neg else Parser._one_str_ic), f, False
+        return (Parser._one_str_neg if neg else Parser._one_str), f, False
 
     _dispatch = _dispatch_one # non-tracing dispatch function
 
@@ -1266,6 +2167,103 @@ class Parser:
     def _one_sr_ns_neg(self, f, args, kwargs):
         if advance := not bool(f(self._fork(), *args, **kwargs)): self.next()
         return advance
+    def _one_sr_first(self, m, args, kwargs): # subroutine annotated with its FIRST set, see first_set()
+        h, f, first = m
+        return bool(first(self.ch, kwargs)) and h(self, f, args, kwargs)
+
+    class _Memo: # packrat memo of a parse: pos -> {(subroutine, state[, kwargs...]): (ok, end pos, end state, emitted)}
+        __slots__ = ('table', 'owner', 'prune_at', 'hits', 'misses', 'active', 'growing')
+        def __init__(self, owner):
+            self.table, self.owner, self.prune_at, self.hits, self.misses = {}, owner, 64, 0, 0
+            self.active = []  # [tainted] frames of the memoized subroutines being run, innermost last
+            self.growing = {} # (pos, key) -> index of the frame growing a left recursive seed there
+
+        def prune(self, floor): # drops positions behind `floor`, nothing can backtrack there
+            floor = min((q for q, _ in self.growing), default=floor) if self.growing else floor
+            self.table = {q: e for q, e in self.table.items() if q >= floor}
+            self.prune_at = max(64, 2 * len(self.table)) # amortized by the table size
+
+    def _one_sr_memo(self, f, args, kwargs):
+        if (memo := self._memo) is None:
+            memo = self._memo = Parser._Memo(self)
+        elif memo.owner is self and len(memo.table) >= memo.prune_at:
+            memo.prune(min((q for q in self._lookahead_stack if q >= 0), default=self.pos)) # lowest backtrack point
+        try:
+            key = (f, self.state, *kwargs.items()) if kwargs else (f, self.state)
+            entry = memo.table.get(pos := self.pos, Parser._NO_MEMO).get(key)
+        except TypeError: # unhashable state or kwargs
+            return bool(f(self, *args, **kwargs))
+        if entry is not None:
+            memo.hits += 1
+            if memo.growing and (i := memo.growing.get((pos, key))) is not None:
+                for frame in memo.active[i + 1:]: # results of the callers in between depend on the seed
+                    frame[0] = True
+            ok, self.pos, self.state, log = entry
+        elif self._skip:
+            return bool(f(self, *args, **kwargs))
+        else:
+            memo.misses += 1
+            if hasattr(f, '__parsek_left_rec'):
+                ok, log = self._memo_grow(memo, f, args, kwargs, pos, key)
+            else:
+                ok, log, keep = self._memo_run(memo, f, args, kwargs, True)
+                if keep:
+                    memo.table.setdefault(pos, {})[key] = (ok, self.pos, self.state, log)
+                return ok # emitted as it ran
+        for i, v, tail in log: # see _MemoSink
+            if tail is None:
+                args[i][v[0]] = v[1]
+            else:
+                Parser.accumulate((args[i], *tail) if tail else args[i], v)
+        return ok
+
+    def _memo_run(self, memo, f, args, kwargs, live=False): # -> (ok, emitted, can be memoized)
+        depth = len(self._lookahead_stack)
+        memo.active.append(frame := [False])
+        try:
+            log = []
+            ok = bool(f(self, *(_MemoSink(log, i, out, live) for i, out in enumerate(args)), **kwargs) if args
+                      else f(self, **kwargs))
+        finally:
+            memo.active.pop()
+        # don't memoize unbalanced lookaheads and results that depend on a left recursive seed being grown
+        return ok, (log if args else ()), not frame[0] and len(self._lookahead_stack) == depth and not self._skip
+
+    def _memo_grow(self, memo, f, args, kwargs, pos, key): # -> (ok, emitted)
+        # Left recursion (Warth et al.): the memo entry starts as a failed seed, so the recursive call at the same
+        # position fails and the subroutine matches its non left recursive alternative. The subroutine is then rerun
+        # with the last result as the seed for as long as that makes the match longer.
+        table, state = memo.table.setdefault(pos, {}), self.state
+        seed = table[key] = (False, pos, state, ())
+        memo.growing[(pos, key)] = len(memo.active)
+        keep = True
+        try:
+            while True:
+                ok, log, can_keep = self._memo_run(memo, f, args, kwargs)
+                if not ok or (seed[0] and self.pos <= seed[1]):
+                    if not seed[0]: # no seed ever matched, the result is this failure
+                        seed, keep = (ok, self.pos, self.state, log), keep and can_keep
+                    break
+                seed = table[key] = (ok, self.pos, self.state, log)
+                keep = keep and can_keep
+                self.pos, self.state = pos, state
+        finally:
+            del memo.growing[(pos, key)]
+        if keep:
+            table[key] = seed
+        else:
+            table.pop(key, None)
+        ok, self.pos, self.state, log = seed
+        return ok, log
+    _NO_MEMO = {}
+
+    def memo_info(self):
+        """Returns packrat memo statistics of this parse (see `parser_subroutine_memo`):
+        `{'hits': int, 'misses': int, 'positions': int, 'entries': int}`."""
+        if (memo := self._memo) is None:
+            return {'hits': 0, 'misses': 0, 'positions': 0, 'entries': 0}
+        return {'hits': memo.hits, 'misses': memo.misses, 'positions': len(memo.table),
+                'entries': sum(len(e) for e in memo.table.values())}
 
     def _one_unary(self, f):
         if advance := bool(f(self.ch)): self.next()
@@ -1280,6 +2278,13 @@ class Parser:
         if advance := not bool(f(self.ch.lower())): self.next()
         return advance
 
+    def _one_set(self, s):
+        if advance := self.ch in s: self.next()
+        return advance
+    def _one_set_neg(self, s):
+        if advance := self.ch not in s: self.next()
+        return advance
+
     def _one_call(self, f, args, kwargs):
         if advance := bool(f(self.ch, *args, **kwargs)): self.next()
         return advance
@@ -1294,14 +2299,26 @@ class Parser:
         return advance
 
     def _one_multi(self, t, args, kwargs):
-        last_i = len(t) - 1
-        for i, x in enumerate(t):
+        if (alt := Parser._alternation(t, kwargs.get('ic', False))) is None:
+            last_i = len(t) - 1
+            for i, x in enumerate(t):
+                if self.lookahead.one(x, *args, **kwargs):
+                    return self.commit.is_ok
+                if i < last_i: # backtrack if not the last one
+                    self.backtrack()
+                else: # commit the last one, since we failed to match any
+                    self.commit # pylint: disable=pointless-statement
+            return False
+        ch = self.ch
+        for x, first, is_last in alt.candidates(ch):
+            if first is not None and not first(ch, kwargs):
+                continue
             if self.lookahead.one(x, *args, **kwargs):
                 return self.commit.is_ok
-            if i < last_i: # backtrack if not the last one
-                self.backtrack()
-            else: # commit the last one, since we failed to match any
+            if is_last: # commit the last one, since we failed to match any
                 self.commit # pylint: disable=pointless-statement
+            else:
+                self.backtrack()
         return False
     def _one_multi_neg(self, t, args, kwargs):
         for x in t:
@@ -1312,13 +2329,34 @@ class Parser:
         self.next()
         return True
 
-    def _one_map(self, m, matcher, args):
-        if advance := (key := matcher(m)) is not None:
+    def _one_map(self, m, args, _kwargs):
+        if advance := (key := self._match_any(m)) is not None:
             self.next(len(key))
-            if args: self.accumulate(Acc(*args), m[key])
+            for out in args:  Parser.accumulate(out, m[key])
+        return advance
+    def _one_map_ic(self, m, args, _kwargs):
+        if advance := (key := self._match_any_ic(m)) is not None:
+            self.next(len(key))
+            for out in args:  Parser.accumulate(out, m[key])
+        return advance
+    def _one_map_neg(self, m, _args, _kwargs):
+        if advance := self._match_any(m) is None: self.next()
         return advance
-    def _one_map_neg(self, m, matcher, _args):
-        if advance := matcher(m) is None: self.next()
+    def _one_map_neg_ic(self, m, _args, _kwargs):
+        if advance := self._match_any_ic(m) is None: self.next()
+        return advance
+
+    def _one_any(self, t):
+        if advance := (key := self._match_any(t)) is not None: self.next(len(key))
+        return advance
+    def _one_any_ic(self, t):
+        if advance := (key := self._match_any_ic(t)) is not None: self.next(len(key))
+        return advance
+    def _one_any_neg(self, t):
+        if advance := self._match_any(t) is None: self.next()
+        return advance
+    def _one_any_neg_ic(self, t):
+        if advance := self._match_any_ic(t) is None: self.next()
         return advance
 
     def _one_char(self, ch):
@@ -1334,19 +2372,174 @@ class Parser:
         if advance := ch != self.ch.lower(): self.next()
         return advance
 
-    def _one_str(self, s, s_len):
-        if advance := self.slice(s_len) == s: self.next(s_len)
+    def _one_re(self, pat, args, _kwargs):
+        n, mo = self._re_match(pat)
+        if n < 0:  return False
+        if args: # named groups are emitted as a dict, e.g., to update a dict sink
+            v = (mo.groupdict() if pat.groupindex else
+                 Span(self.source, self.pos, self.pos + n) if self.spans else self.source[self.pos:self.pos + n])
+            for out in args:  Parser.accumulate(out, v)
+        self.next(n)
+        return True
+    def _one_re_neg(self, pat):
+        if advance := self._re_match(pat)[0] < 0: self.next()
+        return advance
+    def _re_match(self, pat): # -> (length, match object) of `pat` matched at the current position or (-1, None)
+        if (mo := pat.match(self.source, self.pos)) is None:  return -1, None
+        return mo.end() - mo.start(), mo
+
+    def _one_empty(self, _s):
+        return True
+    def _one_empty_neg(self, _s):
+        self.next()
+        return True
+
+    def _one_str(self, s):
+        if advance := self.slice(s_len := len(s)) == s: self.next(s_len)
         return advance
-    def _one_str_ic(self, s, s_len):
-        if advance := self.slice(s_len).lower() == s: self.next(s_len)
+    def _one_str_ic(self, s):
+        if advance := self.slice(s_len := len(s)).lower() == s: self.next(s_len)
         return advance
-    def _one_str_neg(self, s, s_len):
-        if advance := self.slice(s_len) != s: self.next()
+    def _one_str_neg(self, s):
+        if advance := self.slice(len(s)) != s: self.next()
         return advance
-    def _one_str_neg_ic(self, s, s_len):
-        if advance := self.slice(s_len).lower() != s: self.next()
+    def _one_str_neg_ic(self, s):
+        if advance := self.slice(len(s)).lower() != s: self.next()
         return advance
 
+    _re_harnesses = frozenset((_one_char, _one_char_neg, _one_str, _one_str_neg, _one_unary, _one_unary_neg, _one_set, _one_set_neg,
+                               _one_multi, _one_multi_neg, _one_any, _one_any_neg))
+
+    _scan_harnesses = frozenset((_one_unary, _one_unary_neg, _one_unary_ic, _one_unary_neg_ic, _one_set, _one_set_neg,
+                                 _one_char, _one_char_neg, _one_char_ic, _one_char_neg_ic))
+
+    def _match_run(self, ctx, max_count):
+        # Fast path of looping quantifiers: consumes a run of up to `max_count` matches of a simple, non-backtracking
+        # matcher and returns the number of matches. Literals, `In`, `Range`, `chars()` and their negation are matched
+        # with a single `re` match (if USE_RE), single char matchers and unary predicates like `str.isdigit` with a tight
+        # loop over the source (see _scan_run()). It only matches within the source, the regular loop takes over from
+        # there: END_CHAR, nomatch, etc. Not used with tracing (the harness is _one_with_trace) and the skip flag.
+        # Positional sinks (the ctx plan) still get every match separately. Not of a tuple hands its sinks to the
+        # lookahead of each alternative instead, so with sinks it always goes through the regular loop.
+        (h, m, _), _, _, kwargs, plan = ctx
+        if self._skip or (pos := self.pos) >= self.len:
+            return 0
+        r, src, base, buf, partial = None, self.source, 0, None, False
+        if Parser.USE_RE and not kwargs and h in Parser._re_harnesses and not (plan and h is Parser._one_multi_neg):
+            if (buf := src).__class__ is str:
+                pass
+            elif src.__class__ is BytesParser._Source:
+                buf = src.buf
+            elif src.__class__ is Utf8Parser._Source: # the decoded chunk, the run may go on past it (the regular loop)
+                base, buf = (src._lo, src._s) if src._lo <= pos < src._next else src.load(pos)
+                partial = base + len(buf) < self.len
+            elif src.__class__ is StreamParser._Source: # the window read so far, the same
+                base, buf, partial = src.start, src.text, not src.eof
+            else:
+                buf = None
+        if buf is not None:
+            try:
+                if (r := (cache := Parser._cache_re).get(key := (h, m) if buf.__class__ is str else (h, m, bytes), False)) is False:
+                    if len(cache) >= Parser.DISPATCH_CACHE_SIZE:
+                        cache.clear()
+                    r = cache[key] = Parser._make_re_run(h, m, buf.__class__ is not str)
+            except TypeError: # unhashable matcher: list or set
+                r = None
+        if r is not None:
+            pattern, w = r
+            n = (pattern.match(buf, pos - base).end() - pos + base) // w
+            if partial and h is Parser._one_str_neg and pos + n == base + len(buf): # `m` may start at the end of the chunk
+                n = max(n - len(m) + 1, 0)
+            n = min(n, max_count)
+        elif h in Parser._scan_harnesses:
+            w = 1
+            n = Parser._scan_run(h, m, src, pos, min(self.len, pos + max_count)) - pos
+        else:
+            return 0
+        if n:
+            self.pos = end = pos + n * w
+            if plan and not self.spans and src.__class__ is BytesParser._Source: # decode the run once
+                src, pos, end = src[pos:end], 0, end - pos
+            for append_ in plan:
+                if self.spans:
+                    for i in range(pos, end, w):  append_(Span(src, i, i + w))
+                else:
+                    for i in range(pos, end, w):  append_(src[i:i + w])
+        return n
+
+    @staticmethod
+    def _scan_run(h, m, src, i, end):
+        # Returns the end of the run of single char matches of harness `h` with matcher `m` in src[i:end]
+        if h is Parser._one_unary:
+            while i < end and m(src[i]):  i += 1
+        elif h is Parser._one_set:
+            while i < end and src[i] in m:  i += 1
+        elif h is Parser._one_set_neg:
+            while i < end and src[i] not in m:  i += 1
+        elif h is Parser._one_char:
+            while i < end and src[i] == m:  i += 1
+        elif h is Parser._one_char_neg:
+            while i < end and src[i] != m:  i += 1
+        elif h is Parser._one_unary_neg:
+            while i < end and not m(src[i]):  i += 1
+        elif h is Parser._one_unary_ic:
+            while i < end and m(src[i].lower()):  i += 1
+        elif h is Parser._one_unary_neg_ic:
+            while i < end and not m(src[i].lower()):  i += 1
+        elif h is Parser._one_char_ic:
+            while i < end and src[i].lower() == m:  i += 1
+        else: # _one_char_neg_ic
+            while i < end and src[i].lower() != m:  i += 1
+        return i
+
+    @staticmethod
+    def _make_re_run(h, m, latin1=False): # -> (compiled pattern matching a run of `m`, width of a single match) or None
+        # latin1: the pattern is for bytes (see BytesParser), chars past latin-1 (e.g., END_CHAR) are never in the source
+        def compile_(pat, w):
+            if not latin1:
+                return re.compile(pat, re.S), w
+            try:
+                return re.compile(pat.encode('latin-1'), re.S), w
+            except UnicodeEncodeError: # a literal that can't be in bytes
+                return None
+        def in_latin1(lo, hi=None): # -> (lo, hi) clamped to latin-1 or None if past it
+            return None if latin1 and lo > '\xff' else (lo, min(hi, '\xff') if latin1 and hi is not None else hi)
+        if h is Parser._one_str or h is Parser._one_char:
+            return compile_(f"(?:{re.escape(m)})*", len(m))
+        if h is Parser._one_str_neg:
+            if Parser.END_CHAR in m: # near the end it's compared to input padded with END_CHAR, see slice()
+                return None
+            return compile_(f"(?:(?!{re.escape(m)}).)*", 1)
+        if h is Parser._one_set or h is Parser._one_set_neg or m.__class__ is CharSet:
+            neg, ranges = h is Parser._one_set_neg or h is Parser._one_unary_neg, ()
+            if m.__class__ is CharSet:
+                neg, ranges, m = neg is not m.neg, m.ranges, m.set
+            m = [c for c in m if in_latin1(c)]
+            ranges = [r for lo, hi in ranges if (r := in_latin1(lo, hi))]
+            if not m and not ranges: # [] is not a valid class
+                return compile_('.*' if neg else '', 1)
+            cls = ''.join(map(re.escape, sorted(m))) + ''.join(f"{re.escape(lo)}-{re.escape(hi)}" for lo, hi in ranges)
+            return compile_(f"[{'^' if neg else ''}{cls}]*", 1)
+        neg = h is Parser._one_char_neg or h is Parser._one_unary_neg or h is Parser._one_multi_neg or h is Parser._one_any_neg
+        items = m if h is Parser._one_multi or h is Parser._one_multi_neg or h is Parser._one_any or h is Parser._one_any_neg else (m,)
+        if not isinstance(items, tuple):
+            return None
+        cls = []
+        for x in items:
+            if x.__class__ is str and len(x) == 1:
+                if in_latin1(x):
+                    cls.append(re.escape(x))
+            elif x.__class__ is In and x.s.__class__ is str and x.s:
+                cls.extend(re.escape(c) for c in x.s if in_latin1(c))
+            elif x.__class__ is Range and len(x.lo) == 1 and len(x.hi) == 1:
+                if r := in_latin1(x.lo, x.hi):
+                    cls.append(f"{re.escape(r[0])}-{re.escape(r[1])}")
+            else:
+                return None
+        if not cls:
+            return compile_('.*' if neg else '', 1)
+        return compile_(f"[{'^' if neg else ''}{''.join(cls)}]*", 1)
+
     @staticmethod
     def _make_chars_matcher(spec: str):
         @parser_subroutine
@@ -1367,17 +2560,9 @@ class Parser:
         else:
             Parser(spec).x0_1('^', neg := Val(False)).x0_(atom, chars:=[], ranges := [])
 
-        out, r_chars = [], []
-        for r in ranges:
-            if len(r) <= 64: # `ch in "abc"` is faster than `'a' <= ch <= 'c'` for ranges under ~1K chars
-                r_chars.extend(chr(c) for c in range(ord(r.lo), ord(r.hi)+1))
-            else:
-                out.append(r)
-        if chars or r_chars: # append to the end, this way the end_char (if any) is always last
-            s = ''.join(dict.fromkeys(r_chars + chars)) # remove duplicates, keep order
-            out.append(In(s) if len(s) > 1 else s)
-        out = tuple(out) if len(out) > 1 else out[0] if out else ''
-        return Not(out) if neg else out
+        if not ranges and len(chars := ''.join(dict.fromkeys(chars))) < 2: # '' or a single char: literal harnesses are the fastest
+            return Not(chars) if neg else chars
+        return CharSet(chars, ranges, bool(neg))
 
     @staticmethod
     def chars(s: str):
@@ -1394,7 +2579,9 @@ class Parser:
 
         Returns:
             matcher, directly from the cache, do not modify it, treat it as an opaque immutable
-            value to pass to quantifiers like one(), one_or_more(), etc.
+            value to pass to quantifiers like one(), one_or_more(), etc. Usually a `CharSet`: an O(1) set
+            lookup (O(log n) for wide ranges) with negation and END_CHAR folded in. An empty class or a
+            single char is returned as a plain literal (or its `Not`).
             **Note:** Even though chars() is cached, when performance is critical, cache the result locally in a variable.
 
         Examples:
@@ -1426,8 +2613,9 @@ class Parser:
            - `mapping`: dict-like with get / item assignment.
            - `key`: mapping key to store/accumulate into.
            - Optional third element:
-              * If callable accepting ONE positional argument (unary): treated as a converter; `v = fn(v)` before combining.
-              * Otherwise (or if the unary attempt raises TypeError): treated as a combiner with signature `combiner(old_value, new_value) -> combined_value`.
+              * If callable with ONE positional argument (marked with `unary()`, or by its signature, a class by its constructor's): treated as a converter; `v = fn(v)` before combining.
+              * Otherwise: treated as a combiner with signature `combiner(old_value, new_value) -> combined_value`.
+              * The kind is told once per callable. Only if its signature is unknown (some builtins) it's tried as a converter first, and as a combiner if that raises TypeError.
            - Combination rule when no combiner supplied uses `default_combiner(old, new)`:
               * If old is `None` -> adopt new.
               * If old has `append` -> `old.append(new)` and old container is returned (in-place append).
@@ -1481,11 +2669,31 @@ class Parser:
             except Exception as e:
                 raise ValueError(f"Accumulation failed while calling {out!r}({v!r})") from e
 
+    @staticmethod
+    def _sink_plan(out, plan=None):
+        # -> list of callables `fn(v)` doing what `accumulate(out, v)` does, `out` resolved once (see get_one_ctx())
+        if plan is None:  plan = []
+        if (append_ := getattr(out, 'append', None) or getattr(out, 'add', None)):
+            plan.append(append_)
+        elif out is None:
+            pass
+        elif isinstance(out, Acc) or (isinstance(out, tuple) and (not out or isinstance(out[0], Val))):
+            for r in out:
+                Parser._sink_plan(r, plan)
+        elif isinstance(out, tuple):
+            plan.append(_dict_sink(out))
+        elif isinstance(out, Mapping):
+            plan.append(lambda v: dict_update(out, v))
+        else:
+            plan.append(lambda v: Parser.accumulate(out, v)) # callable, accumulate() wraps its errors
+        return plan
+
 
 
     # Utility subroutines for parsing common literals and structures: ints, strings, lists, dicts
     @staticmethod
     @parser_subroutine
+    @first_set(str.isidentifier)
     def identifier(p: 'Parser', out=None, **_kwargs) -> bool:
         """Parse an identifier: starts with a letter or underscore, followed by letters, digits, or underscores.
         More technically: `{XID_START}{XID_CONTINUE}*`."""
@@ -1501,6 +2709,7 @@ class Parser:
 
     @staticmethod
     @parser_subroutine
+    @first_set(lambda ch: ch in '+-.' or ch.isdigit())
     @add_static('sign__', In('+-'))
     def decimal(p: 'Parser', out=None, **_kwargs) -> bool:
         """Parse a decimal number, integer or float. Python-style ints and floats are supported,
@@ -1527,6 +2736,7 @@ class Parser:
 
     @staticmethod
     @parser_subroutine
+    @first_set(lambda ch: ch in '+-' or ch.isdigit())
     def int_(p: 'Parser', out=None, **_kwargs) -> bool:
         """Parse a base 10 integer. Negative numbers are supported.
 
@@ -1542,6 +2752,7 @@ class Parser:
 
     @staticmethod
     @parser_subroutine
+    @first_set(lambda ch: ch == '+' or ch.isdigit())
     def uint(p: 'Parser', out=None, **_kwargs) -> bool:
         """Parse a base 10 unsigned integer.
 
@@ -1564,6 +2775,7 @@ class Parser:
     @add_static('set_tm__', lambda p, t: ((p.collection.tms__, t) if isinstance(t, str) and len(t) == 1
                                           else (p.collection.tmm__, p.get_one_ctx(t))))
     @add_static('ws__', lambda _: False)
+    @add_static('__parsek_first', lambda ch, kwargs: None in (b := kwargs.get('brackets') or Parser.collection.brackets__) or ch in b)
     def collection(p: 'Parser', item_parser, out=None, *,
                    sep: str | tuple = ',', brackets: Mapping[str, str] = None, empty_item: callable = None,
                    on_err: callable = err, ws = str.isspace, **kwargs) -> bool:
@@ -1744,6 +2956,7 @@ class Parser:
     @add_static('hex_count__', {'x':2, 'u':4, 'U':8})
     @add_static('empty__', {})
     @add_static('State__', Enum('State', ['INITIAL', 'INSIDE', 'ESCAPE']))
+    @add_static('__parsek_first', lambda ch, kwargs: None in (q := kwargs.get('quotes') or Parser.string.quotes__) or ch in q)
     def string(p: 'Parser', out=None, *, escapes = None, quotes=None, replace=None, on_err=err, **_kwargs) -> bool:
         """ Subroutine to parse a quoted string with support for escape sequences and on the fly replacements.
 
@@ -1971,6 +3184,7 @@ class Parser:
                     '↰ back':      '\033[1;91m↰ back\033[22;39m',
                     '↰ₒₖ back_ok': '\033[1;91m↰ back_ok\033[22;39m',
                     '↴ break':     '\033[1;38;5;125m↴ break\033[22;39m',
+                    '✂ cut':       '\033[1;38;5;125m✂ cut\033[22;39m',
                     '↻ continue':  '\033[1;91m↻ continue\033[22;39m',
                     '⏹ end':       '\033[1;91m⏹ end\033[22;39m',
                     '↩ backtrack': '\033[38;5;178m↩ backtrack\033[39m',
@@ -2006,7 +3220,9 @@ class Parser:
         def _trace_out(self, level, is_color, out, msg):
             trc = self._tracer
             f_fixup = {'if_': 'if', 'else_': 'else', 'elif_': 'elif', '_bkt_else': 'backtrack', 'break_': 'break'}
-            f_skip  = ('trace', '_trace_out', 'x_', '<lambda>', 'one_with_ctx', '_match_more', '_one_with_trace', '__init__')
+            f_skip  = ('trace', '_trace_out', 'x_', '<lambda>', 'one_with_ctx', '_match_more', '_one_with_trace', '__init__',
+                       '_one_ctx', '_one_or_more_ctx', '_zero_or_more_ctx', '_zero_or_one_ctx', '_repeat_ctx',
+                       '_rule_q', '_rule_qd', '_rule_call', 'run', '_one_sr_memo', '_memo_run', '_memo_grow')
             f_abort = ('_fork','_fork_behind') # exit if we hit one of these functions in the stack
             try: # format the call stack chain (left side of the output)
                 stack_s = ': '
@@ -2175,6 +3391,8 @@ class Parser:
                 return is_not + Parser._f_call_to_str(f, args, kwargs)
             if isinstance(f, (list,tuple, set, Mapping)):
                 return f"{is_not}in {Parser._v_to_str(f, 2)})"
+            if isinstance(f, re.Pattern):
+                return f"{is_not}re {f.pattern!r}"
             return f"{is_not}{str(f)!r}"
 
         @staticmethod
@@ -2183,15 +3401,16 @@ class Parser:
 
         def _dispatch_one_with_trace(self, f, kwargs):
             ic = kwargs.get('ic', False) # have to get it before _dispatch_one() (it pops it from kwargs for some matchers)
-            f_, has_params = self._dispatch_one(f, kwargs)
-            return (lambda a=None, k=None, f_og=f, f_one=f_, ic=ic, hp=has_params: self._one_with_trace(f_og, f_one, ic, hp, a, k)), has_params
+            h, m, has_params = self._dispatch_one(f, kwargs)
+            return Parser._one_with_trace, (f, h, m, ic, has_params), has_params
 
-        def _one_with_trace(self, f_og, f_one, ic, has_params, args=None, kwargs=None):
+        def _one_with_trace(self, t, args=None, kwargs=None):
+            f_og, h, m, ic, has_params = t
             ch = self.ch
             start = self.pos
-            advance = bool(f_one(args or (), kwargs or {}) if has_params else f_one())
+            advance = bool(h(self, m, args or (), kwargs or {}) if has_params else h(self, m))
             if self.tracing:
-                ch = str_concise(self.slice_from(start), 25, True) if advance else ch
+                ch = str_concise(str(self.slice_from(start)), 25, True) if advance else ch
                 f_name = self._matcher_to_str(f_og, args, kwargs)
                 self.trace(3 if advance else 4, f"{ch!r} --> one({f_name}){'ᵢ' if ic else ''} --> {advance}")
             return advance
@@ -2220,3 +3439,948 @@ class Lookbehind(Parser):
 
     def __init__(self, p: Parser):
         super().__init__(self._Source(p))
+
+    # literals are compared as forward slices of the reversed source, so literal indexes (tries) don't apply
+    _match_any = Parser._scan_any
+    _match_any_ic = Parser._scan_any_ic
+
+    def _re_match(self, pat): # -> (length, match object) of `pat` matched right behind the current position
+        src = self.source
+        if (end := src.anchor - self.pos) < 0:  return -1, None
+        if (r := (cache := Parser._cache_re).get(key := (self._make_re_behind, pat), False)) is False:
+            if len(cache) >= Parser.DISPATCH_CACHE_SIZE:
+                cache.clear()
+            r = cache[key] = self._make_re_behind(pat)
+        lb, fixed = r
+        off, text = self._re_text(end)
+        if fixed: # fixed width pattern: `(?<=(pat))` checks only as many chars as it needs
+            if (mo := lb.match(text, end - off)) is None:  return -1, None
+            return mo.end(1) - mo.start(1), mo
+        if (mo := lb.search(text, 0, end - off)) is None:  return -1, None
+        return mo.end() - mo.start(), mo
+
+    def _re_text(self, _end): # -> (offset, text) to match `re` patterns on behind `end`: all of the forward source
+        return 0, self.source._s # pylint: disable=protected-access
+
+    @staticmethod
+    def _make_re_behind(pat): # -> (pattern matching `pat` behind a position, is fixed width)
+        s = re.sub(r'^\(\?[aiLmsux]+\)', '', pat.pattern) # global inline flags are already in pat.flags
+        if pat.flags & re.X:  s += '\n' # end a trailing comment
+        try:
+            return re.compile(f"(?<=({s}))", pat.flags), True
+        except re.error: # variable width, the longest match ending at the position, scans from the start
+            return re.compile(f"(?:{s})\\Z", pat.flags), False
+
+Parser._lookbehind = Lookbehind # pylint: disable=protected-access
+
+
+class BytesParser(Parser):
+    """Parser over `bytes`, `bytearray` or `memoryview` input without decoding it first. Each byte is seen as the
+    latin-1 char of the same code, so `p.ch` is a single char str (`END_CHAR` at the end, it's not a byte) and all
+    matchers work unchanged: str literals, `chars()` classes, predicates like `str.isdigit`, and the built-in
+    subroutines (`decimal`, `int_`, `string`, `collection`, ...). Bytes literals, e.g., `one(b'GET')` or
+    `one((b'GET', b'POST'))`, match the same as their latin-1 strs, and `re` patterns are matched on the bytes in
+    place (str patterns are compiled for bytes, named groups are emitted as strs).
+
+    Matched text is emitted as str, decoded from just the matched bytes. In span mode (`spans=True`) nothing is
+    copied: sinks get `Span` objects and `span.view` is the memoryview of the matched bytes.
+    ```
+    p = BytesParser(b'GET /index.html HTTP/1.1')
+    p.one((b'GET', b'POST'), m := Val()).ws.one_or_more(Not(' '), path := Val.builder())  # m == 'GET', path == '/index.html'
+    ```
+    """
+    class _Source: # bytes as the source: items and slices are latin-1 strs, `buf` is the memoryview of the bytes
+        __slots__ = ('buf',)
+        def __init__(self, b):
+            self.buf = b if isinstance(b, memoryview) and b.format == 'B' and b.ndim == 1 else memoryview(b).cast('B')
+        def __len__(self):
+            return len(self.buf)
+        def __getitem__(self, key):
+            return chr(self.buf[key]) if key.__class__ is int else str(self.buf[key], 'latin-1')
+        def startswith(self, s, start): # see Span.__eq__()
+            try:
+                return self.buf[start:start + len(s)] == s.encode('latin-1')
+            except UnicodeEncodeError:
+                return False
+
+    class _StrGroups: # match of a str pattern compiled for bytes, `_one_re()` emits the named groups as strs
+        __slots__ = ('mo',)
+        def __init__(self, mo):  self.mo = mo
+        def groupdict(self):     return {k: None if v is None else str(v, 'latin-1') for k, v in self.mo.groupdict().items()}
+
+    def __init__(self, source, state=None, pos:int=0, skip=False, spans=False):
+        """ Initialize the parser with the source bytes. See `Parser.__init__()` for the args.
+        Note, a `bytearray` can't be resized while the parser holds its memoryview."""
+        super().__init__(source if isinstance(source, BytesParser._Source) else BytesParser._Source(source), state, pos, skip, spans)
+
+    def reset(self, source, state=None, pos:int=0, skip=False, spans=False):
+        return super().reset(source if isinstance(source, BytesParser._Source) else BytesParser._Source(source), state, pos, skip, spans)
+
+    @property
+    def ch(self):
+        return chr(self.source.buf[self.pos]) if self.pos < self.len else self.END_CHAR
+
+    _cache_dispatch = {} # bytes literals resolve as their latin-1 strs, see _resolve_one()
+
+    @staticmethod
+    def _decode(f): # bytes literals of matcher `f` as latin-1 strs
+        if isinstance(f, (bytes, bytearray)):
+            return str(f, 'latin-1')
+        if isinstance(f, Mapping):
+            return {BytesParser._decode(k): v for k, v in f.items()} if any(isinstance(k, (bytes, bytearray)) for k in f) else f
+        if isinstance(f, (tuple, list, set, frozenset)) and any(isinstance(k, (bytes, bytearray)) for k in f):
+            return f.__class__(BytesParser._decode(k) for k in f)
+        return f
+
+    @staticmethod
+    def _resolve_one(f, neg, kwargs):
+        return Parser._resolve_one(BytesParser._decode(f), neg, kwargs)
+
+    @staticmethod
+    def _bytes_re(pat): # -> `pat` compiled for bytes
+        if (bpat := (cache := Parser._cache_re).get(key := (BytesParser._bytes_re, pat))) is None:
+            if len(cache) >= Parser.DISPATCH_CACHE_SIZE:
+                cache.clear()
+            if isinstance(pat.pattern, bytes):
+                bpat = pat
+            else: # chars past latin-1 can't be bytes, `re` reports them as a bad pattern
+                bpat = re.compile(pat.pattern.encode('latin-1', 'backslashreplace'), pat.flags & ~re.U)
+            cache[key] = bpat
+        return bpat
+
+    def _re_match(self, pat): # -> (length, match object) of `pat` matched on the bytes at the current position
+        if (mo := (bpat := BytesParser._bytes_re(pat)).match(self.source.buf, self.pos)) is None:  return -1, None
+        return mo.end() - mo.start(), (BytesParser._StrGroups(mo) if bpat is not pat and pat.groupindex else mo)
+
+
+class _BytesLookbehind(Lookbehind):
+    """Lookbehind parser of a BytesParser."""
+    class _Source(Lookbehind._Source): # `_s` is the memoryview of the bytes
+        __slots__ = ()
+        def __init__(self, p: BytesParser):
+            self._s = p.source.buf
+            self.anchor = p.pos
+        def __getitem__(self, key):
+            r = Lookbehind._Source.__getitem__(self, key)
+            return chr(r) if r.__class__ is int else r if r.__class__ is str else str(r, 'latin-1')
+
+    _cache_dispatch = BytesParser._cache_dispatch
+    _resolve_one = staticmethod(BytesParser._resolve_one) # pylint: disable=protected-access
+
+    def _re_match(self, pat):
+        n, mo = Lookbehind._re_match(self, pat)
+        return n, (BytesParser._StrGroups(mo) if mo is not None and isinstance(pat.pattern, str) and pat.groupindex else mo)
+
+    @staticmethod
+    def _make_re_behind(pat):
+        if isinstance(pat.pattern, bytes):
+            pat = re.compile(pat.pattern.decode('latin-1'), pat.flags & ~re.U)
+        lb, fixed = Lookbehind._make_re_behind(pat)
+        return BytesParser._bytes_re(lb), fixed
+
+BytesParser._lookbehind = _BytesLookbehind # pylint: disable=protected-access
+
+class Utf8Parser(Parser):
+    """Parser over UTF-8 encoded `bytes`, `bytearray`, `memoryview` or `mmap` input, made by `Parser.from_file()`
+    for files that aren't all ASCII. It works the same as a `Parser` over the decoded text: positions are char
+    offsets, `p.ch` and slices are strs. The chars of each chunk (`CHUNK` bytes) are counted up front, not decoded;
+    a chunk is decoded as the parser gets to it and only the last few decoded chunks are kept. `re` patterns see at least `OVERLAP` bytes of text around
+    the current position (more if a match runs to the end of that). Invalid UTF-8 raises `UnicodeDecodeError` when
+    the parser gets to it."""
+    CHUNK = 1 << 20
+    OVERLAP = 1 << 16 # decoded chunks overlap the next chunk by this many bytes, for `re` and slices
+    _CONTINUATION = bytes(range(0x80, 0xc0)) # UTF-8 continuation bytes, every other byte starts a char
+
+    class _Source: # UTF-8 bytes as the source: items and slices are strs, indexes are char offsets
+        __slots__ = ('buf', 'len', 'ascii', 'overlap', '_bstarts', '_cstarts', '_chunks', '_lo', '_next', '_hi', '_s')
+        def __init__(self, b, chunk, overlap):
+            self.buf, self.overlap, self._bstarts, self._cstarts, self._chunks, self.ascii = b, overlap, [], [], {}, True
+            bstart, cstart, n, cont = 0, 0, len(b), Utf8Parser._CONTINUATION
+            while bstart < n: # chunk table: byte and char offsets where the chunks start
+                bend = self._char_start(bstart + chunk)
+                self._bstarts.append(bstart)
+                self._cstarts.append(cstart)
+                if (c := b[bstart:bend]).isascii():
+                    cstart += len(c)
+                else:
+                    cstart += len(c.translate(None, cont)) # counted, not decoded
+                    self.ascii = False
+                bstart = bend
+            self._bstarts.append(n)
+            self._cstarts.append(cstart)
+            self.len, self._lo, self._next, self._hi, self._s = cstart, 0, 0, 0, '' # current chunk: char offsets and text
+        def __len__(self):
+            return self.len
+        def _char_start(self, i): # -> byte offset of the first char starting at or after byte `i`
+            b, n = self.buf, len(self.buf)
+            while i < n and b[i] & 0xc0 == 0x80:  i += 1
+            return min(i, n)
+        def chunk(self, k): # -> decoded text of chunk `k` and its overlap, the last few are kept
+            if (s := self._chunks.get(k)) is None:
+                if len(self._chunks) >= 4:
+                    del self._chunks[next(iter(self._chunks))]
+                s = self._chunks[k] = str(self.buf[self._bstarts[k]:self._char_start(self._bstarts[k + 1] + self.overlap)], 'utf-8')
+            return s
+        def load(self, i): # -> (char offset, text) of the chunk with char `i`, made current
+            k = bisect_right(self._cstarts, i) - 1
+            if k >= len(self._cstarts) - 1: # at the end
+                return self.len, ''
+            self._lo, self._s = lo, s = self._cstarts[k], self.chunk(k)
+            self._next, self._hi = self._cstarts[k + 1], lo + len(s) # next chunk and the end of the overlap
+            return lo, s
+        def chunk_before(self, i): # -> (char offset, text) of the first chunk that has the text behind char `i`
+            k = max(bisect_right(self._cstarts, i - 1) - 1, 0)
+            k = min(k, len(self._cstarts) - 2)
+            if k > 0 and i <= self._cstarts[k - 1] + len(self.chunk(k - 1)):
+                k -= 1
+            return (self._cstarts[k], self.chunk(k)) if k >= 0 else (0, '')
+        def __getitem__(self, key):
+            if key.__class__ is int:
+                if not self._lo <= key < self._hi:
+                    if key < 0:  key += self.len
+                    if not 0 <= key < self.len:  raise IndexError('index out of range')
+                    self.load(key)
+                return self._s[key - self._lo]
+            start, stop, _ = key.indices(self.len)
+            if self._lo <= start and stop <= self._hi:
+                return self._s[start - self._lo:stop - self._lo]
+            return self.text(start, stop)
+        def text(self, start, stop): # -> decoded text [start:stop], across chunks
+            if start >= stop:  return ''
+            k, cstarts, parts = bisect_right(self._cstarts, start) - 1, self._cstarts, []
+            while cstarts[k] < stop:
+                parts.append(self.chunk(k)[max(start - cstarts[k], 0):min(stop, cstarts[k + 1]) - cstarts[k]])
+                k += 1
+            return ''.join(parts)
+        def startswith(self, s, start): # see Span.__eq__()
+            return self[start:start + len(s)] == s
+
+    def __init__(self, source, state=None, pos:int=0, skip=False, spans=False):
+        """ Initialize the parser with the UTF-8 source bytes. See `Parser.__init__()` for the args."""
+        super().__init__(source if isinstance(source, Utf8Parser._Source) else Utf8Parser._Source(source, self.CHUNK, self.OVERLAP),
+                         state, pos, skip, spans)
+
+    def reset(self, source, state=None, pos:int=0, skip=False, spans=False):
+        return super().reset(source if isinstance(source, Utf8Parser._Source) else Utf8Parser._Source(source, self.CHUNK, self.OVERLAP),
+                             state, pos, skip, spans)
+
+    def _re_match(self, pat): # -> (length, match object) of `pat` matched on the decoded text of the current chunk
+        src, pos = self.source, self.pos
+        off, text = src.load(pos) if not src._lo <= pos < src._next else (src._lo, src._s) # pylint: disable=protected-access
+        mo = pat.match(text, pos - off)
+        n = len(text) + off - pos
+        while mo is not None and mo.end() == len(text) and off + len(text) < src.len: # it may go on past the text
+            n *= 2
+            text = src.text(off, min(pos + n, src.len))
+            mo = pat.match(text, pos - off)
+        if mo is None:  return -1, None
+        return mo.end() - mo.start(), mo
+
+
+class _Utf8Lookbehind(Lookbehind):
+    """Lookbehind parser of a Utf8Parser."""
+    def _re_text(self, end): # -> (char offset, text) of the decoded chunk with the text behind `end`
+        return self.source._s.chunk_before(end) # pylint: disable=protected-access
+
+Utf8Parser._lookbehind = _Utf8Lookbehind # pylint: disable=protected-access
+
+class StreamParser(Parser):
+    """Parser over a stream: a binary or text file object, a socket or an iterable of str or bytes chunks (e.g., a
+    generator). Chunks (`CHUNK` chars or bytes, bytes decoded with `encoding`) are read as the parser gets to them,
+    `p.is_end` and `END_CHAR` only happen at the end of the stream. Positions are offsets from the start of the stream.
+
+    Only a window of the text is kept: from `KEEP_BEHIND` chars before the oldest position the parser can still go
+    back to (the current position, open lookaheads and branches, positions saved with `save_pos()`) to the read head.
+    Everything behind the window is discarded, so records parsed with a loop like `p.zero_or_more(record, out)` take
+    constant memory, also in a new stack subroutine like `collection`. Loops aren't bounded by `PARSE_LIMIT`, only their
+    matches that don't move the position count to it. Text behind the window can't be read anymore: going back to it (`behind()`, `acc=` of a match that
+    started there, `copy_from()`, `Span` text, etc.) raises `ValueError`.
+    ```
+    with open('feed.ndjson', 'rb') as f:
+        p = StreamParser(f)
+        p.zero_or_more(json_line, lambda v: handle(v))
+    ```
+    """
+    CHUNK = 1 << 16
+    KEEP_BEHIND = 1 << 16
+    READ_AHEAD = 1 << 16 # chars read ahead of the position, at least 1
+
+    class _Source: # the window of the stream text: `text` starts at `start`, `end` is the read head
+        __slots__ = ('text', 'start', 'eof', 'owner', 'forks', '_read', '_decoder', 'encoding')
+        def __init__(self, stream, chunk, encoding, owner):
+            self.text, self.start, self.eof, self.owner, self._decoder, self.encoding = '', 0, False, owner, None, encoding
+            self.forks = [] # (fork, joins) of the subroutines running on forks, innermost last, see StreamParser._on_fork()
+            if hasattr(stream, 'read'):
+                self._read = lambda: stream.read(chunk)
+            elif hasattr(stream, 'recv'): # socket
+                self._read = lambda: stream.recv(chunk)
+            else:
+                it = iter(stream)
+                self._read = lambda: next((c for c in it if c), '') # empty chunks aren't the end
+        @property
+        def end(self):
+            return self.start + len(self.text)
+        def __len__(self):
+            return self.start + len(self.text)
+        def fill(self, n): # reads until `n` chars are in (or the end of the stream), discards the text behind the window
+            if (end := self.start + len(self.text)) >= n or self.eof:
+                return
+            chunks = []
+            while end < n:
+                if not (c := self._read()):
+                    if self._decoder is not None:
+                        chunks.append(c := self._decoder.decode(b'', True))
+                        end += len(c)
+                    self.eof = True
+                    break
+                if c.__class__ is not str:
+                    if self._decoder is None:
+                        import codecs # pylint: disable=import-outside-toplevel
+                        self._decoder = codecs.getincrementaldecoder(self.encoding)()
+                    c = self._decoder.decode(c)
+                chunks.append(c)
+                end += len(c)
+            if (cut := self.owner._window_start() - StreamParser.KEEP_BEHIND - self.start) > 0: # pylint: disable=protected-access
+                self.text, self.start = self.text[cut:], self.start + cut
+            self.text += ''.join(chunks)
+        def _behind(self, i):
+            raise ValueError(f"Stream position {i} is behind the parser's window, starting at {self.start}")
+        def __getitem__(self, key):
+            if key.__class__ is int:
+                if (i := key - self.start) < 0:  self._behind(key)
+                if i >= len(self.text):
+                    self.fill(key + 1)
+                    i = key - self.start # the window may have moved
+                return self.text[i]
+            start, stop, _ = key.indices(self.start + len(self.text)) # up to the read head, see StreamParser.slice()
+            if start >= stop:  return ''
+            if start < self.start:  self._behind(start)
+            return self.text[start - self.start:stop - self.start]
+        def startswith(self, s, start): # see Span.__eq__()
+            return self[start:start + len(s)] == s
+
+    def __init__(self, source, state=None, pos:int=0, skip=False, spans=False, encoding='utf-8'):
+        """ Initialize the parser with the stream to read. See `Parser.__init__()` for the other args.
+        Args:
+            source: A file object (text or binary), a socket or an iterable of str or bytes chunks.
+            encoding (str): Encoding of the bytes chunks. Defaults to 'utf-8'.
+        """
+        if not isinstance(source, StreamParser._Source):
+            source = StreamParser._Source(source, self.CHUNK, encoding, self)
+        super().__init__(source, state, pos, skip, spans)
+
+    def reset(self, source, state=None, pos:int=0, skip=False, spans=False, encoding='utf-8'):
+        if not isinstance(source, StreamParser._Source):
+            source = StreamParser._Source(source, self.CHUNK, encoding, self)
+        return super().reset(source, state, pos, skip, spans)
+
+    @property
+    def len(self): # the read head, reads ahead so there are at least READ_AHEAD chars after the position
+        if (src := self.source).start + len(src.text) - self.pos < self.READ_AHEAD and not src.eof:
+            src.fill(self.pos + self.READ_AHEAD)
+        return src.start + len(src.text)
+    @len.setter
+    def len(self, _v):
+        pass
+
+    def _window_start(self): # -> the oldest position the parser and its live forks can still go back to
+        lo, p = sys.maxsize, self
+        for fork, joins in (*self.source.forks, (None, False)):
+            if not joins: # `p` goes on from its position after `fork` is done, else from where `fork` ends
+                lo = min(lo, p.pos)
+            if stack := p._lookahead_stack:
+                lo = min(lo, min((q for q in stack if q >= 0), default=lo)) # not the fake and cut entries
+            if d := p._pos_dict:
+                lo = min(lo, min(d.values()))
+            p = fork
+        return lo
+
+    # Subroutines that run on a fork (new stack subroutines and negations) register it with the source while they run,
+    # so the window keeps what the forks can go back to. A new stack subroutine joins its fork, success or not, so
+    # meanwhile the position of its parser isn't kept: a record loop in a new stack subroutine takes constant memory.
+    _cache_dispatch = {} # subroutines that fork resolve to the harnesses below, see _resolve_one()
+
+    @staticmethod
+    def _resolve_one(f, neg, kwargs):
+        h, m, has_params = Parser._resolve_one(f, neg, kwargs)
+        if h is Parser._one_sr_first: # (harness, subroutine, FIRST set)
+            return h, (StreamParser._FORK_HARNESSES.get(m[0], m[0]), *m[1:]), has_params
+        return StreamParser._FORK_HARNESSES.get(h, h), m, has_params
+
+    def _on_fork(self, f, args, kwargs, joins): # -> (result of subroutine `f` run on a fork, the fork)
+        (forks := self.source.forks).append((p := self._fork(), joins))
+        try:
+            return bool(f(p, *args, **kwargs)), p
+        finally:
+            forks.pop()
+    def _one_sr_ns(self, f, args, kwargs):
+        advance, p = self._on_fork(f, args, kwargs, True)
+        self._join(p)
+        return advance
+    def _one_sr_neg(self, f, args, kwargs):
+        if advance := not self._on_fork(f, args, kwargs, False)[0]: self.next()
+        return advance
+
+    _FORK_HARNESSES = {Parser._one_sr_ns: _one_sr_ns, Parser._one_sr_neg: _one_sr_neg, Parser._one_sr_ns_neg: _one_sr_neg}
+
+    # A stream has no length to bound a loop: only the matches that don't move the position count to PARSE_LIMIT,
+    # so `p.zero_or_more(record, out)` goes on for any number of records.
+    def _repeat_ctx(self, min_count, max_count, ctx, result):
+        start = self.pos
+        p = self.lookahead
+        i, idle, last = self._match_run(ctx, max_count), 0, self.pos
+        while i < max_count and p.one_with_ctx(ctx).is_active:
+            i += 1
+            if self.pos != last:
+                idle, last = 0, self.pos
+            elif (idle := idle + 1) > Parser.PARSE_LIMIT:
+                raise ValueError("Infinite loop")
+        if i >= min_count:
+            if i: self.copy_from(start, result) # copy only if we matched at least once
+            return self.commit
+        return self.backtrack().fail
+
+    def _match_more(self, ctx):
+        k, idle, last = self._match_run(ctx, sys.maxsize), 0, self.pos
+        while self.lookahead.one_with_ctx(ctx).is_active:
+            self.commit # pylint: disable=pointless-statement
+            k += 1
+            if self.pos != last:
+                idle, last = 0, self.pos
+            elif (idle := idle + 1) > Parser.PARSE_LIMIT:
+                raise ValueError("Infinite loop")
+        return self.backtrack(), k
+
+    def slice(self, len_of_slice):
+        self.source.fill(self.pos + len_of_slice)
+        return Parser.slice(self, len_of_slice)
+
+    def _re_match(self, pat): # -> (length, match object) of `pat` matched on the window, read ahead as needed
+        (src := self.source).fill(self.pos + self.READ_AHEAD)
+        while (mo := pat.match(src.text, self.pos - src.start)) is not None and mo.end() == len(src.text) and not src.eof:
+            src.fill(src.start + len(src.text) + 1) # the match may go on past the read head
+        if mo is None:  return -1, None
+        return mo.end() - mo.start(), mo
+
+
+class _StreamLookbehind(Lookbehind):
+    """Lookbehind parser of a StreamParser."""
+    def _re_text(self, _end): # -> (offset, text) of the stream window
+        s = self.source._s # pylint: disable=protected-access
+        return s.start, s.text
+
+StreamParser._lookbehind = _StreamLookbehind # pylint: disable=protected-access
+
+class PushParser:
+    """Push style parsing of input that arrives in pieces, e.g., network protocol messages: `feed()` each piece as it
+    arrives and `close()` at the end. The grammar, `one(f, *args, **kwargs)` on a `StreamParser`, runs in a worker
+    thread that is suspended whenever it needs input that hasn't been fed yet (instead of matching `END_CHAR`), and
+    resumed by the next `feed()`. So every piece is parsed once, wherever the parse stopped: in the middle of a
+    literal, a `Parser.string`, a nested `Parser.collection` or any subroutine. Only one of the threads runs at a time,
+    the sinks can be read between feeds. `END_CHAR` matches only after `close()`.
+
+    Literals, char matchers and built-in subroutines wait for as much input as they need. `re` patterns only wait while
+    a match runs to the end of the input fed so far, a pattern that fails on a partial input (e.g., `\r\n` with only
+    `\r` fed) fails.
+    ```
+    pp = PushParser(messages, out := [])
+    for data in packets:
+        pp.feed(data)  # complete messages are in `out`
+    pp.close()
+    ```
+    """
+    class _Parser(StreamParser): # reads only what it needs, literals are compared with slice(), see Trie.match()
+        READ_AHEAD = 1
+        _match_any = Parser._scan_any
+        _match_any_ic = Parser._scan_any_ic
+
+    class _Cancel(BaseException): # raised in the worker thread to end a parse that is given up, see _Channel.stop()
+        pass
+
+    class _Channel: # what the PushParser and its worker thread share: the worker doesn't keep the PushParser alive
+        __slots__ = ('cond', 'thread', 'fed', 'waiting', 'closed', 'cancelled', 'done', 'error', 'result')
+        def __init__(self, _pp):
+            import threading # pylint: disable=import-outside-toplevel
+            self.cond, self.thread = threading.Condition(), None
+            self.fed, self.waiting, self.closed, self.cancelled, self.done, self.error = [], False, False, False, False, None
+            self.result = None
+
+        def run(self, parser, f, args, kwargs): # the parse, in the worker thread
+            try:
+                self.result = parser.one(f, *args, **kwargs)
+            except PushParser._Cancel:
+                pass
+            except BaseException as e: # pylint: disable=broad-exception-caught
+                self.error = e # raised by feed() or close()
+            finally:
+                with self.cond:
+                    self.done = True
+                    self.cond.notify_all()
+
+        def pieces(self): # the stream of the parser, suspends it until there's a piece or it's closed
+            while True:
+                with self.cond:
+                    self.waiting = True
+                    self.cond.notify_all()
+                    while not self.fed and not self.closed:
+                        self.cond.wait()
+                    self.waiting = False
+                    if self.cancelled:
+                        raise PushParser._Cancel()
+                    if not self.fed:
+                        return
+                    piece = self.fed.pop(0)
+                yield piece
+
+        def wait(self, done): # waits for the worker thread till `done()`, raises its error
+            with self.cond:
+                self.cond.notify_all()
+                while not self.done and not done():
+                    self.cond.wait()
+            if (e := self.error) is not None:
+                self.error = None
+                raise e
+
+        def stop(self): # ends the parse in the worker thread where it waits, without the input fed after that
+            with self.cond:
+                self.closed = self.cancelled = True
+                self.cond.notify_all()
+            import threading # pylint: disable=import-outside-toplevel
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+
+    def __init__(self, f, *args, state=None, spans=False, encoding='utf-8', **kwargs):
+        """ Starts the parse of `one(f, *args, **kwargs)`, e.g., a subroutine and its sinks, in a worker thread.
+        A PushParser that is dropped without `close()` ends its worker thread, the parse is given up.
+        Args:
+            state, spans: The `Parser.__init__()` args.
+            encoding (str): Encoding of bytes pieces. Defaults to 'utf-8'.
+        """
+        import threading # pylint: disable=import-outside-toplevel
+        self._ch = ch = self._Channel(self)
+        self.parser = self._Parser(ch.pieces(), state, spans=spans, encoding=encoding)
+        self._thread = ch.thread = threading.Thread(target=ch.run, args=(self.parser, f, args, kwargs), daemon=True)
+        self._thread.start()
+        self._stop = weakref.finalize(self, ch.stop)
+
+    @property
+    def result(self):
+        """`one()` result when done: the parser (truthy) if `f` matched, a falsy branch otherwise."""
+        return self._ch.result
+
+    @property
+    def done(self):
+        """True if the parse is done."""
+        return self._ch.done
+
+    def feed(self, piece):
+        """Feeds the next piece of input (str or bytes) and returns once the parser has used all the input fed so far
+        (it waits for more) or the parse is done. Raises the parse errors."""
+        with (ch := self._ch).cond:
+            if ch.closed:
+                raise ValueError("PushParser is closed")
+            if piece:
+                ch.fed.append(piece)
+        ch.wait(lambda: not ch.fed and ch.waiting)
+        return self
+
+    def close(self):
+        """Ends the input and returns the result once the parse is done, see `result`. Raises the parse errors."""
+        with (ch := self._ch).cond:
+            ch.closed = True
+        ch.wait(lambda: False)
+        return ch.result
+
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, _exc, _tb):
+        if exc_type is None:
+            self.close()
+        else: # the error is the caller's: the parse is given up, the worker thread ends before this returns
+            self._stop()
+
+class AsyncParser(PushParser):
+    """`PushParser` for asyncio: `await feed()` pieces and `await close()`, or `await AsyncParser.parse(source, f, ...)`
+    to parse an `asyncio.StreamReader` or an async iterator of str or bytes chunks. The parse is run in time slices:
+    after `steps` matches (calls of `one()` and quantifier iterations, so subroutine recursion counts too) or `us`
+    microseconds of parsing, whichever comes first, it's suspended and the coroutine yields to the event loop, so other
+    tasks keep running while a large input is parsed. The event loop thread is blocked only for a slice at a time.
+    ```
+    async def handle(reader, writer):
+        if await AsyncParser.parse(reader, request, req := {}):
+            ...
+    ```
+    """
+    STEPS = 10000   # matches per slice
+    US = 1000       # microseconds per slice
+    CHUNK = 1 << 16 # bytes or chars read from the source at a time, see parse()
+
+    class _Parser(PushParser._Parser): # counts the matches, see AsyncParser._tick()
+        _tick = staticmethod(lambda: None)
+        def _fork(self):
+            p = super()._fork()
+            p._tick = self._tick
+            return p
+        def one(self, f, *args, **kwargs):
+            self._tick()
+            return PushParser._Parser.one(self, f, *args, **kwargs)
+        def one_with_ctx(self, ctx):
+            self._tick()
+            return PushParser._Parser.one_with_ctx(self, ctx)
+        def _one_ctx(self, ctx, result):
+            self._tick()
+            return PushParser._Parser._one_ctx(self, ctx, result)
+
+    class _Channel(PushParser._Channel): # and the time slices: the worker thread pauses, the coroutine resumes it
+        __slots__ = ('steps', 'slice_ns', 'n', 't0', 'paused')
+        def __init__(self, ap):
+            super().__init__(ap)
+            self.steps, self.slice_ns = ap._steps, ap._slice_ns # pylint: disable=protected-access
+            self.n, self.t0, self.paused = 0, time.perf_counter_ns(), False
+
+        def run(self, parser, f, args, kwargs): # counted from here on
+            parser._tick = self.tick
+            super().run(parser, f, args, kwargs)
+
+        def tick(self): # in the worker thread: suspends the parse at the end of the time slice
+            self.n = n = self.n + 1
+            if n >= self.steps or (not n & 7 and time.perf_counter_ns() - self.t0 >= self.slice_ns):
+                with self.cond:
+                    if not self.cancelled:
+                        self.paused = True
+                        self.cond.notify_all()
+                        while self.paused and not self.cancelled:
+                            self.cond.wait()
+                    if self.cancelled: # the awaiting task is gone, see __aexit__()
+                        raise PushParser._Cancel()
+
+        async def resume(self, done): # runs the parse slice by slice till `done()`, yields to the event loop in between
+            import asyncio # pylint: disable=import-outside-toplevel
+            while True:
+                self.wait(lambda: self.paused or done())
+                if not self.paused:
+                    return
+                await asyncio.sleep(0)
+                with self.cond: # a new slice
+                    self.n, self.t0, self.paused = 0, time.perf_counter_ns(), False
+
+    def __init__(self, f, *args, steps=None, us=None, state=None, spans=False, encoding='utf-8', **kwargs):
+        """ Starts the parse of `one(f, *args, **kwargs)`, see `PushParser.__init__()`.
+        Args:
+            steps (int): Matches per time slice. Defaults to `AsyncParser.STEPS`.
+            us (int|float): Microseconds per time slice. Defaults to `AsyncParser.US`.
+        """
+        self._steps = self.STEPS if steps is None else steps
+        self._slice_ns = int(1000 * (self.US if us is None else us))
+        super().__init__(f, *args, state=state, spans=spans, encoding=encoding, **kwargs)
+
+    async def feed(self, piece):
+        """Feeds the next piece of input (str or bytes), returns once the parser has used all the input fed so far or
+        the parse is done. Raises the parse errors."""
+        with (ch := self._ch).cond:
+            if ch.closed:
+                raise ValueError("PushParser is closed")
+            if piece:
+                ch.fed.append(piece)
+        await ch.resume(lambda: not ch.fed and ch.waiting)
+        return self
+
+    async def close(self):
+        """Ends the input and returns the result once the parse is done, see `PushParser.result`. Raises the parse
+        errors."""
+        with (ch := self._ch).cond:
+            ch.closed = True
+        await ch.resume(lambda: False)
+        return ch.result
+
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, exc_type, _exc, _tb):
+        if exc_type is None:
+            await self.close()
+        else: # e.g., the task is cancelled: ends the parse in the worker thread where it's paused or waits for input
+            self._stop()
+
+    @staticmethod
+    async def parse(source, f, *args, **kwargs):
+        """Parses `source` with `one(f, *args, **kwargs)` and returns the result, see `PushParser.result`.
+        Args:
+            source: An `asyncio.StreamReader` (or anything with an async `read(n)`) or an async iterable of str or bytes
+                chunks.
+            steps, us, state, spans, encoding: See `AsyncParser.__init__()`.
+        """
+        async with AsyncParser(f, *args, **kwargs) as ap:
+            if hasattr(source, 'read'):
+                while piece := await source.read(AsyncParser.CHUNK):
+                    await ap.feed(piece)
+            else:
+                async for piece in source:
+                    await ap.feed(piece)
+        return ap.result
+
+class Tokens:
+    """Token stream made by `Lexer.tokenize()`: parallel lists of token kinds, start and end offsets into the source
+    `text`, and the values the lexer captured (None if the rule emitted nothing). It's the source of a `TokenParser`:
+    indexing with an int returns the token kind, a slice returns the value of a single token that has one, otherwise
+    the source text the tokens span (including any skipped text between them). Iterating yields
+    `(kind, start, end, value)` tuples."""
+    __slots__ = ('text', 'kinds', 'starts', 'ends', 'values')
+    def __init__(self, text, kinds=None, starts=None, ends=None, values=None):
+        self.text = text
+        self.kinds = [] if kinds is None else kinds
+        self.starts = [] if starts is None else starts
+        self.ends = [] if ends is None else ends
+        self.values = [None] * len(self.kinds) if values is None else values
+
+    def __len__(self):   return len(self.kinds)
+    def __iter__(self):  return zip(self.kinds, self.starts, self.ends, self.values)
+    def __repr__(self):  return f"Tokens({str_concise(' '.join(map(str, self.kinds)), 40, True)!r})"
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.kinds[key]
+        start, stop, _ = key.indices(len(self.kinds))
+        if stop - start == 1 and (v := self.values[start]) is not None:
+            return v
+        return self.text[self.starts[start]:self.ends[stop - 1]] if start < stop else ''
+
+    def token(self, i):
+        """Returns token `i` as `(kind, start, end, value)`."""
+        return self.kinds[i], self.starts[i], self.ends[i], self.values[i]
+
+    def offset(self, i):
+        """Returns the source text offset of token `i`, the end of the text for `i` past the last token."""
+        return self.starts[i] if i < len(self.kinds) else len(self.text)
+
+    def context(self, i): # source text around token `i`, for errors
+        return str_context(self.text, self.offset(i))
+
+
+class TokenParser(Parser):
+    """Parser over a sequence of tokens: `Tokens` made by a `Lexer`, or any sequence, e.g., a list of token objects
+    from another scanner or a tuple of ints. Positions are indexes into the sequence and `p.ch` is the current element,
+    the kind of the current token for `Tokens`, or the end sentinel (`END_CHAR` unless set with `end=`) at the end.
+    Matchers match whole elements:
+        - A string or any other value that isn't a matcher matches an equal element (a token kind for `Tokens`).
+        - A tuple, list or set of such values matches any of them.
+        - A mapping `{element: value}` matches any of its keys and emits the value.
+        - An `re` pattern matches the string elements it fully matches, unary predicates are called with the element
+          (and with the end sentinel at the end, pick one your predicates accept).
+        - Subroutines, `Not()`, tuples of matchers, quantifiers and branches work the same as with `Parser`.
+
+    A single element emits itself, a token of `Tokens` emits its value if the lexer captured one, otherwise its text,
+    e.g., `p.one('NUM', l)` appends the number parsed by a `Parser.decimal` rule. A run of elements, e.g.,
+    `one_or_more('ID', acc=...)`, emits the slice of the sequence, for `Tokens` the source text it spans.
+    """
+    _cache_dispatch = {} # element matchers resolve differently, see _resolve_one()
+
+    class _Seq: # any sequence as the source: a slice of one element is the element (like a char of a str)
+        __slots__ = ('seq',)
+        def __init__(self, seq):  self.seq = seq
+        def __len__(self):        return len(self.seq)
+        def token(self, i):       return self.seq[i]
+        def __getitem__(self, key):
+            if isinstance(key, int):
+                return self.seq[key]
+            start, stop, _ = key.indices(len(self.seq))
+            return self.seq[start] if stop - start == 1 else self.seq[start:stop]
+
+        def context(self, i): # elements around `i`, the current one in brackets
+            seq, i = self.seq, min(i, n := len(self.seq))
+            lo, hi = max(0, i - 3), min(n, i + 4)
+            items = [f"[{seq[k]!r}]" if k == i else repr(seq[k]) for k in range(lo, hi)] + (['[]'] if i == n else [])
+            return ('…, ' if lo else '') + ', '.join(items) + (', …' if hi < n else '')
+
+    def __init__(self, source, state=None, pos:int=0, skip=False, spans=False, end=Parser.END_CHAR):
+        """ Initialize the parser with a token sequence.
+        Args:
+            source: `Tokens` or any sequence, e.g., a list of tokens.
+            end: The end sentinel, `p.ch` past the last element. Defaults to `Parser.END_CHAR`.
+            For the rest see `Parser.__init__()`.
+        """
+        if end is not Parser.END_CHAR:
+            self._set_end(end)
+        super().__init__(source if isinstance(source, (Tokens, TokenParser._Seq)) else TokenParser._Seq(source), state, pos, skip, spans)
+
+    def reset(self, source, state=None, pos:int=0, skip=False, spans=False, end=Parser.END_CHAR):
+        if end is not self.END_CHAR:
+            self._set_end(end)
+        return super().reset(source if isinstance(source, (Tokens, TokenParser._Seq)) else TokenParser._Seq(source), state, pos, skip, spans)
+
+    def _set_end(self, end):
+        self.END_CHAR = self.EOF = end
+        self.NOT_END_CHAR = self.NOT_EOF = Not(end)
+
+    def _fork(self):
+        p = super()._fork()
+        if (end := self.END_CHAR) is not Parser.END_CHAR:
+            p._set_end(end)
+        return p
+
+    @property
+    def token(self):
+        """Returns the current token, `(kind, start, end, value)` for `Tokens`, or None at the end."""
+        return self.source.token(self.pos) if self.pos < self.len else None
+
+    def _context(self):
+        return self.source.context(self.pos)
+
+    # elements aren't chars, slices don't get the end sentinel appended
+    def slice(self, len_of_slice):         return self.source[self.pos:self.pos + len_of_slice]
+    def slice_behind(self, len_of_slice):  return self.source[max(0, self.pos - len_of_slice):self.pos]
+    def slice_from(self, start):           return self.source[start:self.pos]
+
+    @staticmethod
+    def _is_elem(x): # x is compared to elements, not a matcher
+        return not callable(x) and not isinstance(x, (tuple, list, set, frozenset, Mapping, re.Pattern, Val))
+
+    @staticmethod
+    def _resolve_one(f, neg, kwargs):
+        ic = kwargs.get('ic', False)
+        if isinstance(f, Val):
+            f = f.v
+        if (f.__class__ is str and f) or (f.__class__ is not str and TokenParser._is_elem(f)): # element, e.g., token kind
+            if ic and f.__class__ is str:
+                return (Parser._one_char_neg_ic if neg else Parser._one_char_ic), f.lower(), False
+            return (Parser._one_char_neg if neg else Parser._one_char), f, False
+        if isinstance(f, Mapping):
+            if ic:
+                f = {(k.lower() if k.__class__ is str else k): v for k, v in f.items()}
+                return (Parser._one_unary_neg_ic, frozenset(f).__contains__, False) if neg else (TokenParser._one_kind_map_ic, f, True)
+            return (Parser._one_set_neg, f, False) if neg else (TokenParser._one_kind_map, f, True)
+        if isinstance(f, (tuple, list, set, frozenset)):
+            # elements (Val items of cached tuples change, so those tuples are matched as alternations)
+            if all(TokenParser._is_elem(k) for k in f) or (f.__class__ is not tuple and all(TokenParser._is_elem(k) or isinstance(k, Val) for k in f)):
+                try:
+                    elems = frozenset((k.lower() if ic and k.__class__ is str else k) for k in (k.v if isinstance(k, Val) else k for k in f))
+                except TypeError: # unhashable elements
+                    elems = None
+                if elems is not None:
+                    if ic:  return (Parser._one_unary_neg_ic if neg else Parser._one_unary_ic), elems.__contains__, False
+                    return (Parser._one_set_neg if neg else Parser._one_set), elems, False
+            return (Parser._one_multi_neg if neg else TokenParser._one_alt), tuple(f), True
+        if isinstance(f, re.Pattern):
+            if ic and not f.flags & re.I:
+                f = re.compile(f.pattern, f.flags | re.I)
+            return (Parser._one_unary_neg if neg else Parser._one_unary), f.fullmatch, False
+        if (r := Parser._resolve_one(f, neg, kwargs))[0] is Parser._one_sr_first: # FIRST sets are of chars, not elements
+            return r[1][0], r[1][1], True
+        return r
+
+    def _one_kind_map(self, m, args, _kwargs):
+        if advance := (k := self.ch) in m:
+            self.next()
+            for out in args:  Parser.accumulate(out, m[k])
+        return advance
+    def _one_kind_map_ic(self, m, args, _kwargs):
+        if advance := (k := self.ch.lower()) in m:
+            self.next()
+            for out in args:  Parser.accumulate(out, m[k])
+        return advance
+
+    def _one_alt(self, t, args, kwargs): # tuple of matchers tried in order, FIRST sets of Parser._one_multi() are of chars
+        last = len(t) - 1
+        for i, x in enumerate(t):
+            if self.lookahead.one(x, *args, **kwargs):
+                return self.commit.is_ok
+            if i == last: # commit the last one, since we failed to match any
+                self.commit # pylint: disable=pointless-statement
+            else:
+                self.backtrack()
+        return False
+
+
+class _TokenLookbehind(Lookbehind): # behind() of a TokenParser, matches kinds behind the current token
+    _cache_dispatch = TokenParser._cache_dispatch
+    _resolve_one = staticmethod(TokenParser._resolve_one) # pylint: disable=protected-access
+    slice, slice_behind, slice_from = TokenParser.slice, TokenParser.slice_behind, TokenParser.slice_from
+
+    def __init__(self, p: TokenParser):
+        super().__init__(p)
+        if p.END_CHAR is not Parser.END_CHAR:
+            TokenParser._set_end(self, p.END_CHAR)
+
+    def _context(self):
+        src = self.source
+        return src._s.context(src.anchor - self.pos) # pylint: disable=protected-access
+
+TokenParser._lookbehind = _TokenLookbehind # pylint: disable=protected-access
+
+
+class Lexer:
+    """Tokenizer with maximal munch: splits the source into `Tokens` for a `TokenParser` in a single pass.
+
+    Rules are `(kind, matcher)` pairs, or a `{kind: matcher}` dict, in priority order. A matcher is anything
+    `Parser.one()` takes: literals, tuples, `Parser.chars()`, `In`, `Range`, predicates, mappings, `re` patterns and
+    subroutines like `Parser.decimal`, `Parser.string` or `Parser.identifier`. At each position the rule with the
+    longest match makes the token, the first one of them on a tie. Tokens of kind None are dropped (whitespace,
+    comments). What the matcher emits becomes the token value: the number of `Parser.decimal`, the value of a mapping,
+    the named groups of a pattern, etc. (a tuple if it emits more than one value, None if nothing).
+
+    Only the rules that can start with the current char are tried. They are looked up by char in a table that is
+    filled in from the FIRST sets of the matchers (see `first_set()`) the first time a char is seen.
+    ```
+    lex = Lexer([('NUM', Parser.decimal), ('ID', Parser.identifier), ('OP', ('**', '*', '+')), (None, re.compile(r'\\s+'))])
+    p = lex.parser('x ** 2')
+    p.one('ID', l := []).one('OP').one('NUM', l) # l == ['x', 2]
+    ```
+    """
+    __slots__ = ('rules', '_table')
+    def __init__(self, rules):
+        """ Args:
+            rules: `(kind, matcher)` pairs or a `{kind: matcher}` dict. Read once, later changes to the matchers
+                (e.g., a mutable mapping) aren't seen by the lexer.
+        """
+        self.rules = tuple(Lexer._make_rule(kind, m) for kind, m in (rules.items() if isinstance(rules, Mapping) else rules))
+        self._table = {} # char -> candidate rules, see _candidates()
+
+    @staticmethod
+    def _make_rule(kind, m): # -> (kind, harness, matcher, has_params, captures values, FIRST: set, char test or None)
+        neg, f = Not.crack(m)
+        h, f, has_params = Parser._resolve_one(f, neg, {})
+        if h is Parser._one_sr_first: # the table checks its FIRST set
+            h, f = f[0], f[1]
+        if h is Parser._one_unary or h is Parser._one_set: # single char matchers, FIRST is the matcher itself
+            first = (lambda ch, _kwargs, f=f: f(ch)) if h is Parser._one_unary else frozenset(f)
+        elif isinstance(m, (Mapping, list, set, frozenset)) and all(k.__class__ is str for k in m): # literals
+            first = None if '' in m else frozenset(k[0] for k in m)
+        else:
+            first = Parser._first(m, False)
+        return kind, h, f, has_params, has_params and not (h is Parser._one_re and not f.groupindex), first
+
+    def _candidates(self, ch): # -> rules that can start with `ch`, in order
+        cands = self._table[ch] = tuple(r for r in self.rules if (first := r[5]) is None or (
+            ch in first if first.__class__ is frozenset else first(ch, {})))
+        return cands
+
+    def tokenize(self, source) -> Tokens:
+        """Splits `source` into `Tokens`. Raises `ValueError` where no rule matches."""
+        toks = Tokens(source)
+        kinds, starts, ends, values = toks.kinds, toks.starts, toks.ends, toks.values
+        p, n, table, kw, pos = Parser(source), len(source), self._table, {}, 0
+        while pos < n:
+            if (cands := table.get(ch := source[pos])) is None:
+                cands = self._candidates(ch)
+            best, end, cap = None, pos, None
+            for kind, h, f, has_params, captures, _ in cands:
+                p.pos = pos
+                if captures:
+                    if h(p, f, (vals := [],), kw) and p.pos > end:
+                        best, end, cap = kind, p.pos, vals
+                elif (h(p, f, (), kw) if has_params else h(p, f)) and p.pos > end:
+                    best, end, cap = kind, p.pos, None
+            if end == pos: # nothing matched (empty matches don't count)
+                p.pos = pos
+                p.err("No token matches")
+            if end > n: # matched the END_CHAR
+                end = n
+            if best is not None:
+                kinds.append(best)
+                starts.append(pos)
+                ends.append(end)
+                values.append(None if not cap else cap[0] if len(cap) == 1 else tuple(cap))
+            pos = end
+        return toks
+
+    def parser(self, source, **kwargs) -> TokenParser:
+        """Tokenizes `source` and returns a `TokenParser` over the tokens. `kwargs` are passed on to it, e.g., `state`."""
+        return TokenParser(self.tokenize(source), **kwargs)
@@ -2,8 +2,11 @@
 # pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
 # pylint: disable=missing-class-docstring,unnecessary-lambda,unnecessary-lambda-assignment
 # cspell:words resultset
+import functools
+from fractions import Fraction
 import pytest
-from parsek import Parser
+import parsek
+from parsek import Parser, Acc, unary
 
 
 class AppendOnly:
@@ -194,3 +197,93 @@ def test_dict_update_invalid_non_iterable_value_raises():
     d = {}
     with pytest.raises(ValueError):
         Parser.accumulate(d, 123)  # triggers dict_update() final else branch
+
+
+def test_dict_converter_resolved_once_and_errors_kept():
+    calls = []
+    def conv(v):
+        calls.append(v)
+        return int(v) if v != 'bad' else v + 1 # TypeError inside a converter
+    d = {}
+    Parser.accumulate((d, 'n', conv), '2')
+    Parser.accumulate(d, ('n', '2', conv))
+    put, = Parser._sink_plan((d, 'n', conv))
+    put('3')
+    assert d == {'n': 7} and calls == ['2', '2', '3'] # called once per value, never probed
+    for append_ in (lambda v: Parser.accumulate((d, 'n', conv), v), put):
+        with pytest.raises(ValueError, match="Dictionary update failed") as e:
+            append_('bad')
+        assert isinstance(e.value.__cause__, TypeError) and d == {'n': 7} # not retried as a combiner
+
+@pytest.mark.parametrize("fn, expected", [
+    (str.strip, 'ab'), (lambda old, new: (old or '') + new.upper(), ' A  B '), (lambda v, n=2: v * n, ' a  a  b  b '),
+    (unary(lambda *v: v[0]), ' a  b '), (functools.partial(max, ''), ' a  b '), # builtin without signature: tried as a converter
+])
+def test_dict_converter_or_combiner(fn, expected):
+    d1, d2, d3 = {}, {}, {}
+    Parser.accumulate(d1, [('k', ' a ', fn), ('k', ' b ', fn)])
+    plan = Parser._sink_plan((d3, 'k', fn))
+    for v in (' a ', ' b '):
+        Parser.accumulate((d2, 'k', fn), v)
+        for append_ in plan:  append_(v)
+    assert d1['k'] == d2['k'] == d3['k'] == expected
+
+class Joined: # a combiner class: Joined(old, new)
+    def __init__(self, old, new):  self.s = (old.s + ',' if old else '') + new
+
+class Upper(str): # a converter class
+    def __new__(cls, v):  return super().__new__(cls, v.upper())
+
+def test_dict_converter_or_combiner_classes():
+    d = {}
+    for v in ('a', 'b'):
+        Parser.accumulate((d, 'j', Joined), v)
+        Parser.accumulate((d, 'u', Upper), v)
+        Parser.accumulate((d, 'f', Fraction), v.replace('a', '1/2').replace('b', '1/3'))
+    assert d['j'].s == 'a,b' and d['u'] == 'AB' and d['f'] == Fraction(5, 6)
+
+def test_dict_fn_kinds_cache(monkeypatch):
+    monkeypatch.setattr(parsek, '_DICT_FN_KINDS', {})
+    monkeypatch.setattr(Parser, 'DISPATCH_CACHE_SIZE', 2)
+    d = {}
+    for i in range(3):
+        Parser.accumulate((d, 'a', lambda old, new, i=i: (old or 0) + i), 'x') # not closures: cached, oldest evicted
+        Parser.accumulate((d, 'b', lambda v: v * i), 2) # closures: not cached
+        Parser.accumulate((d, 'c', ''.join), 'xy') # bound method: not cached
+    assert d == {'a': 3, 'b': 6, 'c': 'xyxyxy'}
+    assert len(parsek._DICT_FN_KINDS) == 2 and all(fn.__name__ == '<lambda>' and fn.__defaults__ for fn in parsek._DICT_FN_KINDS)
+
+BAR = lambda old, new: (old or '') + new + '|'
+SINKS = [
+    lambda: [], set, lambda: Parser.Val(''), lambda: Parser.Val(0), AppendOnly, AddOnly,
+    lambda: ({}, 'k'), lambda: ({}, 'k', str.upper), lambda: ({}, 'k', BAR),
+    lambda: (Parser.Val(''), []), lambda: Acc([], (Parser.Val(''), set())), tuple, lambda: None,
+]
+
+def _sink_state(s):
+    if isinstance(s, (tuple, Acc)):  return tuple(_sink_state(x) for x in s)
+    if isinstance(s, (AppendOnly, AddOnly)):  return s.data
+    return s.value if isinstance(s, Parser.Val) else s
+
+@pytest.mark.parametrize("make", SINKS)
+def test_sink_plan_same_as_accumulate(make):
+    a, b = make(), make()
+    plan = Parser._sink_plan(b)
+    for v in ('1', '2', '30'):
+        Parser.accumulate(a, v)
+        for append_ in plan:  append_(v)
+    assert _sink_state(a) == _sink_state(b)
+
+def test_sink_plan_callable_errors():
+    def bad(_v):  raise KeyError('x')
+    with pytest.raises(ValueError, match="Accumulation failed"):
+        for append_ in Parser._sink_plan(bad):  append_('v')
+
+def test_positional_sinks_resolved_once(monkeypatch):
+    calls = []
+    plan = Parser._sink_plan
+    monkeypatch.setattr(Parser, '_sink_plan', staticmethod(lambda out, p=None: calls.append(out) or plan(out, p)))
+    d, l, v = {}, [], Parser.Val('')
+    assert Parser('ab12ab!').zero_or_more(('ab', '12'), l, v, (d, 'k', str.upper)).one('!', l).is_end
+    assert l == ['ab', '12', 'ab', '!'] and v == 'ab12ab' and d == {'k': 'AB12AB'}
+    assert len([c for c in calls if isinstance(c, Acc)]) == 1 # the loop resolves its sinks once, one() doesn't resolve them at all
@@ -0,0 +1,109 @@
+""" Test AsyncParser: parsing asyncio streams and async iterators in time slices, yielding to the event loop """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+import parsek
+from parsek import Parser, AsyncParser, parser_subroutine
+from .helpers import trace_level
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 100000) # lowered by other tests
+    monkeypatch.setattr(AsyncParser, 'CHUNK', 7)
+
+@parser_subroutine
+def line(p, out): # key=value\n
+    return p.one(p.identifier, kv := []).one('=').one_or_more(p.chars('^\n$'), acc=kv).one('\n').do(out.append, kv)
+
+@parser_subroutine
+def lines(p, out):
+    return p.zero_or_more(line, out).one(p.END_CHAR)
+
+SRC = ''.join(f'k{i}=v{i} é\n' for i in range(40))
+EXPECTED = [[f'k{i}', f'v{i} é'] for i in range(40)]
+
+def run(coro_f, *args): # -> result of the parse, number of times another task ran during it
+    ticks = 0
+    async def other():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0)
+            ticks += 1
+    async def main():
+        t = asyncio.create_task(other())
+        try:
+            return await coro_f(*args)
+        finally:
+            t.cancel()
+    with trace_level(0):
+        return asyncio.run(main()), ticks
+
+def reader(data):
+    r = asyncio.StreamReader()
+    r.feed_data(data)
+    r.feed_eof()
+    return r
+
+async def chunks(s, n):
+    for i in range(0, len(s), n):
+        yield s[i:i + n]
+
+def test_stream_reader():
+    async def parse():
+        return await AsyncParser.parse(reader(SRC.encode()), lines, out := []), out
+    (result, out), _ = run(parse)
+    assert result and out == EXPECTED
+
+def test_async_iterator():
+    async def parse():
+        return await AsyncParser.parse(chunks(SRC, 5), lines, out := [], steps=10**9, us=10**9), out
+    (result, out), _ = run(parse)
+    with trace_level(0):
+        assert result and out == EXPECTED and Parser(SRC).one(lines, l := []) and l == out
+
+@pytest.mark.parametrize("kwargs, sliced", [({'steps': 10}, True), ({'us': 0}, True), ({'steps': 10**9, 'us': 10**9}, False)])
+def test_yields_to_event_loop(kwargs, sliced):
+    async def parse():
+        return await AsyncParser.parse(reader(SRC.encode() * 5), lines, out := [], **kwargs), out
+    (result, out), ticks = run(parse)
+    assert result and out == EXPECTED * 5
+    assert ticks > 100 if sliced else ticks < 5 # slices of a few matches, the reader has all the data
+
+def test_feed_and_close():
+    async def parse():
+        async with AsyncParser(lines, out := [], steps=3) as ap:
+            for piece in ('a=1\nb', '=2', '\n'):
+                assert await ap.feed(piece) is ap
+            assert out == [['a', '1'], ['b', '2']] and not ap.done
+        return ap.result, ap.done
+    (result, done), _ = run(parse)
+    assert result and done
+
+def test_errors_and_cancel():
+    async def bad():
+        return await AsyncParser.parse(chunks('a=1\nb', 2), Parser.sr(lambda p: p.one(lines, []) or p.err('bad line')))
+    with pytest.raises(ValueError, match="bad line"):
+        run(bad)
+    aps = []
+    async def cancelled():
+        ap = AsyncParser(lines, [], steps=1)
+        aps.append(ap)
+        async with ap:
+            t = asyncio.create_task(ap.feed(SRC))
+            await asyncio.sleep(0.01)
+            t.cancel()
+            await asyncio.gather(t, return_exceptions=True)
+            raise asyncio.CancelledError()
+    with pytest.raises(asyncio.CancelledError):
+        run(cancelled)
+    assert not aps[0]._thread.is_alive() and aps[0].done # the parse in the worker thread ended
+
+def test_lazy_imports(): # the modules of AsyncParser, PushParser, from_file() and converter kinds are imported on use
+    code = f"import sys, {parsek.__name__}; print(*(m for m in ('asyncio', 'inspect', 'mmap', 'threading') if m in sys.modules))"
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(parsek.__file__)}
+    assert subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout.strip() == ''
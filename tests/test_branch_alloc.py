@@ -0,0 +1,50 @@
+""" Test that branch control objects (Fail, Shunt, End, stops) are reused instead of allocated per branch """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import pytest
+from parsek import Parser
+
+
+@pytest.fixture
+def constructed(monkeypatch):
+    counts = {}
+    for cls in (Parser.Branch, Parser.Break): # Fail, Shunt and all the stops
+        def init(self, *args, _init=cls.__init__):
+            counts[type(self).__name__] = counts.get(type(self).__name__, 0) + 1
+            _init(self, *args)
+        monkeypatch.setattr(cls, '__init__', init)
+    return counts
+
+def test_branch_objects_reused():
+    p = Parser('abc')
+    f = p.one('x')
+    assert isinstance(f, Parser.Fail) and f.parent is p
+    assert p.one('y') is f and p.fail is f and p.fail_if(True) is f
+    assert f.if_ is f.if_ and f.if_.parent is f and f.lookahead is f.if_ and f._bkt_else is f.if_
+    s = p.lookahead.one('a').alt
+    assert isinstance(s, Parser.Shunt) and s.merge.lookahead.alt is s and s.if_ is s.lookahead and s.if_.parent is s
+    assert Parser('').end.one('a') is Parser._END and p.end.fail is Parser._END
+
+@pytest.mark.parametrize("name, cls", [('back', Parser.Back), ('back_ok', Parser.BackOk), ('break_', Parser.Break), ('continue_', Parser.Continue)])
+def test_stops_reused_and_reset(name, cls):
+    p = Parser('abc')
+    b = getattr(p.if_.one('a'), name)
+    assert type(b) is cls and b.parent is p
+    b.if_.endif.endif # a stop propagating through nested branches
+    assert getattr(p, name) is b and b.depth == 1 and b.lwm == 0
+
+def test_branches_allocation_free(constructed):
+    p = Parser('abc' * 3)
+    def work():
+        p.pos = 0
+        assert not p.one('x')
+        assert p.if_.one('x').elif_.one('y').else_.one('a').endif
+        assert not p.if_.one('b').break_.else_.one('b').endif
+        assert not p.if_.one('b').back
+        assert p.if_.one('b').elif_.if_.one('c').endif.endif
+        assert p.if_.one('a').else_.if_.one('b').endif.endif
+        assert p.lookahead.one('b').alt.one('z').merge.lookahead.one('x').alt.one('c').merge
+    work() # first use makes the objects
+    constructed.clear()
+    for _ in range(10): work()
+    assert not constructed
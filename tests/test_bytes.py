@@ -0,0 +1,76 @@
+""" Test BytesParser: parsing bytes, bytearray and memoryview input in place """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import re
+import pytest
+from parsek import Parser, BytesParser, Span, Val, Not, parser_subroutine
+from .helpers import trace_level
+
+
+@pytest.mark.parametrize("src", [b'GET /a b', bytearray(b'GET /a b'), memoryview(b'xGET /a b')[1:]])
+def test_bytes_like_sources(src):
+    p = BytesParser(src)
+    assert p.ch == 'G' and p.len == 8 and p.one((b'GET', b'POST'), m := Val()).ws.one_or_more(Not(' '), path := Val.builder())
+    assert m == 'GET' and path == '/a' and p.ws.one('b').is_end and p.ch == p.END_CHAR and p.one(p.END_CHAR).is_past_end
+
+def test_literals_and_chars():
+    p = BytesParser(b'key=\xe9t\xe9;')
+    assert p.one(Parser.chars('a-z'), l := []).x2_(p.chars('a-z'), l).one({b'=': 'eq'}, l).one_or_more(Not(b';'), acc=l).one({';'})
+    assert l == ['k', 'e', 'y', 'eq', 'été'] and p.is_end # bytes past ascii are their latin-1 chars
+    p.pos = 0
+    assert p.one(b'KEY', ic=True).one([b'='], l := []).one('é').one(b't').one('e') is p.fail and l == ['=']
+    assert not p.one('€') and not p.one(Not(b'\xe9')) and p.one(Not('€')).one(b';').pos == 8
+
+def test_builtins():
+    @parser_subroutine
+    def item(p, out, **_kwargs):
+        return p.if_.one(p.decimal, out).else_.one(p.string, out).endif
+    p = BytesParser(b'[1, -2.5e1, "a\\"b"] -31')
+    assert p.one(p.collection, item, out := []).ws.one(p.int_, out).is_end
+    assert out == [1, -25.0, 'a"b', -31]
+
+def test_regex_in_place():
+    p = BytesParser(b'ID:abc-123 rest')
+    assert p.one(re.compile(r'(?P<k>[A-Z]+):'), d := {}).one(re.compile(rb'[a-z]+-\d+'), l := []).ws.one(re.compile('R', re.I), l)
+    assert d == {'k': 'ID'} and l == ['abc-123', 'r'] # str or bytes pattern, the text is a str
+    p = BytesParser(b'ab:cd', pos=3)
+    assert p.behind(re.compile(r'(?P<w>\w+):'), d := {}).behind(re.compile(rb'b:'), l := []) and not p.behind(re.compile('a:'))
+    assert d == {'w': 'ab'} and l == ['b:']
+    with pytest.raises(re.error): # can't be bytes
+        p.one(re.compile('€'))
+
+def test_spans_are_views():
+    src = bytearray(b'ab cd')
+    p = BytesParser(src, spans=True)
+    assert p.one_or_more(str.isalpha, l := []).ws.one_or_more(str.isalpha, acc=l)
+    assert l == ['a', 'b', 'cd'] and all(isinstance(x, Span) for x in l) and l[2].text == 'cd'
+    v = l[2].view
+    assert isinstance(v, memoryview) and v.tobytes() == b'cd'
+    v[0] = ord('x') # a view, not a copy
+    assert src == b'ab xd'
+    del v, l, p
+
+def test_errors_and_forks():
+    p = BytesParser(b'abc def', pos=4)
+    assert repr(p) == "BytesParser(pos=4:'abc d̲ef')"
+    with pytest.raises(ValueError, match="bad at: abc d̲ef"):
+        p.one('x', nomatch='bad')
+    assert p.lookahead.one('def').backtrack().pos == 4 and p.behind(' ').behind(b'c ', l := []) and l == ['c ']
+    assert p.if_.one('x').else_.one('d').one('e').endif.pos == 6
+
+@pytest.mark.parametrize("use_re", [True, False])
+def test_same_result_as_str_parser(use_re):
+    @parser_subroutine
+    def rec(p, out): # ts method path status size "agent"
+        return (p.one_or_more(Parser.chars('^ $'), ts := Val.builder()).ws.one(('GET', 'POST'), m := Val()).ws
+                .one_or_more(Not(' '), path := []).ws.one(Parser.int_, n := []).ws.one(Parser.int_, n).ws.one(Parser.string, n)
+                .one('\n').do(lambda: out.append((str(ts), m.v, ''.join(path), *n))))
+    data = b'2025-10-18T12:00:01 GET /api/v1/items?id=42 200 1532 "Mozilla/5.0 \xe9"\n' * 20
+    with trace_level(0):
+        Parser.USE_RE, prev = use_re, Parser.USE_RE
+        try:
+            assert Parser(data.decode('latin-1')).zero_or_more(rec, a := []).is_end
+            assert BytesParser(data).zero_or_more(rec, b := []).is_end
+        finally:
+            Parser.USE_RE = prev
+    assert a == b and len(b) == 20 and b[0][-1] == 'Mozilla/5.0 é'
@@ -1,8 +1,9 @@
 """ Test Parser.chars() """
 # pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
 # cspell:words dlrusz,a̲bc,bcde,defg,klmnopqrst,uvwxyz,klmno,Scienc,w̲orld,s̲econd
+import re
 import pytest
-from parsek import Parser, Not, In, Range
+from parsek import Parser, Not, CharSet
 
 def test_chars_basic():
     p = Parser('abc')
@@ -11,9 +12,8 @@ def test_chars_basic():
     c2 = p.chars('ab')
     assert c1 is c2
     nc1 = p.chars('^ab')
-    neg, f = Not.crack(nc1)
-    assert neg
-    assert f('a')
+    assert isinstance(nc1, CharSet) and nc1.neg # negation is folded into the class
+    assert not nc1('a') and nc1('c') and nc1(p.END_CHAR)
     nc2 = p.chars('^ab')
     assert nc1 is nc2
 
@@ -25,23 +25,25 @@ def test_chars_basic():
     ('^$',              Not(Parser.END_CHAR)),
     ('\\^',             '^'),
     ('^a',              Not('a')),
-    ('\\^a',            In('^a')),
-    ('abc',             In('abc')),
-    ('^abc',            Not(In('abc'))),
-    ('^abc$',           Not(In('abc' + Parser.END_CHAR))),
-    ('^abc$d',          Not(In('abc$d'))),
-    ('^a-zA$',          Not(In('abcdefghijklmnopqrstuvwxyzA' + Parser.END_CHAR))),
-    ('a-zA$',           In('abcdefghijklmnopqrstuvwxyzA' + Parser.END_CHAR)),
-    ('a-zA\\$',         In('abcdefghijklmnopqrstuvwxyzA$')),
-    ('a-zA',            In('abcdefghijklmnopqrstuvwxyzA')),
-    ('a-z',             In('abcdefghijklmnopqrstuvwxyz')),
-    ('--z',             Range('-', 'z')),
-    ('a-',              In('a-')),
-    ('-a',              In('-a')),
-    ('a-z1-9',          In('abcdefghijklmnopqrstuvwxyz123456789')),
-    ('a-z-1-9',         In('abcdefghijklmnopqrstuvwxyz123456789-')),
-    ('a-z-9',           In('abcdefghijklmnopqrstuvwxyz-9')),
-    ('a\\-z-9',         (Range('9', 'z'), In('a-'))),
+    ('\\^a',            CharSet('^a')),
+    ('abc',             CharSet('abc')),
+    ('^abc',            CharSet('abc', neg=True)),
+    ('^abc$',           CharSet('abc' + Parser.END_CHAR, neg=True)),
+    ('^abc$d',          CharSet('abc$d', neg=True)),
+    ('^a-zA$',          CharSet('abcdefghijklmnopqrstuvwxyzA' + Parser.END_CHAR, neg=True)),
+    ('a-zA$',           CharSet('abcdefghijklmnopqrstuvwxyzA' + Parser.END_CHAR)),
+    ('a-zA\\$',         CharSet('abcdefghijklmnopqrstuvwxyzA$')),
+    ('a-zA',            CharSet('abcdefghijklmnopqrstuvwxyzA')),
+    ('a-z',             CharSet('abcdefghijklmnopqrstuvwxyz')),
+    ('--z',             CharSet('', [('-', 'z')])),
+    ('a-',              CharSet('a-')),
+    ('-a',              CharSet('-a')),
+    ('a-z1-9',          CharSet('abcdefghijklmnopqrstuvwxyz123456789')),
+    ('a-z-1-9',         CharSet('abcdefghijklmnopqrstuvwxyz123456789-')),
+    ('a-z-9',           CharSet('abcdefghijklmnopqrstuvwxyz-9')),
+    ('a\\-z-9',         CharSet('a-', [('9', 'z')])),
+    ('^\u0100-\ufffe',   CharSet('', [('\u0100', '\ufffe')], neg=True)),
+    ('a-\u0500\u0400-\u0900', CharSet('', [('a', '\u0900')])),
 ])
 def test_chars(spec, expected):
     got  = Parser.chars(spec)
@@ -49,3 +51,25 @@ def test_chars(spec, expected):
     print('GOT:', repr(got))
     print('EXP:', expected)
     assert repr(got) == repr(expected)
+
+@pytest.mark.parametrize("spec", ['abc', '^abc', 'a-z0-9_', '^a-z$', '^\n$', '\u0100-\ufffe', 'a\u0800-\u2000z-\u0500', '^ -~\u3000-\u9fff'])
+def test_chars_membership(spec):
+    cs = Parser.chars(spec)
+    neg = spec.startswith('^')
+    body = spec[1:] if neg else spec
+    expected = set()
+    for lo, hi in ((m.group(1), m.group(2) or m.group(1)) for m in re.finditer('(.)(?:-(.))?', body, re.S)):
+        expected.update(map(chr, range(ord(lo), ord(hi) + 1)))
+    if body.endswith('$'):
+        expected = (expected - {'$'}) | {Parser.END_CHAR}
+    for c in map(chr, range(0, 0x10000, 7)):
+        assert cs(c) is ((c in expected) is not neg), (spec, c)
+        assert (c in cs) is cs(c)
+
+def test_chars_matching():
+    p = Parser('x9\u4e00! ')
+    assert p.one(w := p.chars('a-z0-9'), l := []).one(w, l).one(Not(p.chars('^\u0100-\ufffe')), l).one(p.chars('^a-z$'), l).is_ok
+    assert l == ['x', '9', '\u4e00', '!']
+    assert not p.one(w) and p.one(Not(w)).is_end
+    assert not p.one(p.chars('^ $')) # END_CHAR is in the class
+    assert not Parser('Q').one(w) and Parser('Q').one(w, ic=True).is_end # ic lowers the char
@@ -0,0 +1,72 @@
+""" Test the cut (commit point) chain element """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import pytest
+from parsek import Parser, parser_subroutine, parser_subroutine_memo, str_context
+
+
+@parser_subroutine
+def stmt(p, out):
+    return (p.if_.one('let').cut.one(' ').one(p.identifier, out).
+            else_.one(p.decimal, out).endif.one(';'))
+
+@pytest.mark.parametrize("src, expected", [
+    ('let a;', ['a']),
+    ('12;', [12]),
+    ('let a;1;let b;', ['a', 1, 'b']),
+])
+def test_cut_ok(src, expected):
+    p = Parser(src)
+    assert p.one_or_more(stmt, out := []).is_end
+    assert out == expected and not p._lookahead_stack
+
+@pytest.mark.parametrize("src, pos", [
+    ('let 1;', 4),
+    ('1;let;', 5),
+    ('1;let a', 7),
+])
+def test_cut_error(src, pos):
+    with pytest.raises(ValueError, match="No match after cut") as e:
+        Parser(src).one_or_more(stmt, [])
+    assert str(e.value).endswith(str_context(src, pos)) # reported where it failed
+
+def test_cut_no_lookahead():
+    p = Parser('let a')
+    assert not p.one(stmt, []) # the cut lookahead is closed, nothing else to backtrack
+    assert p.pos == 5
+
+def test_cut_scope():
+    p = Parser('abcd')
+    assert p.if_.one('a').if_.one('b').cut.if_.one('x').else_.one('c').endif.endif.endif.one('d').is_end
+    assert not p._lookahead_stack
+    p = Parser('abc')
+    assert p.lookahead.one('ab').cut.is_ok and not p.is_backtrackable
+    assert p.commit.one('c').is_end
+    assert Parser('ab').cut.one('ab').is_end # nothing to commit
+    assert not Parser('a').fail.cut # inactive branch
+    p = Parser('a')
+    assert p.if_.one('a').cut.break_.else_.one('b').endif is not None and p.pos == 1
+
+def test_cut_fork():
+    @Parser.subroutine_new_stack
+    def sub(p):
+        return p.if_.one('a').cut.one('b').else_.one('a').endif
+    p = Parser('ac')
+    with pytest.raises(ValueError):
+        p.lookahead.one(sub)
+    assert p._lookahead_stack == [0] # cut in a new stack subroutine is confined to it
+    assert p.backtrack().pos == 0
+    @parser_subroutine
+    def neg(p):
+        return p.one('a').cut.one('b')
+    assert Parser('ac').one(Parser.Not(neg)).pos == 1
+
+def test_cut_memo():
+    @parser_subroutine_memo
+    def item(p, out):
+        return p.one_or_more(str.isalpha, acc=out).one(';').cut
+    p = Parser('ab;' * 200)
+    assert p.lookahead.one_or_more(item, out := []).commit.is_end
+    assert len(out) == 200
+    info = p.memo_info()
+    assert info['positions'] < 64 and info['entries'] == 1 # released, only the final failed item is memoized
@@ -0,0 +1,93 @@
+""" Test the global matcher dispatch cache """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+from parsek import Parser, Not, Val
+from .helpers import trace_level
+
+
+def test_dispatch_cache_hits():
+    with trace_level(0): # tracing uses parsers internally
+        comma = Parser.chars(',')
+        Parser.dispatch_cache_clear()
+        assert Parser.dispatch_cache_info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': Parser.DISPATCH_CACHE_SIZE}
+        p = Parser('a,a,A,b')
+        assert p.one('a').one(comma).one('a').one(comma).is_ok
+        info = Parser.dispatch_cache_info()
+        assert (info['hits'], info['misses'], info['size']) == (2, 2, 2)
+        assert p.one('a', ic=True).one(comma).one(Not('a')).is_ok # ic and negation are separate entries
+        info = Parser.dispatch_cache_info()
+        assert (info['hits'], info['misses'], info['size']) == (3, 4, 4)
+        Parser.dispatch_cache_clear()
+        assert Parser.dispatch_cache_info()['size'] == 0
+
+def test_dispatch_cache_not_cached():
+    with trace_level(0): # tracing uses parsers internally
+        Parser.dispatch_cache_clear()
+        p = Parser('abbc1')
+        l = []
+        @p.subroutine
+        def b(p):  return p.one('b')
+        @p.subroutine
+        def c(p):  return p.one('c', l) # closure
+        digit = lambda c: c.isdigit()
+        assert p.one(['x', 'a']).one({'b': 1}).one(b).one(c).one(digit).is_ok
+        # unhashable containers and closures are not cached:
+        assert [k[0] for k in Parser._cache_dispatch] == [b, 'b', 'c', digit]
+        assert Parser.dispatch_cache_info()['misses'] == 7
+
+def test_dispatch_cache_val_literal():
+    Parser.dispatch_cache_clear()
+    v = Val('ab')
+    p = Parser('ababcd')
+    assert p.one(v).one(v).is_ok
+    v.set('cd')
+    assert p.one(v).is_ok
+    assert p.is_end
+    assert not Parser('A').one(Val('a'))
+    assert Parser('A').one(Val('a'), ic=True)
+
+def test_dispatch_cache_val_not_literal():
+    with trace_level(0): # tracing uses parsers internally
+        Parser.dispatch_cache_clear()
+        p = Parser('abab')
+        cold = p._dispatch(v := Val('ab'), {})
+        assert p.one('ab').is_ok and p._dispatch(v, {}) == cold and p._dispatch(v, {})[1].__class__ is str # not the cached entry of the literal
+        v.set('xy')
+        assert not p.one(v) and p.one('ab').is_end
+        Parser.dispatch_cache_clear()
+        assert Parser('ab').one(w := Val('ab')).is_end and Parser('ab')._dispatch('ab', {})[1] == 'ab'
+        w.set('zz')
+        assert Parser('ab').one('ab').is_end
+
+def test_dispatch_cache_bounded(monkeypatch):
+    Parser.dispatch_cache_clear()
+    monkeypatch.setattr(Parser, 'DISPATCH_CACHE_SIZE', 4)
+    with trace_level(0):
+        p = Parser('abcdefgh')
+        for c in 'abcdefgh':
+            assert p.one(c)
+        assert Parser.dispatch_cache_info()['size'] == 4
+        assert list(k[0] for k in Parser._cache_dispatch) == ['e', 'f', 'g', 'h']
+        monkeypatch.setattr(Parser, 'DISPATCH_CACHE_SIZE', 0)
+        Parser.dispatch_cache_clear()
+        assert Parser('a').one('a')
+        assert Parser.dispatch_cache_info() == {'hits': 0, 'misses': 1, 'size': 0, 'maxsize': 0}
+
+def test_dispatch_cache_tuples_by_identity():
+    with trace_level(0):
+        Parser.dispatch_cache_clear()
+        t = ('ab', 'cd')
+        assert Parser('ab').one(t) and Parser('cd').one(t) and Parser('cd').one(tuple(['ab', 'cd'])) # equal, not the same
+        assert Parser.dispatch_cache_info()['hits'] == 1 and len(Parser._cache_dispatch) == 2
+        assert Parser._cache_dispatch[id(t), False, False][3] is t # keeps it alive, so the id isn't reused
+
+def test_dispatch_cache_tuples_with_closures():
+    with trace_level(0):
+        Parser.dispatch_cache_clear()
+        l = []
+        @Parser.subroutine
+        def c(p):  return p.one('c', l) # closure
+        assert Parser('c').one(('x', c)) and Parser('c').one(('x', 'abc'.startswith, Not(('y', c)))) is not None
+        assert Parser('c').one(('x', str.isalpha)) and Parser('1').one(('x', (len, str.isdigit)))
+        tuples = [e[3] for e in Parser._cache_dispatch.values() if e[3] is not None]
+        assert tuples == [('x', str.isalpha), ('x', (len, str.isdigit)), (len, str.isdigit)] # not the ones with the closure or bound method
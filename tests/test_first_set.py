@@ -0,0 +1,109 @@
+""" Test FIRST set prediction: first_set() annotations and tuple alternations """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import pytest
+from parsek import Parser, Val, In, Range, first_set, parser_subroutine
+
+
+def make_subs():
+    calls = []
+    @parser_subroutine
+    @first_set('ab')
+    def ab(p, out):
+        calls.append('ab')
+        return p.one_or_more(In('ab'), acc=out)
+    @parser_subroutine
+    @first_set(Parser.chars('0-9'))
+    def digits(p, out):
+        calls.append('digits')
+        return p.one_or_more(str.isdigit, acc=out)
+    @parser_subroutine
+    def opaque(p, out):
+        calls.append('opaque')
+        return p.one('x', out)
+    return calls, ab, digits, opaque
+
+def test_first_set_sr():
+    calls, ab, digits, _ = make_subs()
+    p = Parser('ab12')
+    assert not p.one(digits, Val())
+    assert p.one(ab, Val()).one(digits, v := Val()).is_end
+    assert v == '12' and calls == ['ab', 'digits']
+    assert p.one(Parser.Not(ab), Val()).is_past_end # negation doesn't use the FIRST set
+
+@pytest.mark.parametrize("src, expected, expected_calls", [
+    ('ba', ['ba'], ['opaque', 'ab']), # unannotated subroutines are always tried
+    ('12', ['12'], ['digits']),
+    ('x', ['x'], ['opaque']),
+    ('-', [], ['opaque']),
+])
+def test_first_set_alternation(src, expected, expected_calls, monkeypatch):
+    monkeypatch.setattr(Parser, '_MIN_ALTERNATION', 0)
+    calls, ab, digits, opaque = make_subs()
+    t = (digits, opaque, ab)
+    for _ in range(2): # tried in order, then indexed
+        p = Parser(src)
+        assert bool(p.one(t, out := [])) is bool(expected)
+        assert out == expected and calls == expected_calls
+        calls.clear()
+
+@pytest.mark.parametrize("alts, src, pos, ok", [
+    (('ab', 'cd', str.isdigit), 'cd', 2, True),
+    (('ab', 'cd', str.isdigit), '7', 1, True),
+    (('ab', In('xy'), Range('0', '9'), 'c'), 'c', 1, True),
+    ((('ab', 'cd'), ('ef',), Parser.chars('g-h')), 'h', 1, True),
+    ((Parser.Not('a'), 'a'), 'a', 1, True),
+    (('a', 'bc', 'b'), 'bd', 1, True), # order is kept: 'bc' fails, then 'b'
+    (('', 'a'), 'b', 0, True),
+    (('ab', 'cd'), 'x', 0, False),
+    (('ab', 'cd', Parser.Not('x')), 'x', 0, False),
+    (('a', ('b', 'c'), Parser.END_CHAR), '', 1, True),
+])
+def test_first_set_literals(alts, src, pos, ok, monkeypatch):
+    monkeypatch.setattr(Parser, '_MIN_ALTERNATION', 0)
+    t = alts + (Val('nope'),) # forces _one_multi
+    for _ in range(2):
+        p = Parser(src)
+        assert bool(p.one(t)) is ok
+        assert p.pos == pos
+
+def test_first_set_index_reused_tuples():
+    Parser.dispatch_cache_clear()
+    t = tuple(['ab', 'cd', str.isdigit, Parser.chars('x-z')])
+    small = tuple(['ab', str.isdigit])
+    for ch in 'y7':
+        assert Parser(ch).one(t).is_end and Parser('7').one(small).is_end
+    assert Parser._alternation(t, False).candidates('y') == ((t[2], None, False), (t[3], None, True))
+    assert Parser._alternation(small, False) is None # too short to index
+    for ch in 'ab7z' * 10: # made per call: seen once each, never indexed
+        assert Parser(ch).one(tuple(['ab', 'cd', str.isdigit, Parser.chars('x-z')])).is_ok is (ch in '7z')
+    assert [e[0] for e in Parser._cache_first.values() if e[1] is not None] == [t]
+
+def test_first_set_last_fails_in_place():
+    @parser_subroutine
+    @first_set('a')
+    def a_then_b(p):
+        return p.one('a').one('b')
+    p = Parser('ac')
+    assert not p.one(('x', a_then_b)) and p.pos == 1 # the last alternative commits at the point of failure
+    p = Parser('ac')
+    assert not p.one((a_then_b, 'x')) and p.pos == 0
+
+def test_first_set_ic(monkeypatch):
+    monkeypatch.setattr(Parser, '_MIN_ALTERNATION', 0)
+    t1, t2, t3 = ('x', 'ab', str.isdigit), ('x', In('pq'), str.isdigit), ('x', lambda ch: ch == 'i\u0307')
+    for _ in range(2): # tried in order, then indexed
+        assert Parser('AB').one(t1, ic=True).is_end
+        assert Parser('Q').one(t2, ic=True).is_end
+        assert Parser('İ').one(t3, ic=True).is_end # lower() isn't a single char
+
+def test_first_set_builtins():
+    for sr, src in ((Parser.decimal, '"'), (Parser.int_, 'x'), (Parser.uint, '-'), (Parser.identifier, '1'),
+                    (Parser.string, '1'), (Parser.collection, '1')):
+        assert not getattr(sr, '__parsek_first')(src, {})
+    assert getattr(Parser.string, '__parsek_first')('«', {'quotes': {'«': '»'}})
+    assert getattr(Parser.string, '__parsek_first')('x', {'quotes': {None: '"'}})
+    assert getattr(Parser.collection, '__parsek_first')('{', {'brackets': {'{': '}'}})
+    p = Parser('"a" [1]')
+    assert p.one((p.decimal, p.string), items := []).ws.one(p.collection, p.int_, items).is_end
+    assert items == ['a', 1]
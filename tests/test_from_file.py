@@ -0,0 +1,107 @@
+""" Test Parser.from_file(): memory mapped file input, ASCII/latin-1 as bytes and chunked UTF-8 decoding """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import random
+import re
+import pytest
+from parsek import Parser, BytesParser, Utf8Parser, Span, Not, parser_subroutine
+from .helpers import trace_level
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(Utf8Parser, 'CHUNK', 100)
+    monkeypatch.setattr(Utf8Parser, 'OVERLAP', 48)
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 100000) # lowered by other tests
+
+def write(tmp_path, data: bytes):
+    (path := tmp_path / 'src.txt').write_bytes(data)
+    return path
+
+FIELD = re.compile(r'[^,\n]*')
+
+@parser_subroutine
+def row(p, out): # field (',' field)*
+    return p.one(FIELD, r := []).zero_or_more(p.sr(lambda p, out: p.one(',').one(FIELD, out)), r).do(out.append, r)
+
+@parser_subroutine
+def csv(p, out): # row ('\n' row)*
+    return p.one(row, out).zero_or_more(p.sr(lambda p, out: p.one('\n').one(row, out)), out)
+
+@pytest.mark.parametrize("data, cls", [
+    (b'a,b\n1,2\n', BytesParser),   # ASCII, UTF-8 by default
+    ('a,é\n€,😀\n'.encode(), Utf8Parser),
+    (b'', BytesParser),
+])
+def test_from_file(tmp_path, data, cls):
+    p = Parser.from_file(write(tmp_path, data))
+    assert p.__class__ is cls and p.len == len(text := data.decode())
+    with trace_level(0):
+        assert p.one(csv, rows := []).is_end and Parser(text).one(csv, expected := []) and rows == expected
+
+def test_ascii_chunks(tmp_path, small_chunks): # the chars are counted chunk by chunk, ASCII chunks by their length
+    text = 'a,b\n' * 100
+    assert Parser.from_file(write(tmp_path, text.encode())).__class__ is BytesParser
+    p = Parser.from_file(write(tmp_path, (text := text + 'é,€').encode()))
+    assert p.__class__ is Utf8Parser and p.len == len(text) and len(p.source._cstarts) > 4
+    assert p.source[-3:] == 'é,€' and p.source.text(0, 4) == 'a,b\n'
+
+def test_encodings(tmp_path):
+    path = write(tmp_path, 'é;x'.encode('latin-1'))
+    p = Parser.from_file(path, 'latin-1', pos=1)
+    assert isinstance(p, BytesParser) and p.ch == ';' and p.behind('é') and p.one(';').one('x').is_end
+    with pytest.raises(UnicodeDecodeError): # not UTF-8
+        Parser.from_file(path).one('é')
+    with pytest.raises(ValueError, match="Unsupported file encoding"):
+        Parser.from_file(path, 'utf-16')
+
+def test_utf8_chunks(small_chunks):
+    random.seed(7)
+    text = ''.join(random.choice('ab é€😀\n,') for _ in range(1000))
+    p = Utf8Parser(text.encode())
+    assert len(p.source) == p.len == len(text) and len(p.source._cstarts) > 10
+    assert ''.join(p.source[i] for i in range(len(text))) == text and p.source[-1] == text[-1]
+    for _ in range(500):
+        a, b = random.randrange(len(text) + 2), random.randrange(len(text) + 2)
+        assert p.source[a:b] == text[a:b]
+    assert len(p.source._chunks) <= 4 # only the last few decoded chunks are kept
+    with pytest.raises(IndexError):
+        p.source[len(text)] # pylint: disable=pointless-statement
+
+def test_utf8_same_as_str(small_chunks):
+    random.seed(11)
+    text = ''.join(random.choice('ab é€😀\n,') for _ in range(1000))
+    with trace_level(0):
+        assert Utf8Parser(text.encode()).one(csv, rows := []).is_end and Parser(text).one(csv, expected := []) and rows == expected
+    p, q = Utf8Parser(text.encode(), spans=True), Parser(text)
+    assert p.one_or_more(Not('\n'), acc=(a := [])).pos == q.one_or_more(Not('\n'), acc=(b := [])).pos and a == b and isinstance(a[0], Span)
+    long = re.compile(r'[^😀]+') # runs past the chunk and its overlap
+    for pos in range(0, len(text), 13):
+        p.pos = q.pos = pos
+        assert bool(p.one(long, l1 := [])) == bool(q.one(long, l2 := [])) and l1 == l2 and p.pos == q.pos
+        p.pos = q.pos = pos
+        for pat in (re.compile('[a-c]+'), re.compile(r'\S{1,10}'), re.compile('(?:é|€)+')):
+            assert bool(p.behind(pat, l1 := [])) == bool(q.behind(pat, l2 := [])) and l1 == l2
+
+def test_utf8_errors(small_chunks):
+    p = Utf8Parser(('é' * 200).encode(), pos=150)
+    assert repr(p) == 'Utf8' + repr(Parser('é' * 200, pos=150))
+    with pytest.raises(ValueError, match="expected x"):
+        p.one('x', nomatch='expected x')
+    assert p.lookahead.one_or_more('é').backtrack().pos == 150 and p.one(p.END_CHAR) is p.fail
+
+@pytest.mark.parametrize("use_re", [True, False])
+def test_utf8_runs(small_chunks, monkeypatch, use_re):
+    monkeypatch.setattr(Utf8Parser, 'OVERLAP', 4) # runs reach the end of the decoded text
+    random.seed(3)
+    text = ''.join(random.choices(('é', 'a', '*', '*/'), (5, 5, 5, 1), k=1000)) + '*/' # some '*/' across chunk ends
+    with trace_level(0):
+        Parser.USE_RE, prev = use_re, Parser.USE_RE
+        try:
+            p, q = Utf8Parser(text.encode()), Parser(text)
+            for pos in range(0, len(text) - 1, 7): # not past the last "*/": Not() matches END_CHAR
+                p.pos = q.pos = pos
+                assert p.zero_or_more(Not('*/'), acc=(a := [])).pos == q.zero_or_more(Not('*/'), acc=(b := [])).pos and a == b
+                assert p.zero_or_more(('é', '*'), a).pos == q.zero_or_more(('é', '*'), b).pos and a == b
+        finally:
+            Parser.USE_RE = prev
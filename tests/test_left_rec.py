@@ -0,0 +1,77 @@
+""" Test left recursive subroutines: parser_subroutine_left_rec """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import pytest
+from parsek import Parser, parser_subroutine, parser_subroutine_memo, parser_subroutine_left_rec
+
+
+@parser_subroutine
+def num(p, out):
+    return p.one_or_more(str.isdigit, acc=out)
+
+@parser_subroutine_left_rec
+def expr(p, out): # expr = expr ('+'|'-') term | term
+    return (p.if_.one(expr, a := []).one(('+', '-'), a).one(term, a).do(lambda: out.append((a[1], a[0], a[2]))).
+            else_.one(term, out).endif)
+
+@Parser.subroutine_left_rec
+def term(p, out): # term = term ('*'|'/') atom | atom
+    return (p.if_.one(term, a := []).one(('*', '/'), a).one(atom, a).do(lambda: out.append((a[1], a[0], a[2]))).
+            else_.one(atom, out).endif)
+
+@parser_subroutine
+def atom(p, out):
+    return p.if_.one('(').one(expr, out).one(')').else_.one(num, out).endif
+
+@pytest.mark.parametrize("src, expected, pos", [
+    ('1', '1', 1),
+    ('1-2-3', ('-', ('-', '1', '2'), '3'), 5),
+    ('1+2*3-4', ('-', ('+', '1', ('*', '2', '3')), '4'), 7),
+    ('8/4/2*(1-1)', ('*', ('/', ('/', '8', '4'), '2'), ('-', '1', '1')), 11),
+    ('1+2+', ('+', '1', '2'), 3), # longest match, the trailing '+' is left
+])
+def test_left_rec_expr(src, expected, pos):
+    p = Parser(src)
+    assert p.one(expr, out := [])
+    assert out == [expected] and p.pos == pos
+
+def test_left_rec_fail():
+    p = Parser('x+1')
+    assert not p.lookahead.one(expr, out := [])
+    assert p.backtrack().pos == 0 and out == []
+    assert Parser('').one(Parser.Not(expr), out).is_past_end
+
+@pytest.mark.parametrize("deco", [parser_subroutine, parser_subroutine_memo, parser_subroutine_left_rec])
+def test_left_rec_indirect(deco):
+    @parser_subroutine_left_rec
+    def a(p, out): # a = b '-' num | num
+        return p.if_.one(b, l := []).one('-').one(num, l).do(out.append, tuple(l)).else_.one(num, out).endif
+    @deco
+    def b(p, out): # b = a
+        return p.one(a, out)
+    for start in (a, b):
+        p = Parser('1-2-3.')
+        assert p.one(start, out := []).one('.').is_end
+        assert out == [(('1', '2'), '3')]
+
+def test_left_rec_state_and_replay():
+    calls = []
+    @parser_subroutine_left_rec
+    def ab(p, out): # ab = ab 'b' | 'a'
+        calls.append(p.pos)
+        return p.if_.one(ab, out).one('b', out).else_.one('a', out).endif.goto(p.state + 1)
+    p = Parser('abbc', state=0)
+    assert p.lookahead.one(ab, s := Parser.Val('')).backtrack().goto(0).one(ab, s).one('c').is_end
+    assert s == 'abbabb' and p.state == 3 and calls == [0, 0, 0, 0]
+    assert p.memo_info()['entries'] == 1
+
+def test_left_rec_linear():
+    src = '+'.join('1' * 100)
+    calls = []
+    @parser_subroutine_left_rec
+    def sum_(p, out):
+        calls.append(p.pos)
+        return p.if_.one(sum_, out).one('+').one('1', out).else_.one('1', out).endif
+    p = Parser(src)
+    assert p.one(sum_, out := []).is_end
+    assert len(out) == 100 and len(calls) == 101 # one run per growth step
@@ -0,0 +1,128 @@
+""" Test the Lexer front-end: maximal munch tokenizing and TokenParser over the token stream """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import re
+import pytest
+from parsek import Parser, Lexer, TokenParser, Tokens, Not, Val, first_set, parser_subroutine
+
+WS = (None, re.compile(r'\s+'))
+LEX = Lexer([('KW', ('if', 'else')), ('BOOL', {'true': True, 'false': False}), ('NUM', Parser.decimal), ('ID', Parser.identifier),
+             ('STR', Parser.string), ('OP', ('**', '*', '+', '-', '(', ')')), WS])
+
+
+def test_tokenize():
+    t = LEX.tokenize('if x1 ** 2.5 else "a b"\n')
+    assert isinstance(t, Tokens) and len(t) == 6 and t.kinds == ['KW', 'ID', 'OP', 'NUM', 'KW', 'STR']
+    assert list(t) == [('KW', 0, 2, None), ('ID', 3, 5, 'x1'), ('OP', 6, 8, None), ('NUM', 9, 12, 2.5),
+                       ('KW', 13, 17, None), ('STR', 18, 23, 'a b')]
+    assert t[0] == 'KW' and t[-1] == 'STR' and t[2:3] == '**' and t[3:4] == 2.5 and t[1:4] == 'x1 ** 2.5' and t[4:4] == ''
+    assert t.token(3) == ('NUM', 9, 12, 2.5) and t.offset(1) == 3 and t.offset(6) == 24 and repr(t) == "Tokens('KW ID OP NUM KW STR')"
+
+@pytest.mark.parametrize("src, kinds", [
+    ('ifx', ['ID']),             # longest match wins
+    ('if', ['KW']),              # first rule wins a tie
+    ('**', ['OP']), ('*+', ['OP', 'OP']),
+    ('-1', ['NUM']), ('- 1', ['OP', 'NUM']),
+    ('true truex', ['BOOL', 'ID']),
+    ('', []), ('  ', []),
+])
+def test_maximal_munch(src, kinds):
+    assert LEX.tokenize(src).kinds == kinds
+
+def test_token_values():
+    lex = Lexer({'KV': re.compile(r'(?P<k>\w+)=(?P<v>\w+)'), 'B': {'on': 1, 'off': 0}, 'W': re.compile(r'\w+'), 'SP': ' '})
+    t = lex.tokenize('a=b on off c')
+    assert t.kinds == ['KV', 'SP', 'B', 'SP', 'B', 'SP', 'W'] and t.values == [{'k': 'a', 'v': 'b'}, None, 1, None, 0, None, None]
+    @parser_subroutine
+    def pair(p, out):
+        return p.one(str.isdigit, out).one(',').one(str.isdigit, out)
+    assert Lexer([('P', pair), ('E', Not(pair))]).tokenize('1,2x').values == [('1', '2'), None] # more than one value makes a tuple
+
+def test_no_match():
+    with pytest.raises(ValueError, match=r"No token matches at: .*\$"):
+        LEX.tokenize('x + $y')
+    with pytest.raises(ValueError, match="No token matches"):
+        Lexer([('A', Parser.chars('a-z')), ('E', re.compile(r'\d*'))]).tokenize('ab!') # empty matches don't count
+
+def test_first_table():
+    calls = []
+    @parser_subroutine
+    @first_set('0123456789')
+    def digits(p, out):
+        calls.append(p.pos)
+        return p.one_or_more(str.isdigit, out)
+    lex = Lexer([('N', digits), ('SP', str.isspace), ('A', Parser.chars('a-z')), ('X', re.compile('[xyz]+'))])
+    t = lex.tokenize('12 ab 3 xy')
+    assert t.kinds == ['N', 'SP', 'A', 'A', 'SP', 'N', 'SP', 'X'] and calls == [0, 6] # tried only where a digit starts
+    assert [r[0] for r in lex._table['a']] == ['A', 'X'] and [r[0] for r in lex._table['1']] == ['N', 'X'] # patterns have no FIRST set
+    assert [r[0] for r in lex._table[' ']] == ['SP', 'X']
+
+def test_token_parser_matchers():
+    p = LEX.parser('if x1 ** 2.5 else true "s"', state=1)
+    assert isinstance(p, TokenParser) and p.state == 1 and p.ch == 'KW' and p.token == ('KW', 0, 2, None)
+    assert not p.one('ID') and not p.one('kw') and p.one('kw', ic=True).pos == 1
+    assert p.one(('NUM', 'ID'), l := []).one(Not('NUM'), l).one(['NUM'], l).one({'KW'}).one({'BOOL': 'yes'}, l).one(re.compile('S.*'), l)
+    assert l == ['x1', '**', 2.5, 'yes', 's'] and p.is_end and p.token is None and p.ch == p.END_CHAR
+    assert p.one(p.END_CHAR).is_past_end
+
+def test_token_parser_more_matchers():
+    p = LEX.parser('1 x true if')
+    assert p.one(Not({'ID'})).one(Not(('NUM', 'OP'))).one({'bool': 7}, l := [], ic=True).one(Not({'kw': 0}), ic=True) is p.fail
+    assert p.one(['Kw', Val('x')], ic=True).is_end and l == [7]
+    p.pos = 0
+    assert p.one(lambda k: k == 'NUM', l).one(('OP', 'ID', Val('BOOL')), l).one(Not(re.compile('K.')), l) and l == [7, 1, 'x', True]
+    p.pos = 0
+    assert p.one(('OP', Not('ID')), l).one(('OP', {'ID': 'id'}), l).pos == 2 and l[-2:] == [1, 'id']
+
+def test_token_parser_quantifiers_and_subroutines():
+    lex = Lexer([('NUM', Parser.int_), ('ID', Parser.identifier), *((op, op) for op in '+*()'), (None, ' ')])
+    @parser_subroutine
+    def expr(p, out): # expr = term ('+' term)*
+        return p.one(term, a := []).zero_or_more(p.sr(lambda p, out: p.one('+').one(term, out)), a).do(
+            lambda: out.append(a[0] if len(a) == 1 else ('+', *a)))
+    @parser_subroutine
+    def term(p, out): # term = atom ('*' atom)*
+        return p.one(atom, a := []).zero_or_more(p.sr(lambda p, out: p.one('*').one(atom, out)), a).do(
+            lambda: out.append(a[0] if len(a) == 1 else ('*', *a)))
+    @parser_subroutine
+    def atom(p, out): # atom = NUM | ID | '(' expr ')'
+        return p.if_.one(('NUM', 'ID'), out).else_.one('(').one(expr, out).one(')').endif
+    assert lex.tokenize('y+3').kinds == ['ID', 'NUM'] # maximal munch: '+3' is a number
+    assert lex.parser('1 + x*2 * (y + 3)').one(expr, out := []).is_end
+    assert out == [('+', 1, ('*', 'x', 2, ('+', 'y', 3)))]
+    p = lex.parser('1 2 3 x')
+    assert p.one_or_more('NUM', l := [], acc=(s := [])).one('ID').is_end and l == [1, 2, 3] and s == ['1 2 3']
+    p.pos = 0
+    assert p.zero_or_more(Not('ID'), l := []).pos == 3 and l == [1, 2, 3] and p.repeat(1, 2, ('NUM', 'ID'), l).is_end
+    with pytest.raises(ValueError, match=r"expected a number at: 1 2 3 x̲"):
+        lex.parser('1 2 3 x').x3_('NUM').one('NUM', nomatch='expected a number')
+
+def test_token_parser_behind_and_branches():
+    p = LEX.parser('x + 1')
+    assert p.one('ID').one('OP').behind('OP', l := []).behind(('KW', 'OP'), l).behind(Not('NUM'), l) and l == ['+'] * 3
+    assert not p.behind('ID') and p.behind(re.compile('O.')) and p.if_.one('ID').else_.one('NUM', l).endif.is_end and l[-1] == 1
+    assert p.pos == 3 and not p.lookahead.one('NUM') and p.backtrack().pos == 3
+    p.pos = 1
+    with pytest.raises(ValueError, match=r"bad at: x \+̲ 1"):
+        p.one('NUM', nomatch='bad')
+    assert repr(p) == "TokenParser(pos=1:'x +̲ 1')"
+
+def test_token_matchers_cached_separately():
+    Parser.dispatch_cache_clear()
+    assert Parser('ab').one('ab') and not TokenParser(Tokens('ab', ['ab'], [0], [2])).one('a')
+    assert TokenParser(Tokens('ab', ['ab'], [0], [2])).one('ab').is_end and Parser.dispatch_cache_info()['size'] >= 2
+    Parser.dispatch_cache_clear()
+    assert Parser.dispatch_cache_info()['size'] == 0
+
+def test_same_result_as_char_parser():
+    @parser_subroutine
+    def value(p, out):
+        return p.one(Parser.decimal, out) if p.__class__ is Parser else p.one('NUM', out)
+    @parser_subroutine
+    def values(p, out): # value (',' value)*
+        sep = ',' if p.__class__ is Parser else 'COMMA'
+        return p.ws.one(value, out).zero_or_more(p.sr(lambda p, out: p.ws.one(sep).ws.one(value, out)), out)
+    src = '1, 2.5 ,-3,4e2'
+    assert Parser(src).one(values, a := []).is_end
+    lex = Lexer([('NUM', Parser.decimal), ('COMMA', ','), (None, str.isspace)])
+    assert lex.parser(src).one(values, b := []).is_end and a == b == [1, 2.5, -3, 400.0]
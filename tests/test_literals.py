@@ -0,0 +1,112 @@
+""" Test indexed alternations of literals: tuples, lists, sets and mappings """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+import pytest
+from parsek import Parser, Not, Val
+
+E = Parser.END_CHAR
+KEYS = [
+    ('a', 'ab', 'abc'),
+    ('abc', 'ab', 'a'),
+    ('ab', 'abc', 'b', ''),
+    ('x', 'abd', 'abc', 'ab'),
+    ('ab' + E, 'a' + E + E, E, 'c'),
+    ('SELECT', 'SET', 'select', 'FROM', 'from'),
+    ('straße', 'ǅ', 'İx', 'ΑΣ', 'σ'),
+]
+SOURCES = ['', 'a', 'ab', 'abc', 'abcd', 'abd', 'b', 'c', 'Select * FROM', 'STRASSE', 'straßE', 'ǆ', 'İx', 'i̇x', 'ας', 'ΑΣ', 'σ']
+
+@pytest.mark.parametrize("keys", KEYS)
+@pytest.mark.parametrize("src", SOURCES)
+@pytest.mark.parametrize("ic", [False, True])
+def test_literals_same_as_scan(keys, src, ic):
+    for pos in range(len(src) + 2):
+        p = Parser(src, pos=pos)
+        expected = p._scan_any_ic(keys) if ic else p._scan_any(keys)
+        assert (p._match_any_ic(keys) if ic else p._match_any(keys)) == expected
+        for t in (list(keys), dict.fromkeys(keys)):
+            assert (p._match_any_ic(t) if ic else p._match_any(t)) == expected
+        if not any(k.lower().startswith(kk.lower()) for k in keys for kk in keys if k != kk): # order doesn't matter
+            assert (p._match_any_ic(set(keys)) if ic else p._match_any(set(keys))) == expected
+
+def test_literals_first_match_wins():
+    p = Parser('abcd')
+    assert p.one(('a', 'abc'), l := []).one(('bc', 'b', 'bcd'), l).is_ok
+    assert l == ['a', 'bc']
+    assert p.one_ic(('X', 'D')).is_end
+    assert not Parser('x').one(('a', 'b'))
+    assert Parser('x').one(Not(('a', 'b'))).is_end
+
+def test_literals_cached():
+    Parser._cache_literals.clear()
+    kw = ('if', 'else', 'elif')
+    p = Parser('elif if')
+    assert p.one(kw, v := Val('')).ws.one(kw, v).is_end
+    assert v.value == 'elifif'
+    entry = Parser._cache_literals[id(kw)]
+    assert entry[0] is kw and entry[1] is None and isinstance(entry[2], Parser._Trie) and entry[3] is None
+    assert Parser('ELSE').one(kw, ic=True).is_end
+    assert isinstance(entry[3], Parser._Trie)
+
+def test_literals_mutable():
+    kw = ['a', 'b', *'123456']
+    p = Parser('abc')
+    assert p.x0_(kw).pos == 2 and isinstance(Parser._cache_literals[id(kw)][2], Parser._Trie)
+    kw.append('c') # list is re-indexed when its size changes
+    assert p.one(kw).is_end
+    kw[0] = 'z' # replaced in place: re-indexed too
+    assert not Parser('a').one(kw) and Parser('z').one(kw)
+    kw[1:3] = ['select', 'b'] # same size, an ordered alternation of the current keys
+    assert Parser('select').one(kw).is_end and Parser('2').one(kw).is_end and not Parser('1').one(kw)
+    assert Parser._cache_literals[id(kw)][1] == kw and Parser._cache_literals[id(kw)][1] is not kw
+    small = ['a', 'b']
+    assert Parser('b').one(small) and id(small) not in Parser._cache_literals # scanned, not kept
+    small[0] = 'z'
+    assert Parser('z').one(small)
+    v = Val('q')
+    t = ('a', v) # Val changes, not indexed
+    assert Parser('q').one(t).is_end
+    v.set('r')
+    assert Parser('r').one(t).is_end
+    assert Parser._cache_literals[id(t)][2] is False
+
+def test_literals_ic_special():
+    keys = ('ΑΣ', 'İ')
+    assert Parser._literals(keys, True) is None # ic matching of these is not per character
+    assert Parser('ας').one(keys, ic=True).is_end
+    assert Parser('İ').one(('i', 'x'), ic=True).is_ok is False # 'İ'.lower() is 'i̇'
+    assert Parser('xİ').one(('X', 'İ'), ic=True).one(('i', 'İ'), ic=True).is_end
+
+def test_literals_behind():
+    p = Parser('fooBAR', pos=6)
+    assert p.behind(('AR', 'BAR'), v := Val('')) and v.value == 'AR'
+    assert p.behind(('baz', 'bar'), v := Val(''), ic=True) and v.value == 'BAR'
+
+def test_literals_mapping():
+    Parser._cache_literals.clear()
+    m = {'on': True, 'off': False, 'o': None, **{f'k{i}': i for i in range(5)}}
+    p = Parser('on off o')
+    assert p.one(m, l := []).ws.one(m, l).ws.one(m, l).is_end
+    assert l == [True, False, None]
+    assert isinstance(Parser._cache_literals[id(m)][2], Parser._Buckets)
+    assert Parser('ON').one_ic(m, l).is_end and l[-1] is True
+    m['x'] = 0 # mutated: re-indexed
+    assert Parser('x').one(m, l).is_end and l[-1] == 0
+    del m['o']
+    assert not Parser('o').one(m)
+    m.pop('on'); m['on'] = 1 # same keys, new order
+    assert Parser('on').one(m, l).is_end and l[-1] == 1 and Parser._cache_literals[id(m)][1][-1] == 'on'
+    del m['k3']; m['zz'] = 99 # same size, other keys
+    assert not Parser('k3').one(m, l) and Parser('zz').one(m, l).is_end and l[-1] == 99
+    m['k4'] = 44 # a new value: values are looked up in the mapping
+    assert Parser('k4').one(m, l).is_end and l[-1] == 44
+
+def test_literals_set():
+    s = {'x', 'yy', *'1234567'}
+    assert Parser('yyx').one(s).one(s).is_end
+    s.add('z')
+    assert Parser('z').one(s).is_end
+    s.discard('x'); s.add('qq') # same size, other keys
+    assert not Parser('x').one(s) and Parser('qq').one(s).is_end
+    assert Parser('Z').one({'z', 'q'}, ic=True).is_end
+    assert Parser('İ').one({'i̇', 'İ'}, ic=True).is_end # bucketed by the key length, same as the scan
@@ -0,0 +1,105 @@
+""" Test packrat memoization of subroutines: parser_subroutine_memo """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+import pytest
+from parsek import Parser, Val, parser_subroutine, parser_subroutine_memo
+from .helpers import trace_level
+
+
+def make_grammar(memo):
+    """ Naive backtracking grammar: exponential without memoization because of nested parentheses """
+    deco = parser_subroutine_memo if memo else parser_subroutine
+    calls = []
+    @deco
+    def expr(p, out):
+        return (p.if_.one(term, a := []).one('+').one(expr, a).do(out.append, ('+', *a)).
+                elif_.one(term, b := []).one('-').one(expr, b).do(out.append, ('-', *b)).
+                else_.one(term, out).endif)
+    @deco
+    def term(p, out):
+        calls.append(p.pos)
+        return (p.if_.one('(').one(expr, l := []).one(')').do(out.append, l).
+                else_.one_or_more(str.isdigit, acc=out).endif)
+    return expr, calls
+
+@pytest.mark.parametrize("src, expected", [
+    ('1', ['1']),
+    ('1+2-3', [('+', '1', ('-', '2', '3'))]),
+    ('(1+(2))-((3))', [('-', [('+', '1', ['2'])], [['3']])]),
+    ('((1))', [[['1']]]),
+])
+def test_memo_same_result(src, expected):
+    results = []
+    for memo in (False, True):
+        expr, _ = make_grammar(memo)
+        p = Parser(src)
+        assert p.one(expr, out := []).is_end
+        results.append(out)
+    assert results == [expected, expected]
+
+def test_memo_linear():
+    with trace_level(0): # the unmemoized run is exponential
+        src = '(' * 5 + '1' + ')' * 5
+        expr, calls = make_grammar(False)
+        assert Parser(src).one(expr, []).is_end
+        slow = len(calls)
+        expr, calls = make_grammar(True)
+        assert (p := Parser(src)).one(expr, out := []).is_end
+        assert len(calls) == len(set(calls)) == 6 < slow # each term is parsed once per position
+        info = p.memo_info()
+        assert info['hits'] > 0 and info['misses'] == 12
+        assert out == [eval(src.replace('(', '[').replace(')', ']').replace('1', "'1'"))] # pylint: disable=eval-used
+
+def test_memo_replay_and_failure():
+    calls = []
+    @parser_subroutine_memo
+    def word(p, out=None, *, stop=' '):
+        calls.append((p.pos, stop))
+        return p.one_or_more(str.isalpha, acc=out).one(stop)
+    p = Parser('abc def')
+    v1, v2 = Val(''), []
+    assert not p.lookahead.one(word, v1, stop=',')
+    p.backtrack()
+    assert not p.lookahead.one(word, v1).fail # succeeds, then the branch is failed
+    assert p.backtrack().one(word, v2).is_ok # replayed from the memo
+    assert v1.value == 'abcabc' and v2 == ['abc']
+    assert calls == [(0, ','), (0, ' ')] and p.pos == 4
+    assert not p.lookahead.one(word, stop=',')
+    assert p.backtrack().pos == 4 and calls[-1] == (4, ',')
+
+def test_memo_state_and_forks():
+    @parser_subroutine_memo
+    def x(p, out=None):
+        return p.one('x', out).goto(p.state + 1)
+    p = Parser('xx', state=0)
+    assert p.lookahead.one(x, l := []).one(x, l).backtrack().goto(0).one(x, l).one(x, l).is_end
+    assert l == ['x', 'x', 'x', 'x'] and p.state == 2
+    assert p.memo_info()['hits'] == 2
+    q = Parser('xy', state=0)
+    assert q.one(x, []).one(Parser.Not(x)).is_end # negation is not memoized, it runs on a fork
+    assert Parser('x').memo_info() == {'hits': 0, 'misses': 0, 'positions': 0, 'entries': 0}
+
+def test_memo_pruned(monkeypatch):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 10000)
+    @parser_subroutine_memo
+    def item(p, out):
+        return p.one_or_more(str.isalpha, acc=out).zero_or_one(',')
+    with trace_level(0):
+        p = Parser('ab,' * 1000)
+        assert p.one_or_more(item, out := []).is_end
+        assert len(out) == 1000
+        assert p.memo_info()['positions'] < 200 # positions behind the lowest backtrack point are dropped
+
+def test_memo_sink_forms():
+    calls = []
+    @parser_subroutine_memo
+    def kv(p, d, t, c, v, n):
+        calls.append(p.pos)
+        return (p.one(p.identifier, k := Val('')).one('=').one(p.int_, (d, k.value)).one(' ').one(p.int_, (t, k.value, int)).
+                one(' ').one(p.identifier, c).one(' ').one(p.identifier, v).do(lambda: n.append(len(d))).one(';'))
+    for _ in range(2): # the second run replays from the memo
+        p = Parser('a=1 2 x y;')
+        d, t, c, v, n = {}, {}, (Val(''), []), Val(''), []
+        assert p.lookahead.one(kv, d, t, c, v, n).backtrack().one(kv, d, t, c, v, n).is_end
+        assert d == {'a': 2} and t == {'a': 4} and c[0].value == 'xx' and c[1] == ['x', 'x'] and v.value == 'yy' and n == [1, 1]
+    assert calls == [0, 0]
@@ -0,0 +1,91 @@
+""" Test PushParser: feed() input in pieces, the parse suspends when it runs out of input and resumes """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import gc
+import re
+import threading
+import pytest
+from parsek import Parser, PushParser, Val, parser_subroutine
+from .helpers import trace_level
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 100000) # lowered by other tests
+
+CALLS = []
+
+@parser_subroutine
+def item(p, out, **_kwargs):
+    return p.if_.one(p.decimal, out).elif_.one(p.string, out).else_.one(p.collection, item, l := []).do(out.append, l).endif
+
+@parser_subroutine
+def message(p, out): # CMD args\r\n
+    CALLS.append(p.pos)
+    return (p.one(('GETALL', 'GET', 'PUT'), cmd := Val()).one(' ').one(p.collection, item, args := [], brackets={None: '\r\n'})
+            .do(lambda: out.append((cmd.v, args))))
+
+@parser_subroutine
+def messages(p, out):
+    return p.zero_or_more(message, out).one(p.END_CHAR)
+
+SRC = 'GETALL 1, "a\\"b", [2.5, ["x,y"]]\r\nPUT "é€", -3\r\nGET [], ""\r\n'
+EXPECTED = [('GETALL', [1, 'a"b', [2.5, ['x,y']]]), ('PUT', ['é€', -3]), ('GET', [[], ''])]
+
+def test_same_as_whole_input():
+    with trace_level(0):
+        assert Parser(SRC).one(messages, out := []) and out == EXPECTED
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 100])
+def test_feed_pieces(size):
+    CALLS.clear()
+    with trace_level(0):
+        pp = PushParser(messages, out := [])
+        for i in range(0, len(SRC), size):
+            pp.feed(SRC[i:i + size])
+            done = SRC.count('\r\n', 0, i + size) # complete messages are parsed once fed
+            assert len(out) in (done, done - 1) and out == EXPECTED[:len(out)]
+        assert not pp.done and pp.close() and pp.done and out == EXPECTED
+    assert len(CALLS) == 4 # each message parsed once, the last call fails at the end
+
+def test_bytes_pieces():
+    data = SRC.encode()
+    with trace_level(0), PushParser(messages, out := []) as pp:
+        for i in range(len(data)):
+            pp.feed(data[i:i + 1]) # multi byte chars split across pieces
+    assert pp.done and pp.result and out == EXPECTED
+
+def test_waits_for_input():
+    pp = PushParser(Parser.sr(lambda p, out: p.one(re.compile(r'\w+'), out).one(' ').one('x', out, nomatch='expected x')), out := [])
+    assert not pp.feed('ab').feed('').done and out == [] # the match may go on
+    assert pp.feed('c ').parser.pos == 4 and out == ['abc']
+    with pytest.raises(ValueError, match="expected x at"):
+        pp.feed('y')
+    assert pp.done and pp.close() is None
+    with pytest.raises(ValueError, match="PushParser is closed"):
+        pp.feed('x')
+
+def test_end_only_after_close():
+    pp = PushParser(Parser.sr(lambda p: p.zero_or_more('a').one(p.END_CHAR)))
+    assert not pp.feed('aaa').done and pp.parser.pos == 3
+    assert pp.close() and pp.parser.is_past_end
+    assert not PushParser('a').close() # no input
+
+@parser_subroutine
+def lines(p, out): # lines, the last one may end at the end
+    return p.zero_or_more(p.sr(lambda p, out: p.one_or_more(p.chars('^\n$'), acc=(l := [])).zero_or_one('\n').do(out.append, l)), out)
+
+def test_error_in_with_ends_worker():
+    with pytest.raises(KeyError):
+        with PushParser(lines, out := []) as pp:
+            pp.feed('a\nb')
+            raise KeyError()
+    assert not pp._thread.is_alive() and out == [['a']] # the worker is gone, 'b' isn't taken as a last line
+    assert pp.done and pp.result is None
+
+def test_dropped_parsers_end_workers():
+    threads = threading.active_count()
+    for i in range(20):
+        PushParser(lines, []).feed(f'{i}\n{i}')
+    gc.collect()
+    assert threading.active_count() == threads
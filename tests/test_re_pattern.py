@@ -0,0 +1,91 @@
+""" Test compiled regular expressions (re.Pattern) as matchers """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+import re
+import pytest
+from parsek import Parser, Not, Val
+
+FLOAT = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+DATE = re.compile(r'(?P<year>\d{4})-(?P<month>\d\d)-(?P<day>\d\d)')
+
+
+@pytest.mark.parametrize("src, expected, pos", [
+    ('1.5e3 x', '1.5e3', 5),
+    ('-.5', '-.5', 3),
+    ('42', '42', 2),
+    ('x1', None, 0),
+    ('', None, 0),
+])
+def test_re_one(src, expected, pos):
+    p = Parser(src)
+    ok = p.one(FLOAT, l := [], acc=(v := Val(0.0))).is_ok
+    assert ok is (expected is not None)
+    assert p.pos == pos
+    if ok:
+        assert l == [expected]
+        assert v.value == float(expected)
+    else:
+        assert l == [] and v.value == 0.0
+
+def test_re_named_groups():
+    p = Parser('2025-10-31 2026-01-02')
+    d = {}
+    assert p.one(DATE, d, acc=(s := Val(''))).ws.is_ok
+    assert d == {'year': '2025', 'month': '10', 'day': '31'}
+    assert s.value == '2025-10-31'
+    l = []
+    assert p.one(DATE, l).is_end
+    assert l == [{'year': '2026', 'month': '01', 'day': '02'}]
+
+def test_re_not_and_loops():
+    p = Parser('ab12cd;')
+    word = re.compile('[a-z]+')
+    l = []
+    assert p.one_or_more(Not(re.compile(r'\d')), l).is_ok
+    assert l == ['a', 'b'] and p.pos == 2
+    assert not p.one(Not(re.compile(r'\d')))
+    assert p.x2(re.compile(r'\d'), l).zero_or_more(word, l).one(';').is_end
+    assert l == ['a', 'b', '1', '2', 'cd']
+    # empty match succeeds without advancing:
+    assert Parser('x').one(re.compile('a*')).pos == 0
+    assert not Parser('x').one(Not(re.compile('a*')))
+
+def test_re_ic():
+    pat = re.compile('hello')
+    assert not Parser('HeLLo').one(pat)
+    assert Parser('HeLLo').one(pat, ic=True).is_end
+    assert Parser('HeLLo').one_ic(pat).is_end
+    assert not Parser('hello').one(Not(pat), ic=True)
+
+@pytest.mark.parametrize("pat, expected", [
+    (r'\d\d', '05'),                # fixed width
+    (r'-\d+', '-05'),               # variable width, longest match ending at the position
+    (r'\d+-\d+', '01-05'),
+    (r'(?i)[A-Z]', None),
+    (r'(?i)[A-Z]\d+', None),
+    (r'(?i)[0-9T]{2}', '05'),
+    (r'(?x) \d \d  # two digits', '05'),
+    (r'T', None),
+])
+def test_re_behind(pat, expected):
+    p = Parser('2024-01-05T', pos=10)
+    ok = p.behind(re.compile(pat), l := []).is_ok
+    assert ok is (expected is not None)
+    assert l == ([expected] if ok else [])
+    assert p.pos == 10
+
+def test_re_behind_groups():
+    p = Parser('2024-01-05T10', pos=10)
+    assert p.behind(DATE, d := {})
+    assert d == {'year': '2024', 'month': '01', 'day': '05'}
+    assert not Parser('abc').behind(re.compile('a'))
+    assert Parser('abc', pos=1).behind(re.compile('a'))
+    assert Parser('abc', pos=1).behind(Not(re.compile('b')))
+
+def test_re_dispatch_cached():
+    Parser.dispatch_cache_clear()
+    pat = re.compile('abc')
+    p = Parser('abcABC')
+    assert p.one(pat).one(pat, ic=True).is_end
+    assert Parser._cache_dispatch[(pat, re.Pattern, True, False)][1].flags & re.I
+    assert Parser._cache_dispatch[(pat, re.Pattern, False, False)][1] is None
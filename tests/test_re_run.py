@@ -0,0 +1,72 @@
+""" Test `re` fast path of looping quantifiers (Parser.USE_RE) """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+import pytest
+from parsek import Parser, Not, In, Range, Val, CharSet
+from .helpers import trace_level
+
+
+def run_both(monkeypatch, fn):
+    """ Runs `fn` with and without the `re` fast path and returns both results """
+    results = []
+    with trace_level(0):
+        for use_re in (False, True):
+            monkeypatch.setattr(Parser, 'USE_RE', use_re)
+            try:
+                results.append(fn())
+            except ValueError as e:
+                results.append(str(e))
+    return results
+
+M = Parser.chars
+MATCHERS = [
+    'a', 'ab', Not('a'), Not('ab'), Not('a' + Parser.END_CHAR), In('abc'), Not(In('ab')), Range('a', 'c'), Not(Range('a', 'b')),
+    M('a-c'), M('^\n'), M('^\n$'), M('a-c$'), M('^a-c$'), M('a-z0-9_'), M('\\]\\-^'), ('a', 'b'), ('a', In('bc'), Range('x', 'z')),
+    M('^\u0100-\ufffe'), M('b\u0100-\ufffe'), Not(M('^a-c')), CharSet(),
+    Not(('a', In('bc'))), Not((In('a'), Range('0', '9'))),
+]
+SOURCES = ['', 'a', 'aaab', 'ababa\nc', 'abcabcxyz', 'xyz\n\n', 'ccc', '-]^]x', 'a' * 50]
+
+@pytest.mark.parametrize("f", MATCHERS)
+@pytest.mark.parametrize("src", SOURCES)
+def test_re_run_same_as_loop(monkeypatch, src, f):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 200) # negations without END_CHAR loop at the end of input
+    def zero_or_more():
+        p = Parser(src)
+        ok = p.one('').zero_or_more(f, l := [], acc=(v := Val(''))).is_ok
+        return ok, p.pos, l, v.value
+    def one_or_more():
+        p = Parser(src)
+        ok = p.one_or_more(f, l := [], acc=(v := Val(''))).is_ok
+        return ok, p.pos, l, v.value
+    def repeat():
+        p = Parser(src)
+        ok = p.repeat(2, 3, f, l := []).is_ok
+        return ok, p.pos, l, p._lookahead_stack
+    for fn in (zero_or_more, one_or_more, repeat):
+        slow, fast = run_both(monkeypatch, fn)
+        assert slow == fast
+
+@pytest.mark.parametrize("src", ['abc', 'aaaaa', 'aaaaaaab'])
+def test_re_run_limit(monkeypatch, src):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 3)
+    def zero_or_more():
+        p = Parser(src)
+        r = []
+        return p.zero_or_more('a', r).is_ok, r
+    def repeat():
+        p = Parser(src)
+        r = []
+        return p.repeat(1, 10, In('a'), r).is_ok, r
+    for fn in (zero_or_more, repeat):
+        slow, fast = run_both(monkeypatch, fn)
+        assert slow == fast
+
+def test_re_run_cached():
+    with trace_level(0):
+        Parser._cache_re.clear()
+        p = Parser('   abc')
+        assert p.x0_(' ').x1_(M('a-c')).is_end
+        assert list(Parser._cache_re) == [(Parser._one_char, ' '), (Parser._one_set, M('a-c').set)]
+        assert Parser('ab').x0_(Not('b' + Parser.END_CHAR)).pos == 1
+        assert Parser._cache_re[(Parser._one_str_neg, 'b' + Parser.END_CHAR)] is None
@@ -0,0 +1,70 @@
+""" Test Parser.reset() and the parser pool: borrow() and release() """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import io
+import pytest
+from parsek import Parser, BytesParser, StreamParser, TokenParser, Span, parser_subroutine, parser_subroutine_memo
+
+
+@pytest.fixture(autouse=True)
+def pools(monkeypatch):
+    monkeypatch.setattr(Parser, '_pools', {})
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 100000) # lowered by other tests
+
+CALLS = []
+
+@parser_subroutine_memo
+def num(p, out):
+    CALLS.append(p.pos)
+    return p.one(p.decimal, out)
+
+@parser_subroutine
+def nums(p, out):
+    return p.one(num, out).zero_or_more(Parser.sr(lambda p, out: p.one(',').one(num, out)), out)
+
+def test_reset_same_as_new():
+    p = Parser('1,2')
+    assert p.one(nums, a := []).is_end and a == [1, 2]
+    assert p.reset('3.5,-4', 'S').state == 'S' and p.pos == 0 and p.len == 6
+    assert p.one(nums, a := []).is_end and a == [3.5, -4] and p.state == 'S'
+    assert p.reset('x ab', pos=2, spans=True).one_or_more(str.isalpha, acc=(l := [])).is_end and isinstance(l[0], Span) and l[0] == 'ab'
+    assert not p.reset('ab', skip=True).next().spans and p.pos == 0 # skip the next next()
+
+def test_reset_drops_branches_and_memo():
+    p = Parser('1,2')
+    r = p.lookahead.save_pos('a').one(nums, [])
+    assert r is p and p._lookahead_stack and p._pos_dict and p._memo is not None
+    assert p.reset('5,6') is p and not p._lookahead_stack and p._pos_dict is None and p._memo is None
+    CALLS.clear()
+    assert p.lookahead.one(nums, a := []).one('x').alt.one(nums, b := []).endif.is_end and a == [5, 6] and b == [5, 6]
+    assert CALLS == [0, 2] and p._memo.hits == 2 # a memo of the new source
+    assert p.one('x') is p.fail # the same branch objects
+
+def test_subclass_reset():
+    p = BytesParser(b'ab')
+    assert p.reset(b'\xe9;').ch == 'é' and p.len == 2
+    t = TokenParser([1, 2])
+    assert t.reset([3], end=0).one(3).is_end and t.ch == 0 and t.reset((4,)).one(4).ch is Parser.END_CHAR
+    s = StreamParser(iter(['a']))
+    assert s.reset(io.BytesIO('é,1'.encode())).one('é').one(',').one(s.int_, l := []).is_end and l == [1] and s.source.eof
+
+def test_borrow_and_release():
+    with Parser.borrow('1,2') as p:
+        assert p.__class__ is Parser and p.one(nums, a := []).is_end and a == [1, 2]
+    assert Parser._pools[Parser] == [p] and p.source is None # released, doesn't keep the source
+    with Parser.borrow('3', 'S') as q:
+        assert q is p and q.state == 'S' and q.one(nums, a := []).is_end and a == [3]
+    with BytesParser.borrow(b'4') as b:
+        assert b is not p and b.__class__ is BytesParser and b.one(nums, a := []) and a == [4]
+    assert Parser._pools == {Parser: [p], BytesParser: [b]}
+
+def test_pool_size(monkeypatch):
+    monkeypatch.setattr(Parser, 'POOL_SIZE', 2)
+    ps = [Parser.borrow(str(i)) for i in range(3)]
+    assert len({id(p) for p in ps}) == 3 and all(p.ch == str(i) for i, p in enumerate(ps))
+    for p in ps:  p.release()
+    assert Parser._pools[Parser] == ps[:2]
+    assert Parser.borrow('x') is ps[1] and Parser.borrow('y') is ps[0] and Parser.borrow('z') not in ps
+    monkeypatch.setattr(Parser, 'POOL_SIZE', 0)
+    ps[0].release()
+    assert not Parser._pools[Parser]
@@ -0,0 +1,199 @@
+""" Test compiled chain expressions: Rule """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+import pytest
+from parsek import Parser, Rule, Val, Not, In, Acc
+
+
+J = {'null': None, 'true': True, 'false': False}
+
+@Rule
+def j_val(p, out, **_kwargs):
+    return (p.ws.
+            if_.one(J, out).
+            elif_.one(p.decimal, out).
+            elif_.one(p.string, out, quotes={'"':'"'}).
+            elif_.one(p.collection, j_val, l := Rule.var(list)).do(p.accumulate, out, l).
+            else_.one(p.collection, j_kv, d := Rule.var(dict), brackets={'{': '}'}).do(p.accumulate, out, d).
+            endif)
+
+@Parser.rule
+def j_kv(p, out, **_kwargs):
+    return p.one(p.string, k := Rule.var(Val), quotes={'"':'"'}).ws.one(':').ws.one(j_val, (out, k))
+
+def parse_json(s):
+    p = Parser(s)
+    r = Val()
+    p.ws.one(j_val, r, nomatch='Invalid JSON').ws.one(p.EOF, nomatch='Unexpected trailing input')
+    return r.value
+
+
+@pytest.mark.parametrize("src, expected", [
+    ('null', None),
+    (' 12.5 ', 12.5),
+    ('"abc"', 'abc'),
+    ('[]', []),
+    ('[1, [2, [3]], {"a": [true]}]', [1, [2, [3]], {'a': [True]}]),
+    ('{"a": [1, 2.5, "x", null, true, {"b": false}], "c": {}}', {'a': [1, 2.5, 'x', None, True, {'b': False}], 'c': {}}),
+])
+def test_rule_json(src, expected):
+    assert parse_json(src) == expected
+    assert parse_json(src) == expected # compiled on first use, then reused
+
+@pytest.mark.parametrize("src, msg", [
+    ('nul', 'Invalid JSON'),
+    ('[1, 2', 'Unclosed collection'),
+    ('{"a": 1} x', 'Unexpected trailing input'),
+])
+def test_rule_json_errors(src, msg):
+    with pytest.raises(ValueError, match=msg):
+        parse_json(src)
+
+
+def test_rule_args():
+    @Rule
+    def word(p, out, stop, *, sep=' '):
+        return p.one_or_more(Not(stop), Acc(v := Rule.var(Val, ''))).do(out.append, v.value).zero_or_more(sep)
+
+    p = Parser('abc def;ghi')
+    l = []
+    assert p.one_or_more(word, l, In('; ')).one(';').is_ok
+    assert l == ['abc', 'def']
+    assert p.one(word, l, In(';' + p.END_CHAR), sep='!').is_ok # keyword only argument with a default
+    assert l == ['abc', 'def', 'ghi']
+    assert p.is_end
+
+
+def test_rule_var_fresh():
+    seen = []
+    @Rule
+    def item(p, out):
+        return p.one_or_more(p.chars('a-z'), v := Rule.var(Val, '')).do(out.append, v).do(seen.append, v)
+
+    p = Parser('ab cd')
+    l = []
+    assert p.one(item, l).one(' ').one(item, l).is_ok
+    assert l == ['ab', 'cd']
+    assert seen[0] is not seen[1]
+    assert seen[0].value == 'ab'
+
+
+def test_rule_dynamic_matcher():
+    @Rule
+    def delimited(p, f, out):
+        return p.one('<').one_or_more(f, out).one('>')
+
+    l = []
+    p = Parser('<abc><12>')
+    assert p.one(delimited, p.chars('a-z'), l).one(delimited, p.chars('0-9'), l).is_ok
+    assert l == ['a', 'b', 'c', '1', '2']
+    assert p.is_end
+
+
+def append_int(out, v, base):
+    out.append(int(v.value, base))
+
+def test_rule_branches_and_loops():
+    @Rule
+    def num(p, out):
+        return (p.if_.one('0x').one_or_more(p.chars('0-9a-f'), v := Rule.var(Val, '')).do(append_int, out, v, 16)
+                .elif_.x1_(p.chars('0-9'), v := Rule.var(Val, '')).do(append_int, out, v, 10)
+                .else_.fail
+                .endif)
+
+    l = []
+    p = Parser('0x1f,12,x')
+    assert p.one(num, l).one(',').one(num, l).one(',').is_ok
+    assert not p.one(num, l)
+    assert l == [31, 12]
+    assert p.pos == 8
+    assert p._lookahead_stack == []
+
+def test_rule_repeat_and_lookahead():
+    @Rule
+    def code(p, out):
+        return p.lookahead.repeat(2, 3, p.chars('A-Z'), out).one('-').alt.one('?').merge
+
+    p = Parser('ABC-?AB-')
+    l = []
+    assert p.one(code, l).one(code, l).one(code, l).is_ok
+    assert l == ['A', 'B', 'C', 'A', 'B']
+    assert p.is_end
+
+def test_rule_subclass():
+    class MyParser(Parser):
+        @property
+        def comma(self):  return self.ws.one(',').ws
+
+    @Rule
+    def pair(p, out):
+        return p.one(p.uint, out).comma.one(p.uint, out)
+
+    p = MyParser('1 , 2')
+    l = []
+    assert p.one(pair, l).is_ok
+    assert l == [1, 2]
+    assert MyParser in pair.compiled
+
+def test_rule_nomatch():
+    @Rule
+    def colon(p, what):
+        return p.ws.one(':', nomatch=what)
+
+    with pytest.raises(ValueError, match='Expected colon'):
+        Parser(' x').one(colon, 'Expected colon')
+
+
+def test_rule_bad_body():
+    @Rule
+    def has_if(p):
+        return p.one('a') if p.one('b') else p.one('c')
+
+    @Rule
+    def no_return(p):
+        p.one('a')
+
+    with pytest.raises(TypeError, match='single chain expression'):
+        Parser('a').one(has_if)
+    with pytest.raises(TypeError, match='must return the chain'):
+        Parser('a').one(no_return)
+
+def test_rule_missing_arg():
+    @Rule
+    def r(p, out):
+        return p.one('a', out)
+
+    with pytest.raises(TypeError, match='missing argument'):
+        r(Parser('a'))
+
+def test_rule_repeat_bounds_from_args():
+    @Rule
+    def fixed(p, n, out):
+        return p.repeat(n, n, p.chars('0-9'), acc=out)
+
+    p = Parser('1234567')
+    assert p.one(fixed, 3, l := []).one(fixed, 2, l).is_ok and l == ['123', '45'] and p.pos == 5
+    assert not p.one(fixed, 3, l) and p.pos == 5
+
+def test_rule_body_values_shared():
+    @Rule
+    def kv(p, out):
+        return p.one_or_more(p.chars('a-z'), k := Rule.var(Val)).one('=').one(p.uint, (out, k)).one(';').do(seen.append, l := [])
+
+    seen = []
+    p = Parser('a=1;ab=2;')
+    assert p.one(kv, d := {}).one(kv, d).is_end
+    assert d == {'a': 1, 'ab': 2} and len(seen) == 2 and seen[0] is seen[1] # only Rule.var() is made anew for each run
+
+def test_rule_body_closure():
+    with pytest.raises(TypeError, match='closures over out, d'):
+        @Rule
+        def r(p, out): # pylint: disable=unused-variable
+            return p.one(str.isdigit, d := Val('')).check(lambda: d.v != '5').do(lambda: out.append(d))
+
+    @Rule
+    def r2(p, out):
+        return p.one(str.isdigit, d := Rule.var(Val, '')).check(lambda v: v.value != '5', d).do(out.append, d)
+
+    assert not Parser('5').one(r2, l := []) and l == []
+    assert Parser('4').one(r2, l).is_end and l == ['4']
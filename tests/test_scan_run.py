@@ -0,0 +1,67 @@
+""" Test the tight scanning loop of looping quantifiers over single char matchers (Parser._scan_run) """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements,use-implicit-booleaness-not-comparison
+
+import pytest
+from parsek import Parser, Not, In, Range, Val, CharSet
+from .helpers import trace_level
+
+
+def run_both(monkeypatch, fn):
+    """ Runs `fn` with and without the fast paths and returns both results """
+    results = []
+    with trace_level(0):
+        monkeypatch.setattr(Parser, 'USE_RE', False)
+        for harnesses in (frozenset(), Parser._scan_harnesses):
+            monkeypatch.setattr(Parser, '_scan_harnesses', harnesses)
+            try:
+                results.append(fn())
+            except ValueError as e:
+                results.append(str(e))
+    return results
+
+M = Parser.chars
+MATCHERS = [
+    str.isdigit, str.isalpha, Not(str.isspace), lambda c: c in 'ab', 'a', Not('a'), In('abc'), Not(In('ab')), Range('a', 'c'),
+    M('a-c'), M('^\n'), M('^\n$'), M('a-z0-9_'), M('^Ā-￾'), Not(M('^a-c')), CharSet(),
+]
+SOURCES = ['', 'a', 'aaAb', '12a3', 'ababa\nc', 'AbCabcxyz', 'x \n\n', 'ccC', 'a' * 50, 'İıi']
+
+@pytest.mark.parametrize("f", MATCHERS)
+@pytest.mark.parametrize("src", SOURCES)
+@pytest.mark.parametrize("ic", [False, True])
+def test_scan_run_same_as_loop(monkeypatch, src, f, ic):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 200) # negations without END_CHAR loop at the end of input
+    def zero_or_more():
+        p = Parser(src)
+        ok = p.one('').zero_or_more(f, l := [], acc=(v := Val('')), ic=ic).is_ok
+        return ok, p.pos, l, v.value
+    def one_or_more():
+        p = Parser(src)
+        ok = p.one_or_more(f, l := [], ic=ic).is_ok
+        return ok, p.pos, l
+    def repeat():
+        p = Parser(src, pos=1)
+        ok = p.repeat(2, 3, f, l := [], acc=(v := Val('')), ic=ic).is_ok
+        return ok, p.pos, l, v.value, p._lookahead_stack
+    for fn in (zero_or_more, one_or_more, repeat):
+        slow, fast = run_both(monkeypatch, fn)
+        assert slow == fast
+
+@pytest.mark.parametrize("src", ['123', '12345', '1234567x'])
+def test_scan_run_limit(monkeypatch, src):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 3)
+    def x0_():
+        p = Parser(src)
+        return p.x0_(str.isdigit, r := []).is_ok, r
+    def repeat():
+        p = Parser(src)
+        return p.repeat(1, 10, str.isdigit, r := []).is_ok, r
+    for fn in (x0_, repeat):
+        slow, fast = run_both(monkeypatch, fn)
+        assert slow == fast
+
+def test_scan_run_skip_and_state():
+    p = Parser('1234')
+    assert p.skip().x1_(str.isdigit, l := []).is_end # the skip flag makes the first match not advance
+    assert l == ['', '1', '2', '3', '4']
+    assert Parser('123.5e2').one(Parser.decimal, v := Val()).is_end and v.value == 12350.0
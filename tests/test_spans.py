@@ -0,0 +1,54 @@
+""" Test span mode: sinks get Span objects over the source instead of matched strings """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import re
+import pytest
+from parsek import Parser, Span, Val, Not, parser_subroutine
+from .helpers import trace_level
+
+
+def emit_all(spans):
+    p = Parser('ab 12 xyz;\n', spans=spans)
+    l, r, d, v = [], [], {}, Val()
+    p.one('a', l).one(('b', 'c'), l, acc=v).ws.one_or_more(str.isdigit, l, acc=(d, 'n', int)).ws
+    p.x1_(p.chars('a-z'), l, acc=(d, 'id')).behind('z', r).one(re.compile(r';'), r).one(Not(';'), r)
+    p.copy_from(0, r)
+    return l, r, d, v
+
+def test_spans_same_text():
+    l, r, d, v = emit_all(False)
+    sl, sr, sd, sv = emit_all(True)
+    assert all(isinstance(x, Span) for x in sl + sr) and isinstance(sd['id'], Span)
+    assert sl == l and sr == r and Span.texts(sl) == l and Span.texts(sr) == r and sd == d and sv == v == 'b'
+    assert isinstance(sv.value, str) # Val holds the text
+    assert [(x.start, x.end) for x in sr] == [(8, 9), (9, 10), (10, 11), (0, 11)] # behind() spans the source behind
+
+def test_span_object():
+    s = Span(src := 'hello world', 6, 11)
+    assert str(s) == s.text == 'world' and len(s) == 5 and repr(s) == "Span(6, 11, 'world')"
+    assert s == 'world' and s != 'worl' and s != 'worlds' and s == Span('world', 0, 5) and s != Span(src, 0, 5) and s != 5
+    assert hash(s) == hash('world') and {s: 1}['world'] == 1 and s + '!' == 'world!' and '>' + s == '>world'
+    assert int(Span('x42', 1, 3)) == 42 and float(Span('1.5', 0, 3)) == 1.5 and not Span(src, 3, 3)
+    assert Span.texts([s, 'x', 1]) == ['world', 'x', 1] and Span.join([s, Span(src, 0, 5)], ' ') == 'world hello'
+    e = Span('ab', 2, 3) # END_CHAR matched
+    assert len(e) == 0 and e == '' and str(e) == ''
+
+def test_spans_in_loops_and_subroutines():
+    @parser_subroutine
+    def word(p, out):
+        return p.one_or_more(str.isalpha, acc=out)
+    for use_re in (True, False):
+        with trace_level(0):
+            Parser.USE_RE, prev = use_re, Parser.USE_RE
+            try:
+                p = Parser('aaa bb', spans=True)
+                assert p.zero_or_more('a', l := []).ws.one(word, w := []).is_end
+            finally:
+                Parser.USE_RE = prev
+        assert l == ['a'] * 3 and [(x.start, x.end) for x in l] == [(0, 1), (1, 2), (2, 3)] and w == ['bb']
+        assert isinstance(w[0], Span) # forked and nested parsers keep the mode
+
+@pytest.mark.parametrize("spans", [False, True])
+def test_span_mode_default_off(spans):
+    p = Parser('x', spans=spans) if spans else Parser('x')
+    assert p.spans == spans and isinstance(p.one('x', l := []) and l[0], Span) == spans
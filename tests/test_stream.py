@@ -0,0 +1,103 @@
+""" Test StreamParser: parsing streams read in chunks, keeping only a window of the text """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+import io
+import re
+import pytest
+from parsek import Parser, StreamParser, Span, Not, parser_subroutine
+from .helpers import trace_level
+
+
+@pytest.fixture(autouse=True)
+def small_window(monkeypatch):
+    monkeypatch.setattr(StreamParser, 'CHUNK', 8)
+    monkeypatch.setattr(StreamParser, 'READ_AHEAD', 8)
+    monkeypatch.setattr(StreamParser, 'KEEP_BEHIND', 4)
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 100000) # lowered by other tests
+
+@parser_subroutine
+def record(p, out): # {"id": int, "name": "string"}\n
+    return p.one('{"id": ').one(p.int_, r := []).one(', "name": ').one(p.string, r).one('}').one('\n').do(out.append, tuple(r))
+
+def records(n):
+    return ''.join(f'{{"id": {i}, "name": "n{i}é"}}\n' for i in range(n))
+
+class Sock: # socket-like: recv() returns what arrived, b'' at the end
+    def __init__(self, data, size):
+        self.data, self.size = data, size
+    def recv(self, n):
+        r, self.data = self.data[:min(n, self.size)], self.data[min(n, self.size):]
+        return r
+
+@pytest.mark.parametrize("make", [
+    lambda s: io.StringIO(s),
+    lambda s: io.BytesIO(s.encode()),
+    lambda s: (s[i:i + 3] for i in range(0, len(s), 3)),
+    lambda s: [bytes([b]) for b in s.encode()], # multi byte chars split across chunks
+    lambda s: ['', s[:10], '', s[10:]], # empty chunks aren't the end
+    lambda s: Sock(s.encode(), 5),
+])
+def test_stream_sources(make):
+    with trace_level(0):
+        p = StreamParser(make(records(50)))
+        assert p.zero_or_more(record, out := []).is_end and p.source.eof
+    assert out == [(i, f'n{i}é') for i in range(50)]
+    assert len(p.source.text) <= 64 and p.source.start > 1000 # only a window is kept
+
+def test_end_only_at_end_of_stream():
+    p = StreamParser(iter(['ab', 'c']))
+    assert not p.is_end and p.one('abc').is_end and p.ch == p.END_CHAR and p.one(p.END_CHAR).is_past_end
+    assert StreamParser(iter([])).is_end and StreamParser(io.BytesIO(b'')).one(Not('x')).is_past_end
+
+def test_backtracking_within_window():
+    p = StreamParser(io.StringIO('x' * 20 + 'abc' + 'y' * 100))
+    assert p.zero_or_more('x').lookahead.one('abc').one_or_more('y').one('z') is p.fail # lookahead keeps its start
+    assert p.backtrack().pos == 20 and p.slice(3) == 'abc' and p.source.start <= 20
+    assert p.save_pos('a').one('abc').one_or_more('y', acc=(l := [])).is_end and l == ['y' * 100]
+    assert p.pop_pos('a', True) == 'abc' + 'y' * 100 # saved positions keep the window too
+    assert p.behind('y') and p.behind(re.compile('y{3}')) and not p.behind(re.compile('a'))
+
+def test_behind_window_raises():
+    p = StreamParser(io.StringIO('abc' + 'z' * 100))
+    assert p.one('abc').one_or_more('z').is_end
+    with pytest.raises(ValueError, match=r"Stream position 0 is behind the parser's window"):
+        p.copy_from(0, [])
+    with pytest.raises(ValueError, match="behind the parser's window"):
+        p.behind('c' + 'z' * 100)
+
+def test_same_as_str_parser():
+    src = records(30)
+    @parser_subroutine
+    def words(p, out):
+        return p.zero_or_more(p.sr(lambda p, out: p.if_.one_or_more(p.chars('a-z'), acc=out).else_.one(p.chars('^a-z$')).endif), out)
+    with trace_level(0):
+        assert Parser(src).one(words, a := []).is_end and StreamParser(io.StringIO(src)).one(words, b := []).is_end and a == b
+        assert StreamParser(io.StringIO(src), spans=True).one(words, b := []).is_end and isinstance(b[-1], Span) and b[-1] == a[-1]
+    with pytest.raises(ValueError, match="behind the parser's window"):
+        str(b[0]) # spans are only good within the window
+
+def test_loops_not_bounded_by_parse_limit(monkeypatch):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 50)
+    with trace_level(0):
+        assert StreamParser(io.StringIO(records(200))).zero_or_more(record, out := []).is_end and len(out) == 200
+        assert StreamParser(io.StringIO(records(60))).repeat(60, 60, record, out := []).is_end and len(out) == 60
+        assert StreamParser(io.StringIO('x' * 300)).one_or_more('x').is_end
+        for loop in ('zero_or_more', 'one_or_more'): # matches that don't move still count
+            with pytest.raises(ValueError, match="Infinite loop"):
+                getattr(StreamParser(io.StringIO('ab')), loop)(Parser.sr(lambda p: p))
+        with pytest.raises(ValueError, match="Infinite loop"):
+            StreamParser(io.StringIO('ab')).repeat(0, 100, Parser.sr(lambda p: p))
+
+def test_window_of_forks():
+    src = '[' + ', '.join(map(str, range(300))) + ']'
+    p = StreamParser(io.StringIO(src + 'x'))
+    sizes = []
+    with trace_level(0):
+        assert p.one(p.collection, p.int_, lambda v: sizes.append(len(p.source.text))).one('x').is_end # a new stack subroutine
+    assert len(sizes) == 300 and max(sizes) <= 64 and p.source.start > 1000
+    @parser_subroutine
+    def list_then_z(p):
+        return p.one(p.collection, p.int_, []).one('z')
+    q = StreamParser(io.StringIO(src))
+    with trace_level(0):
+        assert q.one(Not(list_then_z)).one('0, 1').is_ok # a negation goes on from its position
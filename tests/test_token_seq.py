@@ -0,0 +1,75 @@
+""" Test TokenParser over arbitrary sequences: lists of token objects, tuples of ints, etc. """
+# pylint: disable=protected-access,missing-function-docstring,line-too-long,multiple-statements
+
+from dataclasses import dataclass
+import re
+import pytest
+from parsek import Parser, TokenParser, Not, Val, parser_subroutine, parser_subroutine_new_stack
+
+@dataclass(frozen=True)
+class Tok: # not a tuple: tuples are alternations, not elements
+    kind: str
+    text: str
+
+EOF = Tok('EOF', '')
+TOKS = [Tok('ID', 'x'), Tok('EQ', '='), Tok('NUM', '1'), Tok('PLUS', '+'), Tok('NUM', '2')]
+
+def kind(k):
+    return lambda t: t.kind == k
+
+
+def test_ints():
+    p = TokenParser((1, 2, 3, 9, 9, 7))
+    assert p.ch == 1 and p.token == 1 and not p.one(2) and p.one(1, l := []).one((2, 5), l).one_or_more(Not(7), l, acc=(r := []))
+    assert l == [1, 2, 3, 9, 9] and r == [(3, 9, 9)] and p.one({7: 'seven'}, l).is_end and l[-1] == 'seven'
+    assert p.ch is Parser.END_CHAR and p.one(p.END_CHAR).is_past_end and p.token is None
+    p.pos = 0
+    assert p.one([1, Val(2)]).one({2, 3}).one({3}).one(Not({9: 0})) is p.fail and p.pos == 3 and p.zero_or_more(9).pos == 5
+    p.pos = 2
+    assert p.one(lambda x: x > 2, m := []).x2_(9, m).one((Not(1), 8)).is_end
+    assert m == [3, 9, 9]
+
+def test_token_objects_with_predicates_and_end():
+    p = TokenParser(TOKS, end=EOF)
+    assert p.END_CHAR is p.EOF is EOF and Parser.END_CHAR != EOF
+    assert p.one(kind('ID'), l := []).one(kind('EQ')).one(kind('NUM'), l).zero_or_more(p.sr(lambda p, out: p.one(kind('PLUS')).one(kind('NUM'), out)), l)
+    assert l == [TOKS[0], TOKS[2], TOKS[4]] and p.is_end and p.ch is EOF and not p.one(kind('NUM')) # predicates get the sentinel at the end
+    assert p.one(kind('EOF')).is_past_end
+    p.pos = 0
+    assert p.one_or_more(p.NOT_END_CHAR, acc=(r := [])).is_end and r == [TOKS] and p.one(EOF).is_past_end
+    assert TokenParser(TOKS, end=EOF).one(Not(EOF)).x4_(Not(EOF)).one(Not(EOF)) is not True
+
+def test_strings_and_patterns():
+    p = TokenParser(['let', 'x', '=', 'Foo', ';'])
+    assert p.one('LET', ic=True).one(re.compile(r'[a-z]\w*'), l := []).one(('=', ':=')).one(re.compile('foo', re.I), l).one(Not(re.compile(r'\w')))
+    assert l == ['x', 'Foo'] and p.is_end
+    p.pos = 0
+    assert p.one(('x', 'LET'), ic=True).one(['X'], ic=True).one({'=': 'assign'}, l := [], ic=True).one(Not({'foo': 0}), ic=True) is p.fail and l == ['assign']
+
+@pytest.mark.parametrize("deco", [parser_subroutine, parser_subroutine_new_stack])
+def test_subroutines_forks_and_behind(deco):
+    @deco
+    def num(p, out=None):
+        return p.one(kind('NUM'), out)
+    @deco
+    def sum_(p, out): # num (PLUS num)*
+        return p.one(num, a := []).zero_or_more(p.sr(lambda p, out: p.one(kind('PLUS')).one(num, out)), a).do(lambda: out.append(sum(int(t.text) for t in a)))
+    p = TokenParser(TOKS, pos=2, end=EOF)
+    assert p.one(sum_, out := []).is_end and out == [3]
+    assert p.behind(kind('NUM'), l := []).behind(Not(kind('ID')), l) and l == [TOKS[4]] * 2
+    assert p.one(Not(num)).is_past_end # num is called with the sentinel
+    p.pos = 0
+    assert p.behind(kind('EOF')) and not p.behind(Not(EOF)) # behind the start is the sentinel too
+
+def test_errors_show_elements():
+    p = TokenParser(list(range(10)), pos=5)
+    assert repr(p) == "TokenParser(pos=5:'…, 2, 3, 4, [5], 6, 7, 8, …')"
+    with pytest.raises(ValueError, match=r"expected 0 at: 0, \[1\], 2"):
+        TokenParser([0, 1, 2]).one(0).one(0, nomatch='expected 0')
+    with pytest.raises(ValueError, match=r"end at: 1, 2, \[\]$"):
+        TokenParser([1, 2], pos=2).one(1, nomatch='end')
+
+def test_slices_are_sequences():
+    p = TokenParser((1, 2, 3), pos=1)
+    assert p.slice(5) == (2, 3) and p.slice(1) == 2 and p.slice_behind(5) == 1 and p.next(5).slice_from(0) == (1, 2, 3)
+    assert p.is_past_end and p.save_pos('a') and p.pop_pos('a', True) == ()
@@ -3,6 +3,7 @@
 
 import pytest
 from parsek import Parser
+from .helpers import trace_level
 
 
 
@@ -410,3 +411,26 @@ def test_is_equal():
     assert r == 5
     assert r != 6
     assert r == Parser.Val(5)
+
+
+def test_builder_same_as_val():
+    b, r = Parser.Val.builder(), Parser.Val('')
+    for x in (b, r):
+        x += 'ab'
+        x.append(' c ').append(5).append(None)
+        x += 2.5
+    assert b._parts and isinstance(b, Parser.Val) and b == r == 'ab c 52.5'
+    assert str(b) == repr(b)[5:-2] and len(b) == len(r) and hash(b) == hash(r) and b and not b._parts
+    assert b.append(' ').strip().upper() == 'AB C 52.5' and b.isupper() and not b.is_none and b.is_str
+    assert b.copy().append('!') == 'AB C 52.5!' and b == 'AB C 52.5' and type(b.copy()) is type(b)
+    b.append('x').value = 'y'
+    assert b.append('z') == 'yz' and b.clear() == '' and b.append('q') == 'q'
+    assert b.reset().set(1).append(2) == 3 and b.reset().is_none # non str values accumulate as Val does
+    assert Parser.Val.builder().use(lambda old, new: new).append('a').append('b') == 'b'
+
+def test_builder_linear_accumulation(monkeypatch):
+    monkeypatch.setattr(Parser, 'PARSE_LIMIT', 100000)
+    with trace_level(0):
+        p = Parser('"' + 'x' * 5000 + '"')
+        assert p.one('"').one_or_more(Parser.Not(Parser.In('"' + p.END_CHAR)), s := Parser.Val.builder()).one('"').is_end
+    assert len(s._parts) == 5000 and s == 'x' * 5000 and not s._parts # joined once, when read